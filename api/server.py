@@ -1,9 +1,12 @@
 import asyncio
+import importlib
 import json
 import os
-from typing import AsyncGenerator
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -14,57 +17,251 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 CHROMA_PATH    = os.getenv("CHROMA_PATH", "./chroma_db")
 VAULT_PATH     = os.getenv("VAULT_PATH", "./my_vault")
-MODELS_CONFIG  = os.path.join("config", "models.yaml")
-
-app = FastAPI(title="Creative Lab Agents GUI")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],)
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./checkpoints.sqlite")
+MODELS_CONFIG  = os.getenv("MODELS_CONFIG", os.path.join("config", "models.yaml"))
+SESSION_TRACES = os.getenv("SESSION_TRACES", "").lower() in ("1", "true", "yes")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid") # vector | hybrid | lexical (see MemoryService)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma") # chroma | numpy | numpy-int8 (see services/vector_store.py)
+MAX_ACTIVE_RUNS = int(os.getenv("MAX_ACTIVE_RUNS", "4"))         # Pipeline runs (sessions, scouts, script drafts) at once
+MAX_QUEUED_RUNS = int(os.getenv("MAX_QUEUED_RUNS", "32"))        # Beyond this, new runs get 429
+MAX_RUNS_PER_CLIENT = int(os.getenv("MAX_RUNS_PER_CLIENT", "3")) # Running + queued per client (X-Client-Id or address)
 
 _services_ready = False
 _llm_service    = None
 _memory_service = None
 _trend_service  = None
+_identity_service = None
+_graph_settings: dict = {}
+_identity_task: Optional[asyncio.Task] = None
+_session_manager = None
+_worker_pool    = None
+_checkpoint_conn = None
+_warm_task: Optional[asyncio.Task] = None
+_readiness = {"state": "starting", "detail": "", "seconds": None}
 
 
 def _init_services():
-    global _services_ready, _llm_service, _memory_service, _trend_service
-    if _services_ready:
-        return True
-    if not OPENAI_API_KEY:
-        return False
+    """Build the services (blocking: imports SDKs, opens the vector store). Raises on failure."""
+    global _services_ready, _llm_service, _memory_service, _trend_service, _identity_service, _graph_settings
+    from services.identity_service import IdentityService
+    from services.llm import LLMService
+    from services.memory_service import MemoryService
+    from services.trend_service import TrendService
+    model_map       = LLMService.load_config_from_yaml(MODELS_CONFIG)
+    settings        = LLMService.load_settings_from_yaml(MODELS_CONFIG)
+    llm_service     = LLMService(api_key=OPENAI_API_KEY, model_map=model_map, google_api_key=GOOGLE_API_KEY, settings=settings)
+    llm_service.warm_up()
+    memory_service  = MemoryService(persist_directory=CHROMA_PATH, embedding_api_key=OPENAI_API_KEY, retrieval_mode=RETRIEVAL_MODE, vector_backend=VECTOR_BACKEND)
+    memory_service.store.count() # Open the store now, not on the first query
+    if RETRIEVAL_MODE != "vector":
+        memory_service.reload_lexical() # Load the BM25 index now, not on the first query
+    _llm_service, _memory_service, _trend_service = llm_service, memory_service, TrendService(llm_service)
+    _identity_service = IdentityService(memory_service, llm_service, CHROMA_PATH)
+    _graph_settings = settings.get("graph") or {}
+    _services_ready = True
+
+
+async def _init_session_manager():
+    """Checkpointed graph for the session API."""
+    global _session_manager, _worker_pool, _checkpoint_conn
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    from graph.build_graph import build_graph
+    from api.sessions import SessionManager, WorkerPool
+    _checkpoint_conn = await aiosqlite.connect(CHECKPOINT_PATH)
+    graph = build_graph(_llm_service, _memory_service, _trend_service, checkpointer=AsyncSqliteSaver(_checkpoint_conn), **_graph_settings)
+    _worker_pool = WorkerPool(MAX_ACTIVE_RUNS, MAX_QUEUED_RUNS, MAX_RUNS_PER_CLIENT)
+    _session_manager = SessionManager(graph, trace=SESSION_TRACES, pool=_worker_pool)
+
+
+async def _warm_start():
+    """Initialize everything in the background so the server accepts requests immediately."""
+    started = time.perf_counter()
     try:
-        from services.llm import LLMService
-        from services.memory_service import MemoryService
-        from services.trend_service import TrendService
-        model_map       = LLMService.load_config_from_yaml(MODELS_CONFIG)
-        _llm_service    = LLMService(api_key=OPENAI_API_KEY, model_map=model_map, google_api_key=GOOGLE_API_KEY)
-        _memory_service = MemoryService(persist_directory=CHROMA_PATH, embedding_api_key=OPENAI_API_KEY)
-        _trend_service  = TrendService(_llm_service)
-        _services_ready = True
-        return True
+        await asyncio.to_thread(importlib.import_module, "vault_ingest") # Text splitter + vector store for the ingest endpoint
+        if not OPENAI_API_KEY:
+            _readiness.update(state="unconfigured", detail="OPENAI_API_KEY not set")
+            return
+        await asyncio.to_thread(_init_services)
+        await _init_session_manager()
+        _readiness.update(state="ready", detail="")
+        _refresh_identity()
     except Exception as e:
         print(f"[server] service init failed: {e}")
-        return False
+        _readiness.update(state="failed", detail=str(e))
+    finally:
+        _readiness["seconds"] = round(time.perf_counter() - started, 3)
+        print(f"[server] startup {_readiness['state']} in {_readiness['seconds']}s")
+
+
+def _refresh_identity():
+    """Build the identity profile for the current vault version in the background, so sessions find it ready."""
+    global _identity_task
+
+    async def refresh():
+        try:
+            await _identity_service.profile()
+        except Exception as e:
+            print(f"[server] identity profile failed: {e}")
+    if _identity_service is not None:
+        _identity_task = asyncio.create_task(refresh())
+
 
+async def _ready() -> bool:
+    """Wait for a warm start still in progress; True if the LLM services are usable."""
+    if _warm_task is not None and not _warm_task.done():
+        await asyncio.shield(_warm_task)
+    return _services_ready
 
-def sse_event(event: str, data: dict) -> str:
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _warm_task
+    _warm_task = asyncio.create_task(_warm_start())
+    yield
+    if not _warm_task.done():
+        _warm_task.cancel()
+        await asyncio.gather(_warm_task, return_exceptions=True)
+    if _checkpoint_conn is not None:
+        await _checkpoint_conn.close()
+
+
+app = FastAPI(title="Creative Lab Agents GUI", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],)
+
+
+def sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
     payload = json.dumps(data)
-    return f"event: {event}\ndata: {payload}\n\n"
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {payload}\n\n"
 
 
-async def stream_generator(gen: AsyncGenerator) -> AsyncGenerator[str, None]:
-    async for msg in gen:
-        yield msg
-    yield sse_event("done", {"message": "Stream complete"})
+async def _drain(task: asyncio.Future, queue: asyncio.Queue) -> AsyncGenerator[str, None]:
+    # Yield what `task` puts on `queue` until it finishes; closing early cancels the task
+    try:
+        while not task.done() or not queue.empty():
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def relay_events(work: Awaitable) -> AsyncGenerator[str, None]:
+    """
+    Run `work` as a task and relay everything it emit()s as SSE until it finishes.
+    Exceptions from `work` propagate once its pending events have been sent.
+    """
+    from graph.events import event_sink
+    queue: asyncio.Queue = asyncio.Queue()
+    with event_sink(lambda event, data: queue.put_nowait(sse_event(event, data))):
+        task = asyncio.ensure_future(work)
+    async for message in _drain(task, queue):
+        yield message
+
+
+async def pooled(messages: AsyncIterator[str], tenant: str) -> AsyncGenerator[str, None]:
+    """
+    Relay SSE `messages` while holding a worker-pool slot. Until one frees up the
+    client gets `queued` events with its position; the work only starts once admitted.
+    """
+    from api.sessions import QueueFull
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run():
+        try:
+            async with _worker_pool.slot(tenant, lambda position: queue.put_nowait(sse_event("queued", {"position": position}))):
+                async for message in messages:
+                    queue.put_nowait(message)
+        except QueueFull as e: # Filled up between the up-front check and the stream starting
+            queue.put_nowait(sse_event("error", {"message": str(e), "retry_after": e.retry_after}))
+
+    async for message in _drain(asyncio.ensure_future(run()), queue):
+        yield message
+
+
+async def until_disconnected(request: Request, messages: AsyncIterator[str], poll_seconds: float = 1.0) -> AsyncGenerator[str, None]:
+    """
+    Relay `messages` until the client goes away, checked every `poll_seconds` even while
+    no message is due, then close them, cancelling the work (and provider calls) behind them.
+    """
+    iterator = messages.__aiter__()
+    try:
+        while True:
+            step = asyncio.ensure_future(iterator.__anext__())
+            while not step.done():
+                await asyncio.wait({step}, timeout=poll_seconds)
+                if not step.done() and await request.is_disconnected():
+                    step.cancel()
+                    await asyncio.gather(step, return_exceptions=True)
+                    print(f"[server] client disconnected from {request.url.path}; work cancelled")
+                    return
+            try:
+                yield step.result()
+            except StopAsyncIteration:
+                return
+    finally:
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+
+def _client_id(request: Request) -> str:
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "")
+
+
+def _busy(e: Exception) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def _admit(request: Request, messages: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Route an LLM-backed SSE stream through the worker pool (once services are up); 429 if it is full."""
+    if _worker_pool is None:
+        return messages
+    from api.sessions import QueueFull
+    tenant = _client_id(request)
+    try:
+        _worker_pool.check(tenant) # Refuse up front; pooled() admits for real once the stream starts
+    except QueueFull as e:
+        raise _busy(e)
+    return pooled(messages, tenant)
 
 
 class IngestRequest(BaseModel):
     vault_path: str  = VAULT_PATH
     chroma_path: str = CHROMA_PATH
+    batch_size: int  = 64
+    concurrency: int = 4
 
 class ScoutRequest(BaseModel):
     theme:       str       = ""
     constraints: list[str] = []
 
+class ScriptRequest(BaseModel):
+    idea:        dict
+    constraints: list[str] = []
+    styles:      list[str] = ["dramatic", "meme", "documentary"]
+
+class SessionRequest(BaseModel):
+    theme:       str
+    constraints: list[str] = []
+
+class SelectRequest(BaseModel):
+    index: int
+
+class ApproveRequest(BaseModel):
+    approved: bool
+    feedback: str = ""
+
+class BatchRequest(BaseModel):
+    jobs:             list[dict]
+    parallel:         int             = 4
+    min_script_score: Optional[float] = None
+
 
 @app.get("/api/status")
 async def get_status():
@@ -74,11 +271,25 @@ async def get_status():
         "google_key_present": bool(GOOGLE_API_KEY),
         "vault_path":         VAULT_PATH,
         "chroma_path":        CHROMA_PATH,
+        "vector_backend":     VECTOR_BACKEND,
         "models_config":      MODELS_CONFIG,
         "services_ready":     _services_ready,
+        "startup":            dict(_readiness),
+        "llm_cache":          _llm_service.cache_stats() if _llm_service else {},
+        "llm_queue":          _llm_service.queue_depth() if _llm_service else {},
+        "llm_hedging":        _llm_service.hedge_stats() if _llm_service else {},
+        "workers":            _worker_pool.stats() if _worker_pool else {},
     }
 
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Prometheus metrics: LLM latency/tokens/errors/retries, graph node timings, ingest stage timings."""
+    from services.metrics import render
+    body, content_type = render()
+    return Response(content=body, media_type=content_type)
+
+
 @app.get("/api/trends/raw")
 async def get_raw_trends():
     """Return the mock raw trends (no LLM call)."""
@@ -89,85 +300,59 @@ async def get_raw_trends():
 
 
 @app.post("/api/vault/ingest")
-async def vault_ingest(req: IngestRequest):
+async def vault_ingest(req: IngestRequest, request: Request):
     """
     Trigger vault ingest and stream log lines back via SSE.
     """
     async def generate() -> AsyncGenerator[str, None]:
-        yield sse_event("log", {"message": f"Scanning vault at: {req.vault_path}"})
-        await asyncio.sleep(0.05)
         try:
-            import os as _os
-            from langchain_text_splitters import RecursiveCharacterTextSplitter
-            from langchain_community.document_loaders import TextLoader
-            from langchain_openai import OpenAIEmbeddings
-            from langchain_community.vectorstores import Chroma
+            from vault_ingest import aiter_ingest
             if not OPENAI_API_KEY:
                 yield sse_event("error", {"message": "OPENAI_API_KEY not set — cannot embed documents."})
                 return
-            documents = []
-            for root, dirs, files in _os.walk(req.vault_path):
-                for file in files:
-                    if file.endswith(".md"):
-                        file_path = _os.path.join(root, file)
-                        try:
-                            loader = TextLoader(file_path, encoding="utf-8")
-                            docs   = loader.load()
-                            documents.extend(docs)
-                            yield sse_event("log", {"message": f"   ✓ Loaded: {_os.path.basename(file_path)}"})
-                            await asyncio.sleep(0.02)
-                        except Exception as e:
-                            yield sse_event("warning", {"message": f"   ⚠ Skipped {file}: {e}"})
-            if not documents:
-                yield sse_event("warning", {"message": "No markdown files found in that path."})
-                return
-            yield sse_event("log", {"message": f"Found {len(documents)} file(s). Chunking…"})
-            await asyncio.sleep(0.05)
-            splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100, separators=["\n# ", "\n## ", "\n### ", "\n\n", "\n", " "])
-            chunks = splitter.split_documents(documents)
-            yield sse_event("log", {"message": f"Split into {len(chunks)} chunks. Embedding…"})
-            await asyncio.sleep(0.05)
-            embeddings   = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-            vectorstore  = Chroma.from_documents(documents=chunks, embedding=embeddings, persist_directory=req.chroma_path)
-            vectorstore.persist()
-            yield sse_event("success", {"message": f"Vault indexed to {req.chroma_path}"})
+            if await _ready():
+                embeddings = _memory_service.embeddings # Same model and HTTP client as retrieval
+            else:
+                from langchain_openai import OpenAIEmbeddings
+                embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+            async for level, message in aiter_ingest(req.vault_path, req.chroma_path, embeddings=embeddings, batch_size=req.batch_size, concurrency=req.concurrency, vector_backend=VECTOR_BACKEND):
+                yield sse_event(level, {"message": message})
+            if req.chroma_path == CHROMA_PATH:
+                if _memory_service is not None and RETRIEVAL_MODE != "vector":
+                    await asyncio.to_thread(_memory_service.reload_lexical) # Swap in the updated BM25 index before the next query needs it
+                _refresh_identity() # The vault version changed (or not; then this is a no-op)
         except Exception as e:
             yield sse_event("error", {"message": f"Ingest failed: {e}"})
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(until_disconnected(request, generate()), media_type="text/event-stream")
 
 
 @app.post("/api/scout")
-async def scout_trends(req: ScoutRequest):
+async def scout_trends(req: ScoutRequest, request: Request):
     """
     Trigger trend scouting and stream progress + results via SSE.
     Uses the mock TrendService (real LLM analysis requires API key).
     """
     async def generate() -> AsyncGenerator[str, None]:
         yield sse_event("log", {"message": "🔍 Starting trend scout…"})
-        await asyncio.sleep(0.1)
 
         try:
             from services.trend_service import TrendService
 
-            # Always fetch mock raw trends (no LLM required)
-            mock_trend = TrendService(llm_service=None)
-            raw = await mock_trend.fetch_raw_trends(theme=req.theme or None)
+            # Always fetch mock raw trends (no LLM required); the shared service coalesces identical fetches
+            trend_service = _trend_service or TrendService(llm_service=None)
+            raw = await trend_service.fetch_raw_trends(theme=req.theme or None)
 
             yield sse_event("log", {"message": f"Retrieved {len(raw)} raw trend signals (mock data)"})
-            await asyncio.sleep(0.1)
 
-            if OPENAI_API_KEY and _services_ready and _trend_service:
-                # Real LLM analysis
+            if await _ready():
+                # Real LLM analysis; each trend is sent as soon as the model closes its object
                 yield sse_event("log", {"message": "Analyzing trends with LLM…"})
-                identity_summary = req.theme or "A creative content creator."
-                analyzed = await _trend_service.analyze_trends(identity_summary, raw)
-                # Normalize: handle both list and dict responses
-                if isinstance(analyzed, dict):
-                    analyzed = analyzed.get("trends", list(analyzed.values())[0] if analyzed else [])
-                for trend in analyzed:
+                identity_summary = await _identity_service.summary()
+                count = 0
+                async for trend in _trend_service.stream_trends(identity_summary, raw, theme=req.theme or None):
+                    count += 1
                     yield sse_event("trend", {"trend": trend})
-                    await asyncio.sleep(0.15)
-                yield sse_event("log", {"message": f"Analysis complete — {len(analyzed)} trends scored."})
+                yield sse_event("log", {"message": f"Analysis complete — {count} trends scored."})
             else:
                 # Mock-only path — emit raw trends directly
                 if not OPENAI_API_KEY:
@@ -179,13 +364,160 @@ async def scout_trends(req: ScoutRequest):
                         "rationale": "Mock data — LLM analysis not available.",
                     }
                     yield sse_event("trend", {"trend": trend_out})
-                    await asyncio.sleep(0.2)
                 yield sse_event("log", {"message": f"Returned {len(raw)} mock trends."})
 
         except Exception as e:
             yield sse_event("error", {"message": f"Scout failed: {e}"})
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(until_disconnected(request, _admit(request, generate())), media_type="text/event-stream")
+
+
+@app.post("/api/script")
+async def stream_scripts(req: ScriptRequest, request: Request):
+    """
+    Draft one script per style for an idea, streaming tokens via SSE as they are generated.
+    """
+    async def generate() -> AsyncGenerator[str, None]:
+        if not await _ready():
+            yield sse_event("error", {"message": "LLM services not ready — cannot write scripts."})
+            return
+        from graph.nodes.script import script_split_node
+        state = {"selected_idea": req.idea, "constraints": req.constraints, "memory_context": [], "script_variants": []}
+        yield sse_event("log", {"message": f"✍ Drafting {len(req.styles)} script variant(s)…"})
+
+        async def draft_all():
+            return await asyncio.gather(*[script_split_node(style, _llm_service)(state) for style in req.styles])
+
+        try:
+            async for msg in relay_events(draft_all()):
+                yield msg
+            yield sse_event("success", {"message": "All script variants drafted."})
+        except Exception as e:
+            yield sse_event("error", {"message": f"Script drafting failed: {e}"})
+
+    return StreamingResponse(until_disconnected(request, _admit(request, generate())), media_type="text/event-stream")
+
+
+async def _prepare_session(req: SessionRequest) -> dict:
+    """Trend analysis for a new session; runs inside the session so its events are logged."""
+    from graph.events import emit
+    from main import build_initial_state, get_identity_summary
+    emit("log", {"message": "Analyzing trends…"})
+    identity_summary = await get_identity_summary(_identity_service)
+    trends = []
+    async for trend in _trend_service.stream_trends(identity_summary, theme=req.theme or None):
+        trends.append(trend)
+        emit("trend", {"trend": trend})
+    state = build_initial_state(req.theme, req.constraints, trends)
+    state["identity_summary"] = identity_summary
+    return state
+
+
+async def _require_manager():
+    if not await _ready() or _session_manager is None:
+        raise HTTPException(status_code=503, detail=f"LLM services not ready ({_readiness['state']}: {_readiness['detail']}).")
+    return _session_manager
+
+
+async def _require_session(session_id: str):
+    manager = await _require_manager()
+    session = await manager.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+    return manager, session
+
+
+@app.post("/api/session")
+async def create_session(req: SessionRequest, request: Request):
+    """
+    Start a creative session. The graph runs until it needs a human decision, then
+    pauses on a checkpoint; follow it with GET /api/session/{id}/events.
+    """
+    from api.sessions import QueueFull
+    manager = await _require_manager()
+    try:
+        session = manager.start(_prepare_session(req), tenant=_client_id(request))
+    except QueueFull as e:
+        raise _busy(e)
+    return session.snapshot()
+
+
+@app.get("/api/session/{session_id}")
+async def get_session(session_id: str):
+    _, session = await _require_session(session_id)
+    return session.snapshot()
+
+
+@app.get("/api/session/{session_id}/trace")
+async def get_session_trace(session_id: str):
+    """Spans (graph nodes, LLM calls) recorded for this session; requires SESSION_TRACES=1."""
+    _, session = await _require_session(session_id)
+    if session.trace is None:
+        raise HTTPException(status_code=404, detail="Tracing is off (set SESSION_TRACES=1).")
+    return {"session_id": session.id, "spans": session.trace.spans}
+
+
+@app.get("/api/session/{session_id}/events")
+async def session_events(session_id: str, request: Request, after: int = 0):
+    """
+    Stream session events via SSE until the session pauses for input or ends.
+    Reconnects resume after the `Last-Event-ID` header (or `?after=`).
+    """
+    _, session = await _require_session(session_id)
+    last_id = request.headers.get("last-event-id")
+    if last_id and last_id.isdigit():
+        after = int(last_id)
+
+    async def generate() -> AsyncGenerator[str, None]:
+        async for seq, event, data in session.subscribe(after):
+            yield sse_event(event, data, event_id=seq)
+
+    return StreamingResponse(until_disconnected(request, generate()), media_type="text/event-stream")
+
+
+async def _resume_session(session_id: str, stage: str, answer, request: Request):
+    from api.sessions import QueueFull
+    manager, _ = await _require_session(session_id)
+    try:
+        session = await manager.resume(session_id, stage, answer, tenant=_client_id(request))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except QueueFull as e:
+        raise _busy(e)
+    return session.snapshot()
+
+
+@app.post("/api/session/{session_id}/select")
+async def select_idea(session_id: str, req: SelectRequest, request: Request):
+    """Pick one of the ranked ideas offered in the `awaiting_input` event."""
+    return await _resume_session(session_id, "select_idea", req.index, request)
+
+
+@app.post("/api/session/{session_id}/approve")
+async def approve_script(session_id: str, req: ApproveRequest, request: Request):
+    """Approve the top script, or reject it with feedback."""
+    return await _resume_session(session_id, "approve_script", {"approved": req.approved, "feedback": req.feedback}, request)
+
+
+@app.post("/api/batch")
+async def start_batch(req: BatchRequest, request: Request):
+    """
+    Run themes headlessly (see batch.py --server), streaming one `result` event per
+    finished theme. Their LLM calls go through this server's scheduler at batch
+    priority, so interactive sessions are served first.
+    """
+    manager = await _require_manager()
+    from batch import AutoResolver, BatchRunner, parse_job
+    jobs = [job for job in (parse_job(row) for row in req.jobs) if job is not None]
+    runner = BatchRunner(manager.graph, _identity_service, _trend_service, AutoResolver(req.min_script_score), parallel=max(1, min(req.parallel, MAX_ACTIVE_RUNS)))
+
+    async def generate() -> AsyncGenerator[str, None]:
+        yield sse_event("log", {"message": f"Running {len(jobs)} theme(s), {runner.parallel} at a time…"})
+        async for record in runner.results(jobs):
+            yield sse_event("result", record)
+        yield sse_event("done", {"completed": runner.completed, "rejected": runner.rejected, "failed": runner.failed})
+
+    return StreamingResponse(until_disconnected(request, _admit(request, generate())), media_type="text/event-stream")
 
 
 # ── Serve GUI static files ─────────────────────────────────────────────────────
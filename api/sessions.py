@@ -0,0 +1,362 @@
+import asyncio
+import bisect
+import heapq
+import inspect
+import itertools
+import math
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+from langgraph.types import Command
+from graph.events import event_sink
+from services.metrics import Trace, tracing
+
+RUNNING = "running"
+AWAITING_INPUT = "awaiting_input"
+DONE = "done"
+FAILED = "failed"
+STOPPED = "stopped" # Checkpoint exists but the run died mid-step (e.g. server restart) or was abandoned
+
+TOKEN_EVENTS = frozenset({"script_token"}) # High-volume deltas, kept in their own bounded buffer
+
+
+class QueueFull(Exception):
+    """The worker pool (or this tenant's share of it) is full; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """
+    Caps concurrent pipeline runs. Callers beyond `max_running` wait in a FIFO queue
+    and are told their position as it changes; beyond `max_queued` waiters (or
+    `max_per_tenant` runs held or queued by one tenant) admission fails with QueueFull.
+    """
+
+    def __init__(self, max_running: int = 4, max_queued: int = 32, max_per_tenant: Optional[int] = None):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_per_tenant = max_per_tenant
+        self.running = 0
+        self._reserved = 0 # Admitted by reserve() but not yet waiting or running
+        self._waiters: Deque[Tuple[asyncio.Future, Callable[[int], None]]] = deque()
+        self._tenants: Dict[str, int] = {}
+        self._avg_seconds = 30.0 # EWMA of slot hold times, for Retry-After hints
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": self.running, "queued": len(self._waiters), "max_running": self.max_running, "max_queued": self.max_queued}
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._avg_seconds * (len(self._waiters) + 1) / self.max_running))
+
+    def check(self, tenant: str = ""):
+        """Raise QueueFull if a new run from `tenant` would be refused right now."""
+        if self.max_per_tenant and self._tenants.get(tenant, 0) >= self.max_per_tenant:
+            raise QueueFull(f"Too many active runs for this client (max {self.max_per_tenant})", self.retry_after())
+        if self.running + len(self._waiters) + self._reserved >= self.max_running + self.max_queued:
+            raise QueueFull(f"Server busy: {self.running} running, {len(self._waiters) + self._reserved} queued", self.retry_after())
+
+    def reserve(self, tenant: str = ""):
+        """
+        Admit a run now (raising QueueFull if it would be refused) so that a burst of
+        callers can't all pass check() before any of them reaches the queue. The
+        reservation is taken up by `slot(tenant, reserved=True)`.
+        """
+        self.check(tenant)
+        self._reserved += 1
+        self._tenants[tenant] = self._tenants.get(tenant, 0) + 1
+
+    def unreserve(self, tenant: str = ""):
+        """Give back a reserve() that no slot() will take up, e.g. because its task was cancelled before it started."""
+        self._reserved -= 1
+        self._untrack(tenant)
+
+    def _untrack(self, tenant: str):
+        self._tenants[tenant] -= 1
+        if not self._tenants[tenant]:
+            del self._tenants[tenant]
+
+    def _announce(self):
+        for position, (_, on_position) in enumerate(self._waiters, 1):
+            on_position(position)
+
+    async def _acquire(self, on_position: Callable[[int], None]):
+        if self.running < self.max_running and not self._waiters:
+            self.running += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((waiter, on_position))
+        on_position(len(self._waiters))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release() # The slot was handed over just as we were cancelled
+            else:
+                self._waiters.remove((waiter, on_position))
+                self._announce()
+            raise
+
+    def _release(self):
+        while self._waiters:
+            waiter, _ = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None) # Hand the slot straight to the next waiter
+                self._announce()
+                return
+        self.running -= 1
+
+    @asynccontextmanager
+    async def slot(self, tenant: str = "", on_position: Callable[[int], None] = lambda position: None, reserved: bool = False):
+        """
+        Hold a run slot for the block, waiting in line (and reporting the position) if none
+        is free. Raises QueueFull unless admission was already granted by reserve().
+        """
+        if not reserved:
+            self.reserve(tenant)
+        self._reserved -= 1
+        try:
+            await self._acquire(on_position)
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.monotonic() - started)
+                self._release()
+        finally:
+            self._untrack(tenant)
+
+
+class Session:
+    """
+    In-memory view of one graph thread: status, the pending human prompt, and the log
+    of events for SSE subscribers. Structural events (nodes, prompts, results) are all
+    kept, so a client reconnecting with after=0 can rebuild the session; token deltas
+    go to a separate buffer of the last `max_token_events`.
+    All durable state is in the checkpointer.
+    """
+
+    def __init__(self, session_id: str, max_token_events: int = 2000, trace: bool = False, tenant: str = ""):
+        self.id = session_id
+        self.tenant = tenant
+        self.trace: Optional[Trace] = Trace() if trace else None
+        self.status = RUNNING
+        self.pending: Optional[Dict[str, Any]] = None
+        self.position: Optional[int] = None # Place in the worker pool queue while waiting to run
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.token_events: Deque[Tuple[int, str, Dict[str, Any]]] = deque(maxlen=max_token_events)
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self.on_abandoned: Optional[Callable[["Session"], None]] = None # Called when the last subscriber leaves a running session
+        self.updated_at = time.monotonic()
+        self._seq = itertools.count(1)
+        self._wakeup = asyncio.Event()
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        (self.token_events if event in TOKEN_EVENTS else self.events).append((next(self._seq), event, data))
+        self.updated_at = time.monotonic()
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def _newer(self, position: int, after: int) -> Tuple[List[Tuple[int, str, Dict[str, Any]]], int]:
+        """Events after `after` in seq order, reading the structural log from index `position`; also the next position."""
+        tokens = []
+        for item in reversed(self.token_events): # Newest first; stop at the first one already sent
+            if item[0] <= after:
+                break
+            tokens.append(item)
+        end = len(self.events)
+        return list(heapq.merge(self.events[position:end], reversed(tokens))), end
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"session_id": self.id, "status": self.status, "pending": self.pending, "position": self.position}
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[Tuple[int, str, Dict[str, Any]]]:
+        """
+        Replay events newer than `after`, then follow live events until the run
+        pauses for input or ends. Clients re-subscribe after answering a prompt.
+        """
+        self.subscribers += 1
+        position = bisect.bisect_right(self.events, after, key=lambda item: item[0]) # Cursor into the structural log
+        try:
+            while True:
+                # Status is read before the replay: if it was already terminal, the terminal
+                # event is in this snapshot. If the run ends while we are paused at a yield,
+                # the next pass picks up its event. Each pass reads only what was published since the last.
+                wakeup, status = self._wakeup, self.status
+                newer, position = self._newer(position, after)
+                for seq, event, data in newer:
+                    after = seq
+                    yield seq, event, data
+                if status != RUNNING:
+                    return
+                await wakeup.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and self.status == RUNNING and self.on_abandoned is not None:
+                self.on_abandoned(self)
+
+
+class SessionManager:
+    """
+    Runs graph threads for the session API. A run lasts until the graph finishes or
+    hits a human interrupt; a paused session holds no task, only its checkpoint and a
+    small Session record, which is dropped after `idle_seconds` and rebuilt from the
+    checkpoint on the next request.
+
+    Runs take a slot from `pool` (queueing when it is busy). A running session whose
+    last event subscriber disconnected is cancelled after `abandon_seconds` unless a
+    client re-subscribes; its checkpoint is kept and it reports STOPPED.
+    """
+
+    def __init__(self, graph: Any, idle_seconds: float = 600.0, trace: bool = False, pool: Optional[WorkerPool] = None, abandon_seconds: float = 15.0):
+        self.graph = graph
+        self.idle_seconds = idle_seconds
+        self.trace = trace # Record per-session spans (nodes, LLM calls); see services.metrics
+        self.pool = pool or WorkerPool()
+        self.abandon_seconds = abandon_seconds
+        self.sessions: Dict[str, Session] = {}
+        self._timers: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _config(session_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": session_id}}
+
+    def start(self, graph_input: Any, tenant: str = "") -> Session:
+        """
+        `graph_input` is the initial state, or an awaitable producing it (run inside the session).
+        Raises QueueFull when the pool can't take another run from `tenant`.
+        """
+        self._evict_idle()
+        try:
+            self.pool.reserve(tenant)
+        except QueueFull:
+            if inspect.iscoroutine(graph_input):
+                graph_input.close() # Never awaited; avoid the "never awaited" warning
+            raise
+        session = self._new_session(uuid.uuid4().hex, tenant)
+        self.sessions[session.id] = session
+        self._launch(session, graph_input)
+        return session
+
+    def _launch(self, session: Session, graph_input: Any):
+        """Run the session on the reservation its caller took from the pool."""
+        session.task = asyncio.create_task(self._run(session, graph_input))
+        tenant = session.tenant
+
+        def done(task: asyncio.Task):
+            # A task cancelled before its first step never enters _run, so neither its slot() nor its except/finally runs
+            if task.cancelled():
+                self.pool.unreserve(tenant)
+                if inspect.iscoroutine(graph_input):
+                    graph_input.close()
+                if session.task is task:
+                    session.task = None
+                    session.status, session.position = STOPPED, None
+                    session.publish(STOPPED, {"reason": "cancelled"})
+        session.task.add_done_callback(done)
+
+    def _new_session(self, session_id: str, tenant: str = "") -> Session:
+        session = Session(session_id, trace=self.trace, tenant=tenant)
+        session.on_abandoned = self._abandon_later
+        return session
+
+    def _abandon_later(self, session: Session):
+        if session.id not in self._timers:
+            self._timers[session.id] = asyncio.create_task(self._abandon(session))
+
+    async def _abandon(self, session: Session):
+        try:
+            await asyncio.sleep(self.abandon_seconds)
+            if not session.subscribers and session.task is not None:
+                print(f"[sessions] {session.id} abandoned by its client; cancelling the run")
+                session.task.cancel()
+        finally:
+            del self._timers[session.id]
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        session = self.sessions.get(session_id)
+        if session is not None:
+            return session
+        snapshot = await self.graph.aget_state(self._config(session_id))
+        if not snapshot.values:
+            return None
+        session = self._new_session(session_id)
+        interrupts = [i for task in snapshot.tasks for i in task.interrupts]
+        if interrupts:
+            session.status, session.pending = AWAITING_INPUT, interrupts[0].value
+            session.publish(AWAITING_INPUT, session.pending)
+        elif snapshot.next:
+            session.status = STOPPED
+            session.publish(STOPPED, {"next": list(snapshot.next)})
+        else:
+            session.status = DONE
+            session.publish(DONE, {"final_package": snapshot.values.get("final_package")})
+        self.sessions[session_id] = session
+        return session
+
+    async def resume(self, session_id: str, stage: str, answer: Any, tenant: str = "") -> Session:
+        """
+        Answer the pending prompt; raises KeyError for unknown sessions, ValueError if not
+        waiting on `stage`, QueueFull if the pool can't take the run.
+        """
+        session = await self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        if session.status != AWAITING_INPUT or (session.pending or {}).get("stage") != stage:
+            raise ValueError(f"Session {session_id} is not waiting for '{stage}' (status: {session.status})")
+        self.pool.reserve(tenant)
+        session.tenant = tenant
+        session.status, session.pending = RUNNING, None
+        self._launch(session, Command(resume=answer))
+        return session
+
+    async def _run(self, session: Session, graph_input: Any):
+        final_state: Dict[str, Any] = {}
+        pending = None
+
+        def queued(position: int):
+            session.position = position
+            session.publish("queued", {"position": position, "retry_after": self.pool.retry_after()})
+
+        try:
+            async with self.pool.slot(session.tenant, queued, reserved=True):
+                session.position = None
+                session.publish("status", {"status": RUNNING})
+                with event_sink(session.publish), tracing(session.trace):
+                    if inspect.isawaitable(graph_input):
+                        graph_input = await graph_input
+                    async for mode, chunk in self.graph.astream(graph_input, self._config(session.id), stream_mode=["updates", "values"]):
+                        if mode == "values":
+                            final_state = chunk
+                        elif "__interrupt__" in chunk:
+                            pending = chunk["__interrupt__"][0].value
+                        else:
+                            for node_name in chunk:
+                                session.publish("node", {"node": node_name})
+            if pending is not None:
+                session.status, session.pending = AWAITING_INPUT, pending
+                session.publish(AWAITING_INPUT, pending)
+            else:
+                session.status = DONE
+                session.publish(DONE, {"final_package": final_state.get("final_package")})
+        except asyncio.CancelledError: # Abandoned or shutting down; in-flight provider calls are cancelled with the graph
+            if inspect.iscoroutine(graph_input):
+                graph_input.close()
+            session.status, session.position = STOPPED, None
+            session.publish(STOPPED, {"reason": "cancelled"})
+        except Exception as e:
+            session.status = FAILED
+            session.publish("error", {"message": f"Session failed: {e}"})
+        finally:
+            session.task = None
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for session_id, session in list(self.sessions.items()):
+            if session.task is None and session.status != RUNNING and session.updated_at < cutoff:
+                del self.sessions[session_id]
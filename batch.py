@@ -0,0 +1,294 @@
+"""
+Headless batch mode: run many themes through the creative graph concurrently.
+
+    python batch.py themes.jsonl --out packages.jsonl --parallel 8
+    python batch.py themes.jsonl --out packages.jsonl --server http://localhost:8000
+
+Input is JSONL ({"theme": ..., "constraints": [...], "id": optional}) or CSV with
+`theme`, `constraints` (separated by ";") and optional `id` columns. Human steps are
+answered by an automatic policy, and each result is appended to the output JSONL as
+soon as its session finishes. Rerunning with the same output skips themes already
+done; sessions that were cut off resume from their checkpoint.
+
+With --server the themes run inside a running API server (POST /api/batch) and share
+its LLM scheduler, where batch calls queue behind interactive sessions. Run on its
+own, this process has its own scheduler and rate limits.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.types import Command
+from graph.build_graph import build_graph
+from graph.nodes.idea import score_value
+from main import build_initial_state, get_identity_summary
+from services.identity_service import IdentityService
+from services.llm import LLMService
+from services.llm_scheduler import PRIORITY_BATCH
+from services.memory_service import MemoryService
+from services.prompt_packer import compact
+from services.trend_service import TrendService
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./checkpoints.sqlite")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+MODELS_CONFIG = os.getenv("MODELS_CONFIG", os.path.join("config", "models.yaml"))
+
+
+def job_id(theme: str, constraints: List[str]) -> str:
+    return hashlib.sha1(compact([theme, constraints]).encode("utf-8")).hexdigest()[:16]
+
+
+def parse_job(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A job from an input row ({"theme", "constraints", "id"}); None without a theme."""
+    theme = str(row.get("theme") or "").strip()
+    if not theme:
+        return None
+    constraints = row.get("constraints") or []
+    if isinstance(constraints, str):
+        constraints = [c.strip() for c in constraints.split(";") if c.strip()]
+    return {"id": str(row.get("id") or job_id(theme, constraints)), "theme": theme, "constraints": list(constraints)}
+
+
+def read_jobs(path: str) -> List[Dict[str, Any]]:
+    """Themes from a JSONL or CSV file, deduplicated by id (explicit, or a hash of theme + constraints)."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows: Iterable[Dict[str, Any]] = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    jobs: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        job = parse_job(row)
+        if job is not None:
+            jobs.setdefault(job["id"], job)
+    return list(jobs.values())
+
+
+def finished_ids(out_path: str) -> set:
+    """Ids already written as "done" or "rejected"; failed ones are retried."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # A line cut off by a crash
+            if record.get("status") in ("done", "rejected"):
+                done.add(record.get("id"))
+    return done
+
+
+class AutoResolver:
+    """
+    Answers the human steps: picks the best-scored idea, and approves the top script
+    (the best critic score) unless it scores below `min_script_score`.
+    """
+
+    def __init__(self, min_script_score: Optional[float] = None):
+        self.min_script_score = min_script_score
+
+    def answer(self, pending: Dict[str, Any]) -> Any:
+        if pending["stage"] == "select_idea":
+            ideas = pending["ideas"]
+            return max(range(len(ideas)), key=lambda i: score_value(ideas[i])) if ideas else 0
+        script = pending["script"]
+        if self.min_script_score is not None and score_value(script) < self.min_script_score:
+            return {"approved": False, "feedback": f"Critic score below the batch threshold of {self.min_script_score}"}
+        return {"approved": True}
+
+
+class BatchRunner:
+    def __init__(self, graph, identity_service: IdentityService, trend_service: TrendService, resolver: AutoResolver, parallel: int = 4):
+        self.graph = graph
+        self.identity = identity_service
+        self.trends = trend_service
+        self.resolver = resolver
+        self.parallel = parallel
+        self.completed = 0
+        self.rejected = 0 # Finished, but the script was refused (--min-script-score); no package was built
+        self.failed = 0
+
+    async def _graph_input(self, job: Dict[str, Any], config: Dict[str, Any]) -> Any:
+        """Fresh state, or where an earlier run of this job stopped."""
+        snapshot = await self.graph.aget_state(config)
+        if not snapshot.values:
+            identity = await get_identity_summary(self.identity)
+            state = build_initial_state(job["theme"], job["constraints"], await self.trends.analyze_trends(identity, theme=job["theme"]))
+            state["identity_summary"] = identity
+            return state
+        interrupts = [i for task in snapshot.tasks for i in task.interrupts]
+        if interrupts:
+            return Command(resume=self.resolver.answer(interrupts[0].value))
+        return None # Continue from the checkpoint (also a no-op for a finished thread)
+
+    async def run_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        config = {"configurable": {"thread_id": f"batch-{job['id']}"}}
+        started = time.perf_counter()
+        graph_input = await self._graph_input(job, config)
+        final_state: Dict[str, Any] = {}
+        while True:
+            pending = None
+            async for mode, chunk in self.graph.astream(graph_input, config, stream_mode=["updates", "values"]):
+                if mode == "values":
+                    final_state = chunk
+                elif "__interrupt__" in chunk:
+                    pending = chunk["__interrupt__"][0].value
+            if pending is None:
+                break
+            graph_input = Command(resume=self.resolver.answer(pending))
+        if not final_state: # Finished in an earlier run; nothing was re-executed
+            final_state = (await self.graph.aget_state(config)).values
+        return {
+            **job,
+            "status": "rejected" if final_state.get("approval_stage") == "script_rejected" else "done",
+            "approval_stage": final_state.get("approval_stage"),
+            "selected_idea": final_state.get("selected_idea"),
+            "selected_script": final_state.get("selected_script"),
+            "final_package": final_state.get("final_package"),
+            "branch_errors": final_state.get("branch_errors", []),
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+
+    async def _record(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            record = await self.run_job(job)
+        except Exception as e:
+            self.failed += 1
+            return {**job, "status": "failed", "error": repr(e)}
+        if record["status"] == "rejected":
+            self.rejected += 1
+        else:
+            self.completed += 1
+        return record
+
+    async def results(self, jobs: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Result records, each as soon as its job finishes; `parallel` jobs run at once. Closing early cancels the rest."""
+        todo: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            todo.put_nowait(job)
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            while not todo.empty():
+                finished.put_nowait(await self._record(todo.get_nowait()))
+
+        with LLMService.priority(PRIORITY_BATCH): # Interactive traffic on the same scheduler goes first
+            workers = [asyncio.ensure_future(worker()) for _ in range(min(self.parallel, len(jobs)))]
+        try:
+            for _ in jobs:
+                yield await finished.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def run(self, jobs: List[Dict[str, Any]], out_path: str):
+        with open(out_path, "a", encoding="utf-8") as out:
+            async for record in self.results(jobs):
+                write_record(out, record, self.completed + self.rejected + self.failed, len(jobs))
+
+
+def write_record(out, record: Dict[str, Any], count: int, total: int):
+    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    out.flush()
+    print(f"[batch] {count}/{total} {record['status']}: {record['theme'][:60]}")
+
+
+def _pending_jobs(input_path: str, out_path: str, parallel: int) -> List[Dict[str, Any]]:
+    jobs = read_jobs(input_path)
+    done = finished_ids(out_path)
+    todo = [job for job in jobs if job["id"] not in done]
+    print(f"[batch] {len(jobs)} theme(s) in {input_path}; {len(jobs) - len(todo)} already done, {len(todo)} to run with parallelism {parallel}")
+    return todo
+
+
+async def read_sse(lines: AsyncIterator[bytes]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """(event, data) pairs from a server-sent event stream."""
+    event, data = "message", []
+    async for raw in lines:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+
+
+async def run_remote(server: str, input_path: str, out_path: str, parallel: int, min_script_score: Optional[float]):
+    """Run the themes in the API server at `server`, appending each streamed result to `out_path`."""
+    import aiohttp
+    todo = _pending_jobs(input_path, out_path, parallel)
+    if not todo:
+        return
+    body = {"jobs": todo, "parallel": parallel, "min_script_score": min_script_score}
+    counts = {"done": 0, "rejected": 0, "failed": 0}
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_read=None)) as http:
+        async with http.post(f"{server.rstrip('/')}/api/batch", json=body, headers={"X-Client-Id": "batch"}) as response:
+            if response.status != 200:
+                print(f"[batch] server refused the batch ({response.status}): {await response.text()}")
+                return
+            with open(out_path, "a", encoding="utf-8") as out:
+                async for event, data in read_sse(response.content):
+                    if event == "result":
+                        counts[data["status"]] = counts.get(data["status"], 0) + 1
+                        write_record(out, data, sum(counts.values()), len(todo))
+                    elif event == "queued":
+                        print(f"[batch] waiting for a server worker (position {data.get('position')})")
+                    elif event in ("log", "warning", "error"):
+                        print(f"[batch] server {event}: {data.get('message')}")
+    elapsed = time.perf_counter() - started
+    print(f"[batch] {counts['done']} done, {counts['rejected']} rejected, {counts['failed']} failed in {elapsed:.1f}s via {server} -> {out_path}")
+
+
+async def run_batch(input_path: str, out_path: str, parallel: int, min_script_score: Optional[float], config_path: str, checkpoint_path: str):
+    todo = _pending_jobs(input_path, out_path, parallel)
+    if not todo:
+        return
+    model_map = LLMService.load_config_from_yaml(config_path)
+    settings = LLMService.load_settings_from_yaml(config_path)
+    llm_service = LLMService(api_key=OPENAI_API_KEY, model_map=model_map, google_api_key=GOOGLE_API_KEY, settings=settings)
+    memory_service = MemoryService(persist_directory=CHROMA_PATH, embedding_api_key=OPENAI_API_KEY, retrieval_mode=RETRIEVAL_MODE, vector_backend=VECTOR_BACKEND)
+    trend_service = TrendService(llm_service)
+    started = time.perf_counter()
+    async with AsyncSqliteSaver.from_conn_string(checkpoint_path) as checkpointer:
+        graph = build_graph(llm_service=llm_service, memory_service=memory_service, trend_service=trend_service, checkpointer=checkpointer, **(settings.get("graph") or {}))
+        runner = BatchRunner(graph, IdentityService(memory_service, llm_service, CHROMA_PATH), trend_service, AutoResolver(min_script_score), parallel=parallel)
+        await runner.run(todo, out_path)
+    elapsed = time.perf_counter() - started
+    print(f"[batch] {runner.completed} done, {runner.rejected} rejected, {runner.failed} failed in {elapsed:.1f}s ({runner.completed / max(elapsed, 1e-9) * 3600:.0f} themes/hour) -> {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many themes through the creative pipeline without human input")
+    parser.add_argument("input", help="Themes as JSONL or CSV")
+    parser.add_argument("--out", default="batch_output.jsonl", help="Results JSONL (appended; finished themes are skipped on rerun)")
+    parser.add_argument("--parallel", type=int, default=4, help="Sessions run concurrently")
+    parser.add_argument("--min-script-score", type=float, default=None, help="Reject top scripts scoring below this instead of approving them")
+    parser.add_argument("--config", default=MODELS_CONFIG, help="models.yaml to use")
+    parser.add_argument("--checkpoints", default=CHECKPOINT_PATH, help="Checkpoint database (lets cut-off sessions resume)")
+    parser.add_argument("--server", default=None, help="Run the themes in this API server (e.g. http://localhost:8000), sharing its LLM scheduler")
+    args = parser.parse_args()
+    if args.server:
+        asyncio.run(run_remote(args.server, args.input, args.out, args.parallel, args.min_script_score))
+    elif not OPENAI_API_KEY:
+        print("Error: OPENAI_API_KEY not found in environment.")
+    else:
+        asyncio.run(run_batch(args.input, args.out, args.parallel, args.min_script_score, args.config, args.checkpoints))
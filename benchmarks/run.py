@@ -0,0 +1,304 @@
+"""
+Offline benchmarks for the scouting pipeline, using the fake LLM provider and fake embeddings.
+
+    python -m benchmarks.run --sizes 20,200 --sessions 1,8 --out bench.json
+    python -m benchmarks.run --out new.json --baseline bench.json --threshold 0.15
+
+For each synthetic vault size this measures ingest (cold and no-op re-run),
+retrieval latency per mode (vector, hybrid, lexical), full graph sessions (per-node latency, end-to-end p50/p95, throughput at N concurrent
+sessions) and the /api/scout stream, plus peak traced memory per scenario.
+With --baseline, metrics that got worse by more than --threshold are reported
+and the exit code is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+from starlette.requests import Request
+
+from benchmarks.synthetic import make_vault
+from graph.build_graph import build_graph
+from graph.nodes.ranking import RankingEngine
+from main import build_initial_state, get_identity_summary
+from services.fake_provider import FakeEmbeddings
+from services.identity_service import IdentityService
+from services.llm import LLMService
+from services.memory_service import MemoryService
+from services.trend_service import TrendService
+from services.vector_store import VECTOR_BACKENDS
+from vault_ingest import aiter_ingest
+
+BENCH_CONFIG = os.path.join("config", "models.bench.yaml")
+RETRIEVAL_QUERIES = ["synth repair", "tape archives glitch", "mechanical keyboards", "film photography light", "home lab build fail", "indie games pacing"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+    }
+
+
+class MemoryProbe:
+    """Peak Python heap (tracemalloc) over a block."""
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, *exc):
+        self.peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+
+
+async def bench_ingest(vault: str, chroma: str, embeddings: FakeEmbeddings, batch_size: int, concurrency: int, backend: str = "chroma") -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    for label in ("cold", "warm"): # warm: nothing changed, so only the manifest check runs
+        with MemoryProbe() as probe:
+            started = time.perf_counter()
+            async for level, message in aiter_ingest(vault, chroma, embeddings=embeddings, batch_size=batch_size, concurrency=concurrency, vector_backend=backend):
+                if level == "error":
+                    raise RuntimeError(message)
+            result[f"{label}_seconds"] = time.perf_counter() - started
+        result[f"{label}_peak_mb"] = probe.peak_mb
+    return result
+
+
+def bench_retrieval(memory: MemoryService, rounds: int = 5) -> Dict[str, Any]:
+    """Cold-query latency per retrieval mode (query embedding cache cleared before each query)."""
+    result: Dict[str, Any] = {}
+    for mode in ("vector", "hybrid", "lexical"):
+        times: List[float] = []
+        for _ in range(rounds):
+            for query in RETRIEVAL_QUERIES:
+                memory._query_cache.clear()
+                started = time.perf_counter()
+                memory.retrieve_context(query, k=8, mode=mode)
+                times.append(time.perf_counter() - started)
+        result[mode] = summarize(times)
+    return result
+
+
+async def run_session(graph, identity_service: IdentityService, trends: TrendService, thread_id: str, node_times: Dict[str, List[float]]) -> float:
+    """One scouting session end to end; human steps pick the top idea and approve the top script."""
+    started = time.perf_counter()
+    identity = await get_identity_summary(identity_service)
+    state = build_initial_state("retro tech", ["under 60s"], await trends.analyze_trends(identity))
+    state["identity_summary"] = identity
+    config = {"configurable": {"thread_id": thread_id}}
+    graph_input: Any = state
+    task_started: Dict[str, float] = {}
+    while graph_input is not None:
+        pending = None
+        async for mode, chunk in graph.astream(graph_input, config, stream_mode=["tasks", "updates"]):
+            if mode == "tasks":
+                if "input" in chunk:
+                    task_started[chunk["id"]] = time.perf_counter()
+                elif chunk["id"] in task_started and not chunk.get("interrupts"):
+                    node_times.setdefault(chunk["name"], []).append(time.perf_counter() - task_started.pop(chunk["id"]))
+            elif "__interrupt__" in chunk:
+                pending = chunk["__interrupt__"][0].value
+        if pending is None:
+            graph_input = None
+        elif pending["stage"] == "select_idea":
+            graph_input = Command(resume=0)
+        else:
+            graph_input = Command(resume={"approved": True})
+    return time.perf_counter() - started
+
+
+async def bench_graph(llm: LLMService, memory: MemoryService, concurrency: int, rounds: int) -> Dict[str, Any]:
+    graph = build_graph(llm, memory, None, checkpointer=InMemorySaver())
+    trends = TrendService(llm)
+    identity_service = IdentityService(memory, llm, memory.persist_directory)
+    node_times: Dict[str, List[float]] = {}
+    latencies: List[float] = []
+    calls_before = llm.fake.calls
+    with MemoryProbe() as probe:
+        started = time.perf_counter()
+        for r in range(rounds):
+            latencies += await asyncio.gather(*[run_session(graph, identity_service, trends, f"bench-{concurrency}-{r}-{i}", node_times) for i in range(concurrency)])
+        wall = time.perf_counter() - started
+    return {
+        "end_to_end_seconds": summarize(latencies),
+        "throughput_sessions_per_second": len(latencies) / wall,
+        "llm_calls_per_session": (llm.fake.calls - calls_before) / max(1, len(latencies)),
+        "peak_mb": probe.peak_mb,
+        "nodes": {name: summarize(times) for name, times in sorted(node_times.items())},
+    }
+
+
+async def bench_ranking(llm: LLMService, pool_sizes: List[int], rounds: int = 3) -> Dict[str, Any]:
+    """RankingEngine latency and critic calls as the idea pool grows."""
+    engine = RankingEngine(llm)
+    result: Dict[str, Any] = {}
+    for size in pool_sizes:
+        pool = [{"title": f"Idea {i}", "hook": f"hook {i} " * 6, "twist": f"twist {i} " * 6, "style": f"style_{i % 12}"} for i in range(size)]
+        times: List[float] = []
+        calls_before = llm.fake.calls
+        for r in range(rounds):
+            started = time.perf_counter()
+            await engine.rank([dict(idea, round=r) for idea in pool])
+            times.append(time.perf_counter() - started)
+        result[f"pool_{size}"] = {"seconds": summarize(times), "llm_calls": (llm.fake.calls - calls_before) / rounds}
+    return result
+
+
+async def bench_scout(llm: LLMService, memory: MemoryService, requests: int) -> Dict[str, Any]:
+    """Drive the /api/scout handler's SSE stream directly (no HTTP transport in the measurement)."""
+    from api import server
+    server.OPENAI_API_KEY = server.OPENAI_API_KEY or "offline"
+    server._llm_service, server._memory_service, server._trend_service = llm, memory, TrendService(llm)
+    server._identity_service = IdentityService(memory, llm, memory.persist_directory)
+    server._services_ready = True
+    request = Request({"type": "http", "method": "POST", "path": "/api/scout", "headers": [], "query_string": b"", "client": ("bench", 0)}, receive=asyncio.Event().wait) # Never disconnects
+    first_trend: List[float] = []
+    totals: List[float] = []
+    with MemoryProbe() as probe:
+        for i in range(requests):
+            started = time.perf_counter()
+            response = await server.scout_trends(server.ScoutRequest(theme=f"retro tech {i}"), request)
+            seen_trend = False
+            async for message in response.body_iterator:
+                if not seen_trend and message.startswith("event: trend"):
+                    first_trend.append(time.perf_counter() - started)
+                    seen_trend = True
+            totals.append(time.perf_counter() - started)
+    return {"first_trend_seconds": summarize(first_trend), "total_seconds": summarize(totals), "peak_mb": probe.peak_mb}
+
+
+async def run_benchmarks(args) -> Dict[str, Any]:
+    model_map = LLMService.load_config_from_yaml(args.config)
+    settings = LLMService.load_settings_from_yaml(args.config)
+    results: Dict[str, Any] = {"config": args.config, "backend": args.backend, "sizes": {}}
+    workdir = tempfile.mkdtemp(prefix="scout-bench-")
+    try:
+        for size in args.sizes:
+            vault, chroma = os.path.join(workdir, f"vault_{size}"), os.path.join(workdir, f"chroma_{size}")
+            make_vault(vault, size, seed=size)
+            embeddings = FakeEmbeddings(latency_ms=args.embed_latency_ms)
+            print(f"[bench] vault={size} files: ingest…")
+            size_result: Dict[str, Any] = {"ingest": await bench_ingest(vault, chroma, embeddings, args.batch_size, args.ingest_concurrency, args.backend), "graph": {}}
+            started = time.perf_counter()
+            memory = MemoryService(persist_directory=chroma, embedding_api_key="", embeddings=embeddings, vector_backend=args.backend)
+            memory.store.count()
+            size_result["store_open_seconds"] = time.perf_counter() - started
+            size_result["retrieval_seconds"] = await asyncio.to_thread(bench_retrieval, memory)
+            for sessions in args.sessions:
+                print(f"[bench] vault={size} files: {sessions} concurrent session(s)…")
+                llm = LLMService(api_key="offline", model_map=model_map, settings=settings)
+                size_result["graph"][f"concurrency_{sessions}"] = await bench_graph(llm, memory, sessions, args.rounds)
+            print(f"[bench] vault={size} files: /api/scout…")
+            size_result["scout"] = await bench_scout(LLMService(api_key="offline", model_map=model_map, settings=settings), memory, args.scout_requests)
+            results["sizes"][str(size)] = size_result
+        print("[bench] idea ranking…")
+        results["ranking"] = await bench_ranking(LLMService(api_key="offline", model_map=model_map, settings=settings), args.rank_pools)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    results["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and not path.endswith(".n"):
+            flat[path] = float(value)
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Metrics that got worse by more than `threshold` (relative). Throughput is higher-is-better; the rest lower."""
+    now, before = flatten(current), flatten(baseline)
+    regressions = []
+    for path, old in sorted(before.items()):
+        new = now.get(path)
+        if new is None or old <= 0 or abs(new - old) < 0.01: # Ignore sub-10ms / sub-10KB jitter
+            continue
+        change = (old - new) / old if "throughput" in path else (new - old) / old
+        if change > threshold:
+            regressions.append(f"{path}: {old:.4g} -> {new:.4g} ({change:+.0%} worse)")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]):
+    for size, data in results["sizes"].items():
+        ingest = data["ingest"]
+        print(f"\n== vault: {size} files ==")
+        print(f"ingest   cold {ingest['cold_seconds']:.2f}s  warm {ingest['warm_seconds']:.2f}s  peak {ingest['cold_peak_mb']:.1f} MB")
+        for label, g in data["graph"].items():
+            e2e = g["end_to_end_seconds"]
+            print(f"graph    {label}: p50 {e2e['p50']:.2f}s  p95 {e2e['p95']:.2f}s  {g['throughput_sessions_per_second']:.2f} sessions/s  {g['llm_calls_per_session']:.1f} calls/session  peak {g['peak_mb']:.1f} MB")
+            for node, stats in g["nodes"].items():
+                print(f"           {node:<20} p50 {stats['p50'] * 1000:7.0f} ms  p95 {stats['p95'] * 1000:7.0f} ms")
+        retrieval = "  ".join(f"{mode} p50 {stats['p50'] * 1000:.1f} ms" for mode, stats in data["retrieval_seconds"].items())
+        print(f"retrieve {retrieval}  (open {data['store_open_seconds'] * 1000:.1f} ms)")
+        scout = data["scout"]
+        print(f"scout    first trend p50 {scout['first_trend_seconds']['p50']:.2f}s  total p50 {scout['total_seconds']['p50']:.2f}s  p95 {scout['total_seconds']['p95']:.2f}s")
+    ranking = "  ".join(f"{pool.split('_')[1]} ideas p50 {r['seconds']['p50']:.2f}s ({r['llm_calls']:.0f} calls)" for pool, r in results["ranking"].items())
+    print(f"\nrank     {ranking}")
+    print(f"vector backend {results['backend']}  max RSS {results['max_rss_mb']:.0f} MB")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks (fake LLM provider)")
+    parser.add_argument("--config", default=BENCH_CONFIG, help="models.yaml to benchmark; roles should use fake-* models")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[20, 200], help="Synthetic vault sizes (files), comma-separated")
+    parser.add_argument("--sessions", type=lambda s: [int(x) for x in s.split(",")], default=[1, 8], help="Concurrent session counts, comma-separated")
+    parser.add_argument("--rounds", type=int, default=3, help="Batches of concurrent sessions per measurement")
+    parser.add_argument("--scout-requests", type=int, default=5)
+    parser.add_argument("--rank-pools", type=lambda s: [int(x) for x in s.split(",")], default=[12, 48, 120], help="Idea pool sizes for the ranking benchmark, comma-separated")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--ingest-concurrency", type=int, default=4)
+    parser.add_argument("--backend", choices=VECTOR_BACKENDS, default="chroma", help="Vector store to ingest into and query")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0, help="Simulated latency per embedding batch")
+    parser.add_argument("--out", default=None, help="Write results JSON here")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change that counts as a regression")
+    args = parser.parse_args(argv)
+
+    tracemalloc.start()
+    results = asyncio.run(run_benchmarks(args))
+    tracemalloc.stop()
+    print_report(results)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import os
+import random
+from typing import List
+
+_TOPICS = ["retro computing", "desk setups", "film photography", "synth repair", "urban sketching", "home lab", "speedruns", "mechanical keyboards", "tape archives", "indie games"]
+_WORDS = (
+    "hook story camera edit cut light tone voice pacing reveal twist audience archive restore glitch "
+    "nostalgia minimal build fail lesson process detail texture loop rhythm frame sound studio draft"
+).split()
+
+
+def _paragraph(rng: random.Random, topic: str, words: int) -> str:
+    body = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return f"{topic.capitalize()} notes: {body}."
+
+
+def make_vault(path: str, files: int, seed: int = 0, min_paragraphs: int = 2, max_paragraphs: int = 8) -> List[str]:
+    """Write `files` markdown notes with headings and topic-flavoured prose; returns their paths."""
+    rng = random.Random(seed)
+    written = []
+    for i in range(files):
+        topic = rng.choice(_TOPICS)
+        folder = os.path.join(path, topic.replace(" ", "_"))
+        os.makedirs(folder, exist_ok=True)
+        sections = []
+        for s in range(rng.randint(min_paragraphs, max_paragraphs)):
+            sections.append(f"## Section {s + 1}\n\n{_paragraph(rng, topic, rng.randint(40, 160))}\n")
+        file_path = os.path.join(folder, f"note_{i:05d}.md")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(f"# {topic.title()} {i}\n\n" + "\n".join(sections))
+        written.append(file_path)
+    return written
@@ -1,51 +1,68 @@
+from typing import List, Optional
 from langgraph.graph import StateGraph, END
 from graph.state import CreativeState
 from graph.nodes.memory import memory_pull_node
-from graph.nodes.idea import idea_divergence_node, idea_ranking_node
-from graph.nodes.human import human_select_idea_node, human_script_approval_node
+from graph.nodes.idea import idea_dedup_node, idea_divergence_node
+from graph.nodes.ranking import idea_ranking_node
+from graph.nodes.human import human_select_idea_node, human_script_approval_node, idea_router
 from graph.nodes.script import script_split_node
 from graph.nodes.critic import critic_node, critic_router
 from graph.nodes.final import final_package_node
+from services.metrics import timed_node
 
-def build_graph(llm_service, memory_service, trend_service):
+IDEA_STYLES = ["cinematic", "chaotic", "technical", "meta"]
+SCRIPT_STYLES = ["dramatic", "meme", "documentary"]
+
+def build_graph(llm_service, memory_service, trend_service, branch_timeout: float = 90.0, script_timeout: float = 180.0, checkpointer=None, idea_dedup_threshold: float = 0.92,
+                idea_styles: Optional[List[str]] = None, rank_batch_size: int = 8, rank_pairwise_top: int = 0):
+    """
+    The creative pipeline. The keyword options can come from the `graph` section of
+    models.yaml: `idea_styles` sets the brainstorm fan-out (one branch per style),
+    `rank_batch_size` and `rank_pairwise_top` tune the RankingEngine.
+    """
     builder = StateGraph(CreativeState)
 
+    def add_node(name, fn):
+        builder.add_node(name, timed_node(name, fn)) # Per-node wall time metric and trace span
+
     # Add nodes
-    builder.add_node("memory_pull", memory_pull_node(memory_service))
-    builder.add_node("idea_rank", idea_ranking_node(llm_service))
-    builder.add_node("critic", critic_node(llm_service))
-    builder.add_node("human_idea", human_select_idea_node)
-    builder.add_node("human_script", human_script_approval_node)
-    builder.add_node("final_package", final_package_node)
-
-    # Parallel idea nodes
-    for style in ["cinematic", "chaotic", "technical", "meta"]:
+    add_node("memory_pull", memory_pull_node(memory_service))
+    add_node("idea_dedup", idea_dedup_node(memory_service, threshold=idea_dedup_threshold))
+    add_node("idea_rank", idea_ranking_node(llm_service, batch_size=rank_batch_size, pairwise_top=rank_pairwise_top))
+    add_node("critic", critic_node(llm_service))
+    add_node("human_idea", human_select_idea_node)
+    add_node("human_script", human_script_approval_node)
+    add_node("final_package", final_package_node(llm_service))
+
+    # Parallel idea nodes (async; results merge through the idea_pool reducer)
+    idea_nodes = []
+    for style in idea_styles or IDEA_STYLES:
         node_id = f"idea_{style}"
-        builder.add_node(node_id, idea_divergence_node(style, llm_service))
+        add_node(node_id, idea_divergence_node(style, llm_service, timeout=branch_timeout))
         builder.add_edge("memory_pull", node_id)
-        builder.add_edge(node_id, "idea_rank")
+        idea_nodes.append(node_id)
+    builder.add_edge(idea_nodes, "idea_dedup") # Fan-in: wait for every branch
+    builder.add_edge("idea_dedup", "idea_rank")
 
     builder.add_edge("idea_rank", "human_idea")
 
-    # Script branches
-    for style in ["dramatic", "meme", "documentary"]:
+    # Script branches (async; results merge by style through the script_variants reducer)
+    script_nodes = []
+    for style in SCRIPT_STYLES:
         node_id = f"script_{style}"
-        builder.add_node(node_id, script_split_node(style, llm_service))
-        builder.add_edge("human_idea", node_id)
-        builder.add_edge(node_id, "critic")
+        add_node(node_id, script_split_node(style, llm_service, timeout=script_timeout))
+        builder.add_edge(node_id, "critic") # Plain edges: the critic runs once after whichever branches ran this step
+        script_nodes.append(node_id)
+    builder.add_conditional_edges("human_idea", idea_router(script_nodes), {**{node_id: node_id for node_id in script_nodes}, "end": END}) # No ideas: nothing to write
 
-    # Routing
+    # Routing: failing variants loop back to their own script node; passing ones are kept
     builder.add_conditional_edges(
         "critic",
         critic_router,
-        {
-            "rewrite": "human_idea", # Loop back to re-select or refine? 
-            # Or to a specific script node. For simplicity, let's say it loops to human_idea to pivot or rethink.
-            "approve": "human_script"
-        }
+        {**{node_id: node_id for node_id in script_nodes}, "approve": "human_script"}
     )
 
     builder.add_edge("human_script", "final_package")
     builder.add_edge("final_package", END)
     builder.set_entry_point("memory_pull")
-    return builder.compile()
\ No newline at end of file
+    return builder.compile(checkpointer=checkpointer)
\ No newline at end of file
@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+_sink: ContextVar[Optional[EventCallback]] = ContextVar("graph_event_sink", default=None)
+
+
+@contextmanager
+def event_sink(callback: EventCallback):
+    """
+    Route events emitted by graph nodes to `callback(event, data)`.
+    Tasks created inside the block (including graph runs) keep the sink.
+    """
+    token = _sink.set(callback)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+def emit(event: str, data: Dict[str, Any]):
+    """Publish a progress event to the current sink, if anyone is listening."""
+    sink = _sink.get()
+    if sink is not None:
+        sink(event, data)
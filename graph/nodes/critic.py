@@ -1,29 +1,58 @@
 from graph.state import CreativeState
+from graph.nodes.idea import score_value
+from services.prompt_packer import Section, pick
+
+CRITIC_SYSTEM_PROMPT = "You are a demanding short-form video critic. Respond with JSON only."
+
+PASS_SCORE = 7
+MAX_ITERATIONS = 3
+
+CRITIC_PROMPT = """
+Evaluate these script variants for:
+- Hook strength (1-10)
+- Retention potential
+- Emotional payoff
+
+Scripts (JSON lines):
+{scripts}
+
+Return a JSON object with a 'variants' list of objects with 'style', 'score', and 'critique_points'.
+"""
 
 def critic_node(llm):
-    def node(state: CreativeState):
-        prompt = f"""
-        Evaluate these script variants for:
-        - Hook strength (1-10)
-        - Retention potential
-        - Emotional payoff
-        
-        Scripts: {state['script_variants']}
-        
-        Return JSON list of objects with 'style', 'score', and 'critique_points'.
-        """
-        scored = llm.generate_json(role="critic", user_prompt=prompt)
+    async def node(state: CreativeState):
+        # Variants whose draft hasn't changed since they were scored keep their score;
+        # only new or rewritten drafts go to the model.
+        cached = {v["style"]: v for v in state.get("scored_variants", [])}
+        drafts = {v["style"]: v["content"] for v in state["script_variants"]}
+        fresh = [v for v in state["script_variants"] if v["style"] not in cached or cached[v["style"]]["content"] != v["content"]]
+        scored = []
+        if fresh:
+            prompt = llm.packer("critic").pack(
+                CRITIC_PROMPT,
+                scripts=Section([pick(v, ("style", "content")) for v in fresh], keep_all=True),
+            )
+            scored = await llm.generate_json_list(role="critic", system_prompt=CRITIC_SYSTEM_PROMPT, user_prompt=prompt, key="variants")
+        fresh_styles = {v["style"] for v in fresh}
+        new_scores = {v["style"]: dict(v, content=drafts[v["style"]]) for v in scored if isinstance(v, dict) and v.get("style") in fresh_styles}
+        for style in fresh_styles - set(new_scores): # Left out by the critic: never keep the old score for a new draft
+            new_scores[style] = {"style": style, "score": None, "critique_points": ["The critic returned no score for this draft."], "content": drafts[style]}
+        merged = {style: v for style, v in cached.items() if style in drafts and style not in fresh_styles}
+        merged.update(new_scores)
+        iteration = state["iteration_count"] + 1
         return {
-            "scored_variants": scored,
-            "iteration_count": state["iteration_count"] + 1
+            "scored_variants": sorted(merged.values(), key=score_value, reverse=True),
+            "critique_log": state.get("critique_log", []) + [f"iteration {iteration}: {v['style']} scored {v.get('score')}" for v in new_scores.values()],
+            "iteration_count": iteration
         }
     return node
 
 def critic_router(state: CreativeState):
+    """Send variants below PASS_SCORE (or left unscored) back to their script node; passing ones are kept as they are."""
     if not state.get("scored_variants"):
         return "approve" # Safety
-    best_score = max(v.get("score", 0) for v in state["scored_variants"])
-    if best_score < 7 and state["iteration_count"] < 3:
-        return "rewrite"
+    failing = [f"script_{v['style']}" for v in state["scored_variants"] if score_value(v) < PASS_SCORE]
+    if failing and state["iteration_count"] < MAX_ITERATIONS:
+        return failing
     else:
-        return "approve"
\ No newline at end of file
+        return "approve"
@@ -1,19 +1,26 @@
 from graph.state import CreativeState
+from services.prompt_packer import compact, pick
+
+FINAL_SYSTEM_PROMPT = "You are a video production planner. Respond with JSON only."
+
+FINAL_PROMPT = """
+Finalizing production package for:
+Script: {script}
+
+Generate:
+- Hook Title
+- Shot list
+- B-roll cues
+- Thumbnail concepts
+
+Return JSON object.
+"""
 
 def final_package_node(llm):
-    def node(state: CreativeState):
-        prompt = f"""
-        Finalizing production package for:
-        Script: {state['selected_script']}
-        
-        Generate:
-        - Hook Title
-        - Shot list
-        - B-roll cues
-        - Thumbnail concepts
-        
-        Return JSON object.
-        """
-        package = llm.generate_json(role="utility", user_prompt=prompt)
+    async def node(state: CreativeState):
+        if not state.get("selected_script"): # Rejected or no scripts: nothing to package
+            return {}
+        prompt = llm.packer("utility").pack(FINAL_PROMPT, script=compact(pick(state["selected_script"], ("style", "content"))))
+        package = await llm.generate_json(role="utility", system_prompt=FINAL_SYSTEM_PROMPT, user_prompt=prompt)
         return {"final_package": package}
-    return node
\ No newline at end of file
+    return node
@@ -1,22 +1,35 @@
+from typing import List
+from langgraph.types import interrupt
 from graph.state import CreativeState
 
+# Human steps pause the graph with interrupt(); the run resumes with Command(resume=<answer>)
+# from whoever is driving it (terminal prompt, session API), reading state from the checkpoint.
+
 def human_select_idea_node(state: CreativeState):
-    print("\nTop Ideas:\n")
-    for i, idea in enumerate(state["ranked_ideas"][:5]):
-        print(i, idea["title"], idea["score"])
-    selected = input("Select idea index: ")
+    ideas = state["ranked_ideas"][:5]
+    if not ideas:
+        return {"selected_idea": None, "approval_stage": "no_ideas"}
+    choice = interrupt({"stage": "select_idea", "ideas": ideas})
+    index = max(0, min(int(choice), len(ideas) - 1))
     return {
-        "selected_idea": state["ranked_ideas"][int(selected)],
+        "selected_idea": ideas[index],
         "approval_stage": "idea_selected"
     }
 
 
+def idea_router(script_nodes: List[str]):
+    """Fan out to the script nodes once an idea is selected; end the run when ranking left none to select."""
+    def route(state: CreativeState):
+        return script_nodes if state.get("selected_idea") else "end"
+    return route
+
+
 def human_script_approval_node(state: CreativeState):
-    print("\nTop Script:\n")
-    print(state["scored_variants"][0]["content"])
-    decision = input("Approve? (y/n): ")
-    if decision == "y":
-        return {"selected_script": state["scored_variants"][0]}
+    if not state["scored_variants"]:
+        return {"approval_stage": "no_scripts"}
+    top = state["scored_variants"][0]
+    decision = interrupt({"stage": "approve_script", "script": top})
+    if decision.get("approved"):
+        return {"selected_script": top, "approval_stage": "script_approved"}
     else:
-        feedback = input("Provide feedback: ")
-        return {"human_feedback": feedback}
\ No newline at end of file
+        return {"human_feedback": decision.get("feedback", ""), "approval_stage": "script_rejected"}
@@ -1,43 +1,108 @@
+import asyncio
+import numpy as np
+from graph.events import emit
 from graph.state import CreativeState
+from services.prompt_packer import Section, compact
 
-def idea_divergence_node(style: str, llm):
-    def node(state: CreativeState):
-        trend_context = "\n".join([f"- {t['topic']}: {t.get('rationale', '')}" for t in state.get('trend_signals', [])])
-        memory_context = "\n".join([f"- Content from {s.get('source', 'Vault')}: {s['content'][:300]}..." for s in state.get('memory_context', [])])
-        prompt = f"""
-        You are a creative brainstormer. 
-        Theme: {state['theme']}
-        Style: {style}
-        Constraints: {state['constraints']}
-        
-        ### TREND SIGNALS
-        {trend_context}
-        
-        ### CREATIVE SEEDS (From Obsidian Vault)
-        {memory_context}
-        
-        Task: Generate 3 video concepts that combine a trending topic with a unique 'twist' from the creative seeds.
-        Format: JSON list of objects with 'title', 'hook', 'twist', 'trend_alignment'.
-        """
-        ideas = llm.generate_json(role="brainstorm", user_prompt=prompt)
-        if not isinstance(ideas, list):
-            ideas = [ideas]
-        return {"idea_pool": state["idea_pool"] + ideas}
+BRAINSTORM_SYSTEM_PROMPT = "You are a creative brainstormer for short-form video. Respond with JSON only."
+
+IDEA_FIELDS = ("title", "hook", "twist", "premise", "trend_alignment")
+DEDUP_FIELDS = ("title", "hook", "twist")
+
+BRAINSTORM_PROMPT = """
+Theme: {theme}
+Style: {style}
+Constraints: {constraints}
+
+### TREND SIGNALS
+{trends}
+
+### CREATIVE SEEDS (From Obsidian Vault)
+{seeds}
+
+Task: Generate 3 video concepts that combine a trending topic with a unique 'twist' from the creative seeds.
+Format: JSON object with an 'ideas' list of objects with 'title', 'hook', 'twist', 'trend_alignment'.
+"""
+
+
+def trend_line(trend) -> str:
+    return f"- {trend.get('topic', '')}: {trend.get('rationale', '')}".rstrip(": ")
+
+
+def seed_line(seed) -> str:
+    return f"- {seed.get('source', 'Vault')}: {seed['content']}"
+
+
+def score_value(item) -> float:
+    try:
+        return float(item.get("score", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+def idea_divergence_node(style: str, llm, timeout: float = 90.0):
+    async def node(state: CreativeState):
+        prompt = llm.packer("brainstorm").pack(
+            BRAINSTORM_PROMPT,
+            theme=state["theme"],
+            style=style,
+            constraints=compact(state["constraints"]),
+            trends=Section(sorted(state.get("trend_signals", []), key=score_value, reverse=True), render=trend_line),
+            seeds=Section(state.get("memory_context", []), render=seed_line, max_item_tokens=250),
+        )
+        ideas = []
+
+        async def collect():
+            async for idea in llm.stream_json_items(role="brainstorm", system_prompt=BRAINSTORM_SYSTEM_PROMPT, user_prompt=prompt, key="ideas"):
+                if isinstance(idea, dict):
+                    ideas.append(dict(idea, style=style))
+                    emit("idea", {"style": style, "idea": ideas[-1]})
+
+        try:
+            await asyncio.wait_for(collect(), timeout)
+        except Exception as e: # A slow or failing branch degrades the pool instead of stalling the run
+            print(f"[graph] idea_{style} dropped after {len(ideas)} idea(s): {e!r}")
+            return {"idea_pool": ideas, "branch_errors": [f"idea_{style}: {e!r}"]}
+        return {"idea_pool": ideas}
     return node
 
 
-def idea_ranking_node(llm):
-    def node(state: CreativeState):
-        prompt = f"""
-        You are a content critic. Rank these ideas based on:
-        1. Hook strength
-        2. Trend alignment
-        3. Uniqueness of the 'twist'
-        
-        Ideas: {state['idea_pool']}
-        
-        Return JSON list of ideas sorted by rank, with a 'score' and 'ranking_rationale'.
-        """
-        ranked = llm.generate_json(role="critic", user_prompt=prompt)
-        return {"ranked_ideas": ranked}
-    return node
\ No newline at end of file
+def cluster_ideas(vectors: np.ndarray, threshold: float) -> list:
+    """
+    Greedy threshold clustering over cosine similarity: in pool order, each idea not
+    yet claimed leads a cluster of every unclaimed idea at least `threshold` similar to it.
+    """
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similar = (vectors @ vectors.T) >= threshold
+    unclaimed = np.ones(len(vectors), dtype=bool)
+    clusters = []
+    for i in range(len(vectors)):
+        if unclaimed[i]:
+            members = np.flatnonzero(similar[i] & unclaimed)
+            unclaimed[members] = False
+            clusters.append(members.tolist())
+    return clusters
+
+
+def idea_dedup_node(memory_service, threshold: float = 0.92):
+    """
+    Collapses near-duplicate ideas from the style branches before ranking. Each cluster
+    keeps its first idea, with `merged_styles` listing every branch that proposed it.
+    """
+    async def node(state: CreativeState):
+        pool = state["idea_pool"]
+        if len(pool) < 2:
+            return {"unique_ideas": list(pool)}
+        texts = ["\n".join(str(idea.get(field, "")) for field in DEDUP_FIELDS) for idea in pool]
+        try:
+            vectors = np.asarray(await memory_service.embeddings.aembed_documents(texts), dtype=np.float32)
+        except Exception as e: # Ranking the full pool is slower, not wrong
+            print(f"[graph] idea_dedup skipped: {e!r}")
+            return {"unique_ideas": list(pool), "branch_errors": [f"idea_dedup: {e!r}"]}
+        unique = []
+        for members in cluster_ideas(vectors, threshold):
+            styles = list(dict.fromkeys(pool[i].get("style") for i in members if pool[i].get("style")))
+            unique.append(dict(pool[members[0]], merged_styles=styles))
+        if len(unique) < len(pool):
+            print(f"[graph] idea_dedup: {len(pool)} -> {len(unique)} ideas")
+        return {"unique_ideas": unique}
+    return node
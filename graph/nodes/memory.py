@@ -1,8 +1,8 @@
 from graph.state import CreativeState
 
 def memory_pull_node(memory_service):
-    def node(state: CreativeState):
+    async def node(state: CreativeState):
         query = state["theme"] or "creative video idea"
-        results = memory_service.retrieve_context(query, k=8)
+        results = await memory_service.aretrieve_context(query, k=8)
         return {"memory_context": results}
-    return node
\ No newline at end of file
+    return node
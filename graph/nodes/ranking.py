@@ -1,12 +1,151 @@
-def idea_ranking_node(state: CreativeState):
-    prompt = f"""
-    Score each idea (1-10) for:
-    - Hook strength
-    - Novelty vs past work
-    - Format freshness
-    - Trend alignment
-
-    Ideas: {state['idea_pool']}
+import asyncio
+import itertools
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from graph.events import emit
+from graph.state import CreativeState
+from graph.nodes.idea import IDEA_FIELDS, score_value
+from services.prompt_packer import Section, compact, pick
+
+RANKING_SYSTEM_PROMPT = "You are a content critic for short-form video. Respond with JSON only."
+
+RUBRIC = ("hook", "trend", "twist")
+
+SCORING_PROMPT = """
+Score each idea on its own against this rubric, 1-10 per criterion
+(5 = competent but forgettable, 8 = worth producing this week, 10 = exceptional):
+- hook: would a viewer stop scrolling in the first two seconds
+- trend: rides a current trend without copying it
+- twist: how unexpected and ownable the twist is
+
+Ideas (JSON lines, each with an 'id'):
+{ideas}
+
+Return a JSON object with an 'ideas' list with one entry per idea: its 'id', 'hook', 'trend', 'twist', an overall 'score' (1-10) and a one-sentence 'ranking_rationale'.
+"""
+
+PAIRWISE_PROMPT = """
+Two short-form video ideas compete for one production slot. Judge hook strength,
+trend alignment and how unique the twist is.
+
+Idea A:
+{a}
+
+Idea B:
+{b}
+
+Return a JSON object with the 'winner' ('A' or 'B') and a one-sentence 'reason'.
+"""
+
+
+def _index(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RankingEngine:
+    """
+    Ranks an idea pool of any size. Ideas are scored against a fixed absolute rubric in
+    batches of `batch_size`, all batches concurrently, so scores from different batches
+    are comparable and latency stays close to one batch call. The merged order is by
+    score, then rubric total. With `pairwise_top`, the top slice is re-ranked by
+    head-to-head comparisons (all pairs, concurrently; most wins first).
     """
-    ranked = llm.generate_json(prompt)
-    return {"ranked_ideas": ranked}
\ No newline at end of file
+
+    def __init__(self, llm, batch_size: int = 8, pairwise_top: int = 0, attempts: int = 2):
+        self.llm = llm
+        self.batch_size = max(1, batch_size)
+        self.pairwise_top = pairwise_top
+        self.attempts = attempts
+
+    async def _score_batch(self, ideas: List[Dict[str, Any]]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """(batch index, score item) pairs, each as soon as the model closes it; the model only sees batch-local ids."""
+        prompt = self.llm.packer("critic").pack(
+            SCORING_PROMPT,
+            ideas=Section([dict(pick(idea, IDEA_FIELDS), id=i) for i, idea in enumerate(ideas)], keep_all=True),
+        )
+        async for item in self.llm.stream_json_items(role="critic", system_prompt=RANKING_SYSTEM_PROMPT, user_prompt=prompt, key="ideas"):
+            index = _index(item.get("id")) if isinstance(item, dict) else None
+            if index is not None and 0 <= index < len(ideas):
+                yield index, item
+
+    async def score(self, pool: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Score items by pool index. Ideas a batch's answer left out (or lost to a failed call) get one more, smaller batch."""
+        scores: Dict[int, Dict[str, Any]] = {}
+
+        async def run(indices: List[int]):
+            for attempt in range(self.attempts):
+                missing = [i for i in indices if i not in scores]
+                if not missing:
+                    return
+                try:
+                    async for local, item in self._score_batch([pool[i] for i in missing]):
+                        if missing[local] not in scores:
+                            scores[missing[local]] = item
+                            emit("idea_scored", {"idea": self._merge(pool[missing[local]], item)})
+                except Exception as e: # Items scored before the failure are kept
+                    print(f"[graph] idea_rank batch of {len(missing)} failed (attempt {attempt + 1}): {e!r}")
+
+        indices = list(range(len(pool)))
+        await asyncio.gather(*[run(indices[i:i + self.batch_size]) for i in range(0, len(indices), self.batch_size)])
+        return scores
+
+    @staticmethod
+    def _merge(idea: Dict[str, Any], item: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(idea, score=item.get("score"), rubric={c: item.get(c) for c in RUBRIC if c in item}, ranking_rationale=item.get("ranking_rationale", ""))
+
+    async def _compare(self, a: Dict[str, Any], b: Dict[str, Any]) -> int:
+        """0 if `a` wins, 1 if `b` does, -1 when the call fails or the answer is unusable."""
+        prompt = self.llm.packer("critic").pack(PAIRWISE_PROMPT, a=compact(pick(a, IDEA_FIELDS)), b=compact(pick(b, IDEA_FIELDS)))
+        try:
+            answer = await self.llm.generate_json(role="critic", system_prompt=RANKING_SYSTEM_PROMPT, user_prompt=prompt)
+        except Exception as e:
+            print(f"[graph] idea_rank comparison failed: {e!r}")
+            return -1
+        return {"A": 0, "B": 1}.get(str(answer.get("winner", "")).strip().upper(), -1)
+
+    async def rerank_top(self, ranked: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        top = ranked[:self.pairwise_top]
+        if len(top) < 2:
+            return ranked
+        pairs = list(itertools.combinations(range(len(top)), 2))
+        # Alternate which idea is shown first, so position bias cancels out across pairs
+        orders = [(i, j) if n % 2 == 0 else (j, i) for n, (i, j) in enumerate(pairs)]
+        results = await asyncio.gather(*[self._compare(top[first], top[second]) for first, second in orders])
+        wins = [0] * len(top)
+        for (first, second), winner in zip(orders, results):
+            if winner >= 0:
+                wins[(first, second)[winner]] += 1
+        order = sorted(range(len(top)), key=lambda i: (-wins[i], i)) # Ties keep the rubric order
+        return [dict(top[i], pairwise_wins=wins[i]) for i in order] + ranked[len(top):]
+
+    async def rank(self, pool: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        scores = await self.score(pool)
+        merged = [(self._merge(idea, scores[i]) if i in scores else dict(idea, score=None, ranking_rationale="Not scored"), i) for i, idea in enumerate(pool)]
+        merged.sort(key=lambda pair: (-score_value(pair[0]), -sum(_number(v) for v in (pair[0].get("rubric") or {}).values()), pair[1]))
+        ranked = [idea for idea, _ in merged]
+        if self.pairwise_top:
+            ranked = await self.rerank_top(ranked)
+        return ranked
+
+
+def idea_ranking_node(llm, batch_size: int = 8, pairwise_top: int = 0):
+    engine = RankingEngine(llm, batch_size=batch_size, pairwise_top=pairwise_top)
+
+    async def node(state: CreativeState):
+        pool = state.get("unique_ideas") or state["idea_pool"] # Graphs built without idea_dedup rank the raw pool
+        if not pool:
+            return {"ranked_ideas": []}
+        ranked = await engine.rank(pool)
+        for rank, idea in enumerate(ranked, 1):
+            emit("idea_ranked", {"rank": rank, "idea": idea})
+        return {"ranked_ideas": ranked}
+    return node
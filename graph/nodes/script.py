@@ -1,17 +1,67 @@
+import asyncio
 from graph.state import CreativeState
+from graph.events import emit
+from graph.nodes.idea import IDEA_FIELDS
+from services.prompt_packer import Section, compact, pick
 
-def script_split_node(style: str, llm):
-    def node(state: CreativeState):
-        idea = state["selected_idea"]
-        memory_context = "\n".join([f"- {s['content'][:300]}..." for s in state.get('memory_context', [])])
-        prompt = f"""
-        Idea: {idea}
-        Creative Context: {memory_context}
-        Style: {style}
-        Constraints: {state['constraints']}
-
-        Produce a full short-form script draft. Include a hook, body, and call to action.
-        """
-        script = llm.generate_text(role="script", user_prompt=prompt)
-        return {"script_variants": state["script_variants"] + [{"style": style, "content": script}]}
-    return node
\ No newline at end of file
+SCRIPT_SYSTEM_PROMPT = "You are a short-form video scriptwriter. Write tight, filmable scripts."
+
+SCRIPT_PROMPT = """
+Idea: {idea}
+Creative Context:
+{context}
+Style: {style}
+Constraints: {constraints}
+
+Produce a full short-form script draft. Include a hook, body, and call to action.
+"""
+
+REWRITE_PROMPT = """
+Idea: {idea}
+Creative Context:
+{context}
+Style: {style}
+Constraints: {constraints}
+
+Previous draft:
+{draft}
+
+Critique:
+{critique}
+
+Rewrite the script so it answers every critique point while keeping what already works. Include a hook, body, and call to action.
+"""
+
+def script_split_node(style: str, llm, timeout: float = 180.0):
+    async def node(state: CreativeState):
+        # The critic only routes failing variants back here, so a scored variant means a rewrite.
+        previous = next((v for v in state.get("scored_variants", []) if v.get("style") == style), None)
+        values = dict(
+            idea=compact(pick(state["selected_idea"] or {}, IDEA_FIELDS)),
+            context=Section(state.get("memory_context", []), render=lambda s: f"- {s['content']}", max_item_tokens=250),
+            style=style,
+            constraints=compact(state["constraints"]),
+        )
+        if previous:
+            prompt = llm.packer("script").pack(
+                REWRITE_PROMPT,
+                draft=previous["content"],
+                critique="\n".join(f"- {point}" for point in previous.get("critique_points") or []) or "- Scored too low; make it stronger.",
+                **values,
+            )
+        else:
+            prompt = llm.packer("script").pack(SCRIPT_PROMPT, **values)
+        parts = []
+        try:
+            async with asyncio.timeout(timeout):
+                async for delta in llm.stream_text(role="script", system_prompt=SCRIPT_SYSTEM_PROMPT, user_prompt=prompt):
+                    parts.append(delta)
+                    emit("script_token", {"style": style, "delta": delta})
+        except Exception as e: # A slow or failing branch degrades the variants instead of stalling the run
+            print(f"[graph] script_{style} dropped: {e!r}")
+            emit("script_error", {"style": style, "message": repr(e)})
+            return {"branch_errors": [f"script_{style}: {e!r}"]}
+        script = "".join(parts)
+        emit("script", {"style": style, "content": script})
+        return {"script_variants": [{"style": style, "content": script}]}
+    return node
@@ -1,4 +1,12 @@
-from typing import TypedDict, List, Optional, Dict, Any
+import operator
+from typing import Annotated, TypedDict, List, Optional, Dict, Any
+
+
+def merge_by_style(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Reducer: entries from `right` replace entries of the same style in `left`."""
+    replaced = {v.get("style") for v in right}
+    return [v for v in left if v.get("style") not in replaced] + right
+
 
 class CreativeState(TypedDict):
     # User Input
@@ -9,13 +17,14 @@ class CreativeState(TypedDict):
     memory_context: List[str]
     trend_signals: List[Dict[str, Any]]
 
-    # Idea phase
-    idea_pool: List[Dict[str, Any]]
+    # Idea phase (parallel branches append)
+    idea_pool: Annotated[List[Dict[str, Any]], operator.add]
+    unique_ideas: List[Dict[str, Any]] # idea_pool with near-duplicates collapsed
     ranked_ideas: List[Dict[str, Any]]
     selected_idea: Optional[Dict[str, Any]]
 
-    # Script phase
-    script_variants: List[Dict[str, Any]]
+    # Script phase (parallel branches merge by style)
+    script_variants: Annotated[List[Dict[str, Any]], merge_by_style]
     scored_variants: List[Dict[str, Any]]
     selected_script: Optional[Dict[str, Any]]
 
@@ -28,4 +37,7 @@ class CreativeState(TypedDict):
     approval_stage: Optional[str]
 
     # Output
-    final_package: Optional[Dict[str, Any]]
\ No newline at end of file
+    final_package: Optional[Dict[str, Any]]
+
+    # Branches that timed out or failed and were left out of the merge
+    branch_errors: Annotated[List[str], operator.add]
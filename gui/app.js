@@ -31,6 +31,19 @@ function setBadge(id, label, cls) {
     el.className = `panel-badge ${cls}`;
 }
 
+function eventMessage(eventType, payload) {
+    if (eventType === 'queued') return `Waiting for a free worker — #${payload.position} in queue`; // Queue events carry a position, not a message
+    return payload.message || '';
+}
+
+function showQueue(badgeId, runningLabel, eventType, payload) {
+    if (eventType === 'queued') {
+        setBadge(badgeId, `Queued #${payload.position}`, 'running');
+    } else if (document.getElementById(badgeId).textContent.startsWith('Queued')) {
+        setBadge(badgeId, runningLabel, 'running'); // Got a worker
+    }
+}
+
 function appendLog(boxId, msg, type = 'log') {
     const box = document.getElementById(boxId);
     const placeholder = box.querySelector('.log-placeholder');
@@ -42,6 +55,29 @@ function appendLog(boxId, msg, type = 'log') {
     box.scrollTop = box.scrollHeight;
 }
 
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) return;
+        buffer += decoder.decode(value, { stream: true });
+        const parts = buffer.split('\n\n');
+        buffer = parts.pop(); // last possibly incomplete chunk
+        for (const part of parts) {
+            const eventMatch = part.match(/^event:\s*(.+)$/m);
+            const dataMatch = part.match(/^data:\s*(.+)$/m);
+            if (!dataMatch) continue;
+            const eventType = eventMatch ? eventMatch[1].trim() : 'log';
+            let payload;
+            try { payload = JSON.parse(dataMatch[1]); } catch { continue; }
+            if (eventType === 'done') return;
+            onEvent(eventType, payload);
+        }
+    }
+}
+
 function scoreClass(score) {
     const n = parseFloat(score);
     if (isNaN(n)) return '';
@@ -102,31 +138,15 @@ async function triggerIngest() {
             body: JSON.stringify({ vault_path: vaultPath, chroma_path: chromaPath }),
         });
         if (!response.ok) { throw new Error(`HTTP ${response.status}`); }
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let buffer = '';
-        while (true) {
-            const { done, value } = await reader.read();
-            if (done) break;
-            buffer += decoder.decode(value, { stream: true });
-            const parts = buffer.split('\n\n');
-            buffer = parts.pop(); // last possibly incomplete chunk
-            for (const part of parts) {
-                const eventMatch = part.match(/^event:\s*(.+)$/m);
-                const dataMatch = part.match(/^data:\s*(.+)$/m);
-                if (!dataMatch) continue;
-                const eventType = eventMatch ? eventMatch[1].trim() : 'log';
-                let payload;
-                try { payload = JSON.parse(dataMatch[1]); } catch { continue; }
-                if (eventType === 'done') break;
-                const msg = payload.message || '';
-                appendLog('ingestLog', msg, eventType);
-                logToFeed('INGEST', msg, eventType);
-                if (eventType === 'success') {
-                    setBadge('ingestBadge', 'Success', 'success');
-                } else if (eventType === 'error') { setBadge('ingestBadge', 'Error', 'error'); }
-            }
-        }
+        await readEventStream(response, (eventType, payload) => {
+            showQueue('ingestBadge', 'Running…', eventType, payload);
+            const msg = eventMessage(eventType, payload);
+            appendLog('ingestLog', msg, eventType);
+            logToFeed('INGEST', msg, eventType);
+            if (eventType === 'success') {
+                setBadge('ingestBadge', 'Success', 'success');
+            } else if (eventType === 'error') { setBadge('ingestBadge', 'Error', 'error'); }
+        });
         const badge = document.getElementById('ingestBadge');
         if (badge.textContent === 'Running…') { setBadge('ingestBadge', 'Done', 'success'); } // If badge still says "Running", settle to success
     } catch (e) {
@@ -159,35 +179,18 @@ async function triggerScout() {
             body: JSON.stringify({ theme, constraints }),
         });
         if (!response.ok) throw new Error(`HTTP ${response.status}`);
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let buffer = '';
-        while (true) {
-            const { done, value } = await reader.read();
-            if (done) break;
-            buffer += decoder.decode(value, { stream: true });
-            const parts = buffer.split('\n\n');
-            buffer = parts.pop();
-            for (const part of parts) {
-                const eventMatch = part.match(/^event:\s*(.+)$/m);
-                const dataMatch = part.match(/^data:\s*(.+)$/m);
-                if (!dataMatch) continue;
-                const eventType = eventMatch ? eventMatch[1].trim() : 'log';
-                let payload;
-                try { payload = JSON.parse(dataMatch[1]); } catch { continue; }
-                if (eventType === 'done') break;
-                if (eventType === 'trend') {
-                    const t = payload.trend || payload;
-                    renderTrendCard(t);
-                    trendCount++;
-                    logToFeed('SCOUT', `Trend: ${t.topic} (score: ${t.score ?? t.relevance ?? 'N/A'})`);
-                } else {
-                    const msg = payload.message || '';
-                    logToFeed('SCOUT', msg, eventType);
-                    if (eventType === 'error') setBadge('scoutBadge', 'Error', 'error');
-                }
+        await readEventStream(response, (eventType, payload) => {
+            showQueue('scoutBadge', 'Running…', eventType, payload);
+            if (eventType === 'trend') {
+                const t = payload.trend || payload;
+                renderTrendCard(t);
+                trendCount++;
+                logToFeed('SCOUT', `Trend: ${t.topic} (score: ${t.score ?? t.relevance ?? 'N/A'})`);
+            } else {
+                logToFeed('SCOUT', eventMessage(eventType, payload), eventType);
+                if (eventType === 'error') setBadge('scoutBadge', 'Error', 'error');
             }
-        }
+        });
         setBadge('scoutBadge', trendCount ? `${trendCount} Trends` : 'Done', 'success');
     } catch (e) {
         setBadge('scoutBadge', 'Error', 'error');
@@ -214,6 +217,64 @@ function renderTrendCard(t) {
     grid.appendChild(card);
 }
 
+/* ── Script Drafts ────────────────────────────────────────────────────────── */
+async function triggerScripts() {
+    const btn = document.getElementById('scriptBtn');
+    const title = document.getElementById('scriptIdea').value.trim();
+    const hook = document.getElementById('scriptHook').value.trim();
+    const raw = document.getElementById('scoutConstraints').value.trim();
+    const constraints = raw ? raw.split(',').map(s => s.trim()).filter(Boolean) : [];
+    const grid = document.getElementById('scriptsGrid');
+    grid.innerHTML = ''; // Reset
+    if (!title) { logToFeed('SCRIPT', 'Enter an idea title first', 'warning'); return; }
+    btn.disabled = true;
+    btn.classList.add('pulsing');
+    setBadge('scriptBadge', 'Streaming…', 'running');
+    logToFeed('SCRIPT', `Drafting scripts for "${title}"`);
+    try {
+        const response = await fetch(`${API}/api/script`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ idea: { title, hook }, constraints }),
+        });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        await readEventStream(response, (eventType, payload) => {
+            showQueue('scriptBadge', 'Streaming…', eventType, payload);
+            if (eventType === 'script_token') {
+                scriptCard(payload.style).textContent += payload.delta;
+            } else if (eventType === 'script') {
+                scriptCard(payload.style).textContent = payload.content;
+                logToFeed('SCRIPT', `Finished ${payload.style} draft`);
+            } else {
+                logToFeed('SCRIPT', eventMessage(eventType, payload), eventType);
+                if (eventType === 'error') setBadge('scriptBadge', 'Error', 'error');
+            }
+        });
+        if (document.getElementById('scriptBadge').textContent === 'Streaming…') setBadge('scriptBadge', 'Done', 'success');
+    } catch (e) {
+        setBadge('scriptBadge', 'Error', 'error');
+        logToFeed('SCRIPT', `Error: ${e.message}`, 'error');
+    } finally {
+        btn.disabled = false;
+        btn.classList.remove('pulsing');
+    }
+}
+
+function scriptCard(style) {
+    let body = document.getElementById(`script-${style}`);
+    if (!body) {
+        const card = document.createElement('div');
+        card.className = 'script-card';
+        card.innerHTML = `<div class="script-style">${escHtml(style)}</div>`;
+        body = document.createElement('div');
+        body.className = 'script-body';
+        body.id = `script-${style}`;
+        card.appendChild(body);
+        document.getElementById('scriptsGrid').appendChild(card);
+    }
+    return body;
+}
+
 /* ── Activity Feed clear ─────────────────────────────────────────────────── */
 function clearFeed() {
     const feed = document.getElementById('feedList');
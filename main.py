@@ -1,6 +1,11 @@
 import asyncio
+import argparse
 import os
-from typing import Dict, Any
+import uuid
+from typing import Dict, Any, Optional
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.types import Command
+from services.identity_service import IdentityService
 from services.llm import LLMService
 from services.memory_service import MemoryService
 from services.trend_service import TrendService
@@ -17,6 +22,9 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
 VAULT_PATH = os.getenv("VAULT_PATH", "./my_vault")
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./checkpoints.sqlite")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
 MODELS_CONFIG_PATH = os.path.join("config", "models.yaml")
 
 # -----------------------------
@@ -39,16 +47,37 @@ def ask_constraints() -> list:
     return constraints
 
 
-async def get_identity_summary(memory_service: MemoryService) -> str:
+def ask_idea_choice(ideas: list) -> int:
+    print("\n=== SELECT AN IDEA ===")
+    for i, idea in enumerate(ideas):
+        print(f"{i}. {idea['title']} (Score: {idea.get('score', 'N/A')})")
+        print(f"   Hook: {idea.get('hook', '')}\n")
+    return int(input("Select idea index: "))
+
+
+def ask_script_approval(script: dict) -> Dict[str, Any]:
+    print("\n=== TOP SCRIPT VARIANT ===")
+    print(f"Style: {script['style']} | Score: {script.get('score', 'N/A')}")
+    print("-" * 20)
+    print(script["content"])
+    print("-" * 20)
+    if input("Approve this script? (y/n): ").lower() == "y":
+        return {"approved": True}
+    return {"approved": False, "feedback": input("Provide feedback for rewrite: ")}
+
+
+def answer_interrupt(pending: Dict[str, Any]) -> Any:
+    """Prompt on the terminal for whatever a human node is waiting on."""
+    if pending["stage"] == "select_idea":
+        return ask_idea_choice(pending["ideas"])
+    return ask_script_approval(pending["script"])
+
+
+async def get_identity_summary(identity_service: IdentityService) -> str:
     """
-    Summarize creator identity based on vault content.
+    Creator identity for trend scoring: the cached profile for the current vault version.
     """
-    samples = memory_service.retrieve_context(query="creator style personality brand themes", k=5)
-    if not samples:
-        return "A creative content creator looking for fresh angles."
-    
-    summary = "\n\n".join([s["content"][:400] for s in samples])
-    return summary
+    return await identity_service.summary()
 
 
 # -----------------------------
@@ -62,6 +91,7 @@ def build_initial_state(theme: str, constraints: list, trend_signals: list) -> D
         "memory_context": [],
         "trend_signals": trend_signals,
         "idea_pool": [],
+        "unique_ideas": [],
         "ranked_ideas": [],
         "selected_idea": None,
         "script_variants": [],
@@ -72,6 +102,7 @@ def build_initial_state(theme: str, constraints: list, trend_signals: list) -> D
         "human_feedback": None,
         "approval_stage": None,
         "final_package": None,
+        "branch_errors": [],
     }
 
 
@@ -79,38 +110,64 @@ def build_initial_state(theme: str, constraints: list, trend_signals: list) -> D
 # MAIN RUNNER
 # -----------------------------
 
-async def run_session():
+async def stream_graph(app, graph_input: Optional[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the graph to completion, printing each completed node, and return the final state.
+    Human nodes interrupt the run; their answer is read from the terminal and the thread
+    is resumed with it. A `graph_input` of None resumes the thread from its last checkpoint.
+    """
+    final_state: Dict[str, Any] = {}
+    while True:
+        pending = None
+        async for mode, chunk in app.astream(graph_input, config, stream_mode=["updates", "values"]):
+            if mode == "values":
+                final_state = chunk
+            elif "__interrupt__" in chunk:
+                pending = chunk["__interrupt__"][0].value
+            else:
+                for node_name in chunk:
+                    print(f"   - Completed: {node_name}")
+        if pending is None:
+            return final_state
+        graph_input = Command(resume=await asyncio.to_thread(answer_interrupt, pending))
+
+
+async def run_session(resume_thread: Optional[str] = None):
     model_map = LLMService.load_config_from_yaml(MODELS_CONFIG_PATH)
-    llm_service = LLMService(api_key=OPENAI_API_KEY, model_map=model_map, google_api_key=GOOGLE_API_KEY)
-    memory_service = MemoryService(persist_directory=CHROMA_PATH, embedding_api_key=OPENAI_API_KEY)
+    settings = LLMService.load_settings_from_yaml(MODELS_CONFIG_PATH)
+    llm_service = LLMService(api_key=OPENAI_API_KEY, model_map=model_map, google_api_key=GOOGLE_API_KEY, settings=settings)
+    memory_service = MemoryService(persist_directory=CHROMA_PATH, embedding_api_key=OPENAI_API_KEY, retrieval_mode=RETRIEVAL_MODE, vector_backend=VECTOR_BACKEND)
     trend_service = TrendService(llm_service)
-    app = build_graph(llm_service=llm_service, memory_service=memory_service, trend_service=trend_service)
-    theme = ask_theme()
-    constraints = ask_constraints()
-    
-    print("\n[1/3] Fetching and analyzing trends...")
-    identity_summary = await get_identity_summary(memory_service)
-    trends = await trend_service.analyze_trends(identity_summary)
-    
-    print("\nIdentified Trend Signals:")
-    for i, t in enumerate(trends):
-        print(f"{i}. {t['topic']} (Score: {t.get('score', 'N/A')})")
-    
-    state = build_initial_state(theme, constraints, trends)
-    state["identity_summary"] = identity_summary
-    
-    print("\n[2/3] Running creative divergence...")
-    
-    async for event in app.astream_events(state, version="v1"):
-        if event["event"] == "on_node_end":
-            node_name = event["name"]
-            print(f"   - Completed: {node_name}")
-            
-    # Note: Human input nodes will pause and wait for stdin if using input()
-    # In a real app, this would be an API call or websocket.
-
-    final_state = await app.ainvoke(state) # For terminal demo
-    
+    identity_service = IdentityService(memory_service, llm_service, CHROMA_PATH)
+
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_PATH) as checkpointer:
+        app = build_graph(llm_service=llm_service, memory_service=memory_service, trend_service=trend_service, checkpointer=checkpointer, **(settings.get("graph") or {}))
+        if resume_thread:
+            thread_id = resume_thread
+            state = None
+            print(f"\n=== RESUMING SESSION {thread_id} ===")
+        else:
+            thread_id = uuid.uuid4().hex
+            theme = ask_theme()
+            constraints = ask_constraints()
+
+            print("\n[1/3] Fetching and analyzing trends...")
+            identity_summary = await get_identity_summary(identity_service)
+            trends = await trend_service.analyze_trends(identity_summary, theme=theme or None)
+
+            print("\nIdentified Trend Signals:")
+            for i, t in enumerate(trends):
+                print(f"{i}. {t['topic']} (Score: {t.get('score', 'N/A')})")
+
+            state = build_initial_state(theme, constraints, trends)
+            state["identity_summary"] = identity_summary
+
+        print(f"\n[2/3] Running creative divergence... (session {thread_id}; resume with --resume {thread_id})")
+        config = {"configurable": {"thread_id": thread_id}}
+        # Human nodes pause the graph until an answer is given; every completed node is
+        # checkpointed, so an interrupted session resumes where it stopped instead of starting over.
+        final_state = await stream_graph(app, state, config)
+
     print("\n=== [3/3] FINAL CREATIVE PACKAGE ===")
     if final_state.get("final_package"):
         print(final_state["final_package"])
@@ -121,4 +178,7 @@ if __name__ == "__main__":
     if not OPENAI_API_KEY:
         print("Error: OPENAI_API_KEY not found in environment.")
     else:
-        asyncio.run(run_session())
\ No newline at end of file
+        parser = argparse.ArgumentParser(description="Run an interactive creative session")
+        parser.add_argument("--resume", type=str, default=None, help="Session ID to resume from its last checkpoint")
+        args = parser.parse_args()
+        asyncio.run(run_session(resume_thread=args.resume))
\ No newline at end of file
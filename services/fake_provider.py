@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+
+_STYLE_RE = re.compile(r'"style":"([^"]+)"')
+_ID_RE = re.compile(r'"id":(\d+)')
+_TOPIC_RE = re.compile(r'"topic":"([^"]+)"')
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+_WORDS = (
+    "camera cut hook reveal twist retro desk light story glitch signal archive tape frame loop "
+    "voice beat pause zoom memory pixel studio build fail restore sound punchline detail ending"
+).split()
+
+
+def _seeded(*parts: Any) -> random.Random:
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+class _Profile:
+    """Latency and output-size settings for one fake model."""
+
+    def __init__(self, cfg: Dict[str, Any]):
+        self.latency_ms = float(cfg.get("latency_ms", 400))
+        self.sigma = float(cfg.get("sigma", 0.3)) # Log-normal spread around latency_ms (the median); 0 = fixed
+        self.ttft_ms = float(cfg.get("ttft_ms", self.latency_ms / 2))
+        self.tokens_per_second = float(cfg.get("tokens_per_second", 150))
+        self.output_tokens = int(cfg.get("output_tokens", 300))
+        self.failure_rate = float(cfg.get("failure_rate", 0.0))
+
+
+class FakeProviderError(ConnectionError):
+    """Injected failure; a ConnectionError so the scheduler treats it as retryable."""
+
+
+class FakeProvider:
+    """
+    Offline stand-in for the model APIs, used for model names starting with "fake".
+    Responses are seeded from the prompt, so the same prompt always gets the same
+    answer; latencies are drawn from a log-normal around each model's `latency_ms`.
+    JSON answers follow the shape the graph's prompts ask for.
+    """
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        cfg = cfg or {}
+        self.seed = cfg.get("seed", 0)
+        self._default = _Profile(cfg.get("default") or {})
+        self._models = {name: _Profile(model_cfg or {}) for name, model_cfg in (cfg.get("models") or {}).items()}
+        self._rng = random.Random(self.seed)
+        self.calls = 0
+        self.output_tokens = 0
+
+    def profile(self, model_name: str) -> _Profile:
+        return self._models.get(model_name, self._default)
+
+    def _latency(self, median_ms: float, sigma: float) -> float:
+        return median_ms / 1000 * (math.exp(self._rng.gauss(0, sigma)) if sigma > 0 else 1.0)
+
+    def _maybe_fail(self, profile: _Profile, model_name: str):
+        if profile.failure_rate and self._rng.random() < profile.failure_rate:
+            raise FakeProviderError(f"injected failure from {model_name}")
+
+    @staticmethod
+    def _text(rng: random.Random, tokens: int) -> str:
+        return " ".join(rng.choice(_WORDS) for _ in range(max(1, tokens)))
+
+    def _json(self, rng: random.Random, prompt: str, profile: _Profile) -> Dict[str, Any]:
+        phrase = lambda n: self._text(rng, n)
+        score = lambda: rng.randint(4, 10)
+        if "'variants' list" in prompt:
+            return {"variants": [{"style": style, "score": score(), "critique_points": [phrase(8) for _ in range(2)]} for style in dict.fromkeys(_STYLE_RE.findall(prompt))]}
+        if "'ideas' list" in prompt and "'id'" in prompt:
+            ids = [int(i) for i in dict.fromkeys(_ID_RE.findall(prompt))]
+            rng.shuffle(ids)
+            return {"ideas": [{"id": i, "score": score(), "ranking_rationale": phrase(12)} for i in ids]}
+        if "'ideas' list" in prompt:
+            return {"ideas": [{"title": phrase(5).title(), "hook": phrase(14), "twist": phrase(12), "trend_alignment": phrase(8)} for _ in range(3)]}
+        if "'winner'" in prompt:
+            return {"winner": rng.choice("AB"), "reason": phrase(12)}
+        if "'trends' list" in prompt:
+            topics = _TOPIC_RE.findall(prompt) or [phrase(3) for _ in range(4)]
+            return {"trends": [{"topic": topic, "score": score(), "rationale": phrase(16)} for topic in topics]}
+        return {"title": phrase(6).title(), "notes": phrase(profile.output_tokens)}
+
+    async def chat(self, model_name: str, system_prompt: str, user_prompt: str, want_json: bool = False) -> str:
+        profile = self.profile(model_name)
+        rng = _seeded(self.seed, model_name, system_prompt, user_prompt)
+        await asyncio.sleep(self._latency(profile.latency_ms, profile.sigma))
+        self._maybe_fail(profile, model_name)
+        self.calls += 1
+        text = json.dumps(self._json(rng, system_prompt + "\n" + user_prompt, profile)) if want_json else self._text(rng, profile.output_tokens)
+        self.output_tokens += len(text) // 4
+        return text
+
+    async def stream(self, model_name: str, system_prompt: str, user_prompt: str, want_json: bool = False) -> AsyncIterator[str]:
+        profile = self.profile(model_name)
+        rng = _seeded(self.seed, model_name, system_prompt, user_prompt)
+        ttft = self._latency(profile.ttft_ms, profile.sigma)
+        await asyncio.sleep(ttft)
+        self._maybe_fail(profile, model_name)
+        self.calls += 1
+        if want_json:
+            # Spread over the same latency chat() would take, so streamed and whole JSON answers finish together
+            text = json.dumps(self._json(rng, system_prompt + "\n" + user_prompt, profile))
+            pieces = [text[i:i + 32] for i in range(0, len(text), 32)] # ~8 tokens per delta
+            gap = max(0.0, self._latency(profile.latency_ms, profile.sigma) - ttft) / max(1, len(pieces) - 1)
+        else:
+            words = self._text(rng, profile.output_tokens).split(" ")
+            pieces = [" ".join(words[i:i + 8]) + " " for i in range(0, len(words), 8)]
+            gap = 8 / profile.tokens_per_second
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(gap)
+            self.output_tokens += max(1, len(piece) // 4)
+            yield piece
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic hashed bag-of-words embeddings: texts sharing words land close
+    together, so retrieval behaves plausibly without an embedding API.
+    """
+
+    def __init__(self, dimensions: int = 256, latency_ms: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in _WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "big") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000) # Simulated API round-trip
+        self.calls += 1
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+from services.prompt_packer import Section
+from services.singleflight import SingleFlight
+
+PROFILE_FILE = "identity_profile.json"
+PROFILE_VERSION = 1
+MANIFEST_FILE = "vault_manifest.json" # Written by vault_ingest
+IDENTITY_QUERY = "creator style personality brand themes"
+DEFAULT_IDENTITY = "A creative content creator looking for fresh angles."
+
+
+class IdentityService:
+    """
+    The creator identity profile: an LLM-condensed summary of the vault's most
+    characteristic chunks, plus their chunk IDs. Built once per vault version (a hash
+    of the ingest manifest), saved next to the index as `identity_profile.json` and
+    served from memory; sessions never run the identity retrieval themselves.
+    Reading the manifest and the profile file happens in worker threads.
+    """
+
+    def __init__(self, memory_service, llm_service, persist_directory: str, samples: int = 8):
+        self.memory = memory_service
+        self.llm = llm_service
+        self.persist_directory = persist_directory
+        self.samples = samples
+        self._profile: Optional[Dict[str, Any]] = None
+        self._manifest_stamp: Optional[tuple] = None
+        self._vault_version: Optional[str] = None
+        self._flights = SingleFlight("identity")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def vault_version(self) -> Optional[str]:
+        """Hash of the indexed files and their content hashes; None before the first ingest."""
+        try:
+            stat = os.stat(self._path(MANIFEST_FILE))
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._manifest_stamp: # Re-hash only when ingest has rewritten the manifest
+            try:
+                with open(self._path(MANIFEST_FILE), "r", encoding="utf-8") as f:
+                    files = json.load(f).get("files", {})
+            except (OSError, ValueError):
+                return None
+            digests = sorted((rel, entry.get("sha256", "")) for rel, entry in files.items())
+            self._vault_version = hashlib.sha256(json.dumps(digests).encode("utf-8")).hexdigest()[:16]
+            self._manifest_stamp = stamp
+        return self._vault_version
+
+    def _load(self, version: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(PROFILE_FILE), "r", encoding="utf-8") as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if profile.get("format") != PROFILE_VERSION or profile.get("vault_version") != version:
+            return None
+        return profile
+
+    def _save(self, profile: Dict[str, Any]):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        tmp_path = self._path(PROFILE_FILE) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._path(PROFILE_FILE))
+
+    async def _build(self, version: str) -> Dict[str, Any]:
+        profile = await asyncio.to_thread(self._load, version) # Another process (or an earlier run) may have built it already
+        if profile is not None:
+            return profile
+        started = time.perf_counter()
+        samples = await self.memory.aretrieve_context(query=IDENTITY_QUERY, k=self.samples)
+        chunk_ids: List[str] = [s["id"] for s in samples if s.get("id")]
+        raw = "\n\n".join(s["content"][:400] for s in samples[:5])
+        summary, condensed = raw, False
+        if samples and self.llm is not None:
+            system_prompt = """
+            You condense notes from a creator's personal vault into a creator identity profile.
+            In at most 120 words, describe their recurring topics, tone, format habits and audience.
+            Plain prose, no preamble.
+            """
+            user_prompt = self.llm.packer("utility").pack("Vault excerpts (JSON lines):\n{excerpts}\n", excerpts=Section([s["content"] for s in samples], max_item_tokens=300))
+            try:
+                summary, condensed = (await self.llm.generate_text(role="utility", system_prompt=system_prompt, user_prompt=user_prompt)).strip() or raw, True
+            except Exception as e:
+                print(f"[identity] condensing failed, using raw excerpts: {e}")
+        profile = {
+            "format": PROFILE_VERSION,
+            "vault_version": version,
+            "summary": summary or DEFAULT_IDENTITY,
+            "chunk_ids": chunk_ids,
+            "condensed": condensed,
+            "built_at": time.time(),
+        }
+        if condensed or not samples: # A raw fallback is retried on the next vault version or restart
+            await asyncio.to_thread(self._save, profile)
+        print(f"[identity] profile for vault {version} built in {time.perf_counter() - started:.2f}s ({len(chunk_ids)} chunks)")
+        return profile
+
+    async def profile(self) -> Dict[str, Any]:
+        """The profile for the current vault version, rebuilding it if ingest has changed the vault."""
+        version = await asyncio.to_thread(self.vault_version)
+        if version is None:
+            return {"vault_version": None, "summary": DEFAULT_IDENTITY, "chunk_ids": [], "condensed": False}
+        if self._profile is None or self._profile["vault_version"] != version:
+            self._profile = await self._flights.do(version, lambda: self._build(version))
+        return self._profile
+
+    async def summary(self) -> str:
+        return (await self.profile())["summary"]
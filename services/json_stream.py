@@ -0,0 +1,79 @@
+import json
+from typing import Any, Dict, List, Optional
+
+
+class JSONArrayStream:
+    """
+    Incremental parser for list-shaped JSON answers arriving as text deltas.
+
+    feed() returns the objects of the answer's list that were completed by the new
+    text, so callers can act on each item while the rest is still being generated.
+    The list is either the top-level value or the `key` member of a top-level
+    object (any list member when `key` is None). Only object items are yielded;
+    `text` keeps the full answer for whole-document fallbacks.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._root: Optional[str] = None # "{" or "[" once the top-level value opens
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None # Last string seen directly inside the root object
+        self._item_depth: Optional[int] = None # Depth of the target list's items while inside it
+        self._item_start: Optional[int] = None
+        self.finished = False # The target list has closed
+
+    def _opens_target(self) -> bool:
+        if self._depth == 0:
+            return True
+        return self._depth == 1 and self._root == "{" and (self.key is None or self._last_key == self.key)
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        self.text += delta
+        items: List[Dict[str, Any]] = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.finished:
+                break
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._root == "{":
+                        try:
+                            self._last_key = json.loads(text[self._string_start:i + 1])
+                        except ValueError:
+                            self._last_key = None
+                continue
+            if ch == '"':
+                self._in_string, self._string_start = True, i
+            elif ch in "{[":
+                if self._root is None:
+                    self._root = ch
+                if ch == "[" and self._item_depth is None and self._opens_target():
+                    self._item_depth = self._depth + 1
+                elif ch == "{" and self._depth == self._item_depth:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]" and self._depth > 0:
+                self._depth -= 1
+                if ch == "}" and self._depth == self._item_depth and self._item_start is not None:
+                    try:
+                        item = json.loads(text[self._item_start:i + 1])
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        items.append(item)
+                    self._item_start = None
+                elif ch == "]" and self._item_depth is not None and self._depth == self._item_depth - 1:
+                    self.finished = True
+        self._pos = len(text)
+        return items
@@ -0,0 +1,234 @@
+import io
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+INDEX_FILE = "lexical_index.npz"
+LEGACY_INDEX_FILE = "lexical_index.json" # Format 1: chunk text only, re-tokenized on every load
+INDEX_VERSION = 2
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; `#tags` and `[[links]]` reduce to their words."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 or t.isdigit()]
+
+
+def _title(metadata: Dict[str, Any]) -> str:
+    source = str(metadata.get("source", ""))
+    return os.path.splitext(os.path.basename(source))[0] if source else ""
+
+
+class _Frozen:
+    """Read-only postings as flat arrays: term `t`'s chunks and counts are docs/tfs[offsets[t]:offsets[t + 1]]."""
+
+    def __init__(self, ids: List[str], terms: List[str], offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray, lengths: np.ndarray):
+        self.ids = ids
+        self.slots = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+
+    def posting(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        slot = self.slots.get(term)
+        if slot is None:
+            return None
+        start, end = self.offsets[slot], self.offsets[slot + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over vault chunks, kept next to the vector store
+    (`lexical_index.npz`) and updated by ingest whenever chunks are written or removed.
+    A chunk's note title is indexed with its text, so title and tag queries match.
+
+    The file holds the postings as flat arrays, so loading it tokenizes nothing, and
+    search scores each query term's postings with NumPy. Terms found in more than
+    `common_ratio` of the chunks are skipped when the query also has rarer terms.
+    Edits (ingest) work on per-term dicts, converted from and to the arrays on demand.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, common_ratio: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.common_ratio = common_ratio
+        self.chunks: Dict[str, Tuple[str, Dict[str, Any]]] = {} # id -> (text, metadata)
+        self._postings: Optional[Dict[str, Dict[str, int]]] = {} # term -> {id: term frequency}; None while frozen
+        self._lengths: Dict[str, int] = {}
+        self._frozen: Optional[_Frozen] = None # Search form; rebuilt after edits
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @staticmethod
+    def path(directory: str) -> str:
+        return os.path.join(directory, INDEX_FILE)
+
+    @classmethod
+    def mtime(cls, directory: str) -> Optional[float]:
+        """When the saved index (in either format) was last written; None if there is none."""
+        for path in (cls.path(directory), os.path.join(directory, LEGACY_INDEX_FILE)):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                pass
+        return None
+
+    def _terms(self, chunk_id: str) -> Counter:
+        text, metadata = self.chunks[chunk_id]
+        return Counter(tokenize(_title(metadata) + "\n" + text))
+
+    def _editable(self) -> Dict[str, Dict[str, int]]:
+        if self._postings is None: # Thaw a loaded index
+            frozen = self._frozen
+            self._postings = {}
+            for slot, term in enumerate(frozen.terms):
+                start, end = frozen.offsets[slot], frozen.offsets[slot + 1]
+                self._postings[term] = {frozen.ids[doc]: int(tf) for doc, tf in zip(frozen.docs[start:end].tolist(), frozen.tfs[start:end].tolist())}
+            self._lengths = dict(zip(frozen.ids, frozen.lengths.tolist()))
+        self._frozen = None
+        return self._postings
+
+    def _searchable(self) -> _Frozen:
+        if self._frozen is None:
+            ids = list(self.chunks)
+            rows = {chunk_id: i for i, chunk_id in enumerate(ids)}
+            terms = list(self._postings)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(self._postings[term]) for term in terms])
+            docs = np.empty(offsets[-1], dtype=np.int32)
+            tfs = np.empty(offsets[-1], dtype=np.uint16)
+            for slot, term in enumerate(terms):
+                posting = self._postings[term]
+                docs[offsets[slot]:offsets[slot + 1]] = [rows[chunk_id] for chunk_id in posting]
+                tfs[offsets[slot]:offsets[slot + 1]] = [min(tf, 65535) for tf in posting.values()]
+            lengths = np.array([self._lengths[chunk_id] for chunk_id in ids], dtype=np.int32)
+            self._frozen = _Frozen(ids, terms, offsets, docs, tfs, lengths)
+        return self._frozen
+
+    def add(self, ids: Iterable[str], texts: Iterable[str], metadatas: Iterable[Dict[str, Any]]):
+        postings = self._editable()
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            if chunk_id in self.chunks:
+                self.remove([chunk_id])
+            self.chunks[chunk_id] = (text, dict(metadata or {}))
+            terms = self._terms(chunk_id)
+            for term, count in terms.items():
+                postings.setdefault(term, {})[chunk_id] = count
+            self._lengths[chunk_id] = sum(terms.values())
+            self.dirty = True
+
+    def remove(self, ids: Iterable[str]):
+        postings = self._editable()
+        for chunk_id in ids:
+            if chunk_id not in self.chunks:
+                continue
+            for term in self._terms(chunk_id):
+                posting = postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del postings[term]
+            del self._lengths[chunk_id]
+            del self.chunks[chunk_id]
+            self.dirty = True
+
+    def clear(self):
+        self.__init__(self.k1, self.b, self.common_ratio)
+        self.dirty = True
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top-k (chunk id, BM25 score) for `query`; chunks sharing no term with it are not returned."""
+        if not self.chunks:
+            return []
+        frozen = self._searchable()
+        total = len(frozen.ids)
+        postings = [p for p in (frozen.posting(term) for term in set(tokenize(query))) if p is not None]
+        rare = [p for p in postings if len(p[0]) <= self.common_ratio * total]
+        if rare: # Very common terms barely move BM25 but have the longest postings
+            postings = rare
+        if not postings:
+            return []
+        lengths = frozen.lengths.astype(np.float32)
+        avg_length = float(lengths.mean()) or 1.0
+        scores = np.zeros(total, dtype=np.float32)
+        matched = np.zeros(total, dtype=bool)
+        for docs, tfs in postings:
+            idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            tfs = tfs.astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs] / avg_length)
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+            matched[docs] = True
+        candidates = np.flatnonzero(matched)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(frozen.ids[i], float(scores[i])) for i in candidates.tolist()]
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        frozen = self._searchable()
+        meta = {
+            "version": INDEX_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "ids": frozen.ids,
+            "chunks": [self.chunks[chunk_id] for chunk_id in frozen.ids],
+            "terms": frozen.terms,
+        }
+        buffer = io.BytesIO()
+        np.savez(buffer, meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+                 offsets=frozen.offsets, docs=frozen.docs, tfs=frozen.tfs, lengths=frozen.lengths)
+        tmp_path = self.path(directory) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(tmp_path, self.path(directory)) # Atomic, like the ingest manifest
+        try:
+            os.remove(os.path.join(directory, LEGACY_INDEX_FILE))
+        except OSError:
+            pass
+        self.dirty = False
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["LexicalIndex"]:
+        """The saved index, or None if there is none (or it is from another version)."""
+        if not os.path.exists(cls.path(directory)):
+            return cls._load_legacy(directory)
+        try:
+            with np.load(cls.path(directory)) as data:
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                if meta.get("version") != INDEX_VERSION:
+                    return None
+                arrays = {name: data[name] for name in ("offsets", "docs", "tfs", "lengths")}
+        except (OSError, ValueError, KeyError):
+            return None
+        index = cls(meta["k1"], meta["b"])
+        index.chunks = {chunk_id: (text, metadata) for chunk_id, (text, metadata) in zip(meta["ids"], meta["chunks"])}
+        index._postings, index._lengths = None, {}
+        index._frozen = _Frozen(meta["ids"], meta["terms"], **arrays)
+        return index
+
+    @classmethod
+    def _load_legacy(cls, directory: str) -> Optional["LexicalIndex"]:
+        """A format-1 index (text only), tokenized again here; the next ingest saves it in the current format."""
+        try:
+            with open(os.path.join(directory, LEGACY_INDEX_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != 1:
+            return None
+        index = cls()
+        chunks = data.get("chunks", {})
+        index.add(chunks.keys(), (c[0] for c in chunks.values()), (c[1] for c in chunks.values()))
+        index.dirty = True # Unchanged, but ingest should rewrite it in the current format
+        return index
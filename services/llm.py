@@ -1,24 +1,68 @@
 import json
+import time
+import asyncio
 import yaml
-from typing import Any, Dict, Optional
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
 from dataclasses import dataclass, field
-from openai import AsyncOpenAI
-import google.genai as genai
-from google.genai import types as genai_types
+from services.llm_cache import LLMCache
+from services.llm_scheduler import RequestScheduler, request_priority
+from services.llm_hedging import CircuitBreaker, CircuitOpenError, hedged_call, hedged_stream
+from services.tokens import count_tokens
+from services.prompt_packer import PromptPacker
+from services.json_stream import JSONArrayStream
+from services.metrics import LLM_CACHE, LLM_ERRORS, LLM_JSON_RETRIES, LLM_LATENCY, LLM_TOKENS, LLM_TTFT, span
 
 
 def _is_gemini(model_name: str) -> bool:
     return model_name.startswith("gemini")
 
 
+def _provider_for(model_name: str) -> str:
+    if model_name.startswith("fake"):
+        return "fake"
+    return "google" if _is_gemini(model_name) else "openai"
+
+
+def _unwrap_list(result: Any, key: str) -> List[Any]:
+    if isinstance(result, dict):
+        if isinstance(result.get(key), list):
+            return result[key]
+        lists = [v for v in result.values() if isinstance(v, list)]
+        return lists[0] if lists else [result]
+    return result if isinstance(result, list) else []
+
+
 @dataclass
 class ModelConfig:
     name: str
     temperature: float
     max_tokens: int
+    cache: bool = True
+    hedge: Optional["ModelConfig"] = None # Backup model raced against this one after hedge_delay
+    hedge_delay: float = 5.0
+    hedge_percentile: Optional[float] = None # If set, hedge at this observed latency percentile instead
+    input_budget: Optional[int] = None # Prompt tokens the packer may fill; None = unbounded
     provider: str = field(init=False)
     def __post_init__(self):
-        self.provider = "google" if _is_gemini(self.name) else "openai"
+        self.provider = _provider_for(self.name)
+
+    @staticmethod
+    def from_dict(cfg: Dict[str, Any]) -> "ModelConfig":
+        hedge_cfg = cfg.get("hedge")
+        hedge = None
+        if hedge_cfg:
+            hedge = ModelConfig(name=hedge_cfg["model"], temperature=hedge_cfg.get("temperature", cfg["temperature"]), max_tokens=hedge_cfg.get("max_tokens", cfg["max_tokens"]))
+        return ModelConfig(
+            name=cfg["name"],
+            temperature=cfg["temperature"],
+            max_tokens=cfg["max_tokens"],
+            cache=cfg.get("cache", True),
+            hedge=hedge,
+            hedge_delay=(hedge_cfg or {}).get("delay_seconds", 5.0),
+            hedge_percentile=(hedge_cfg or {}).get("delay_percentile"),
+            input_budget=cfg.get("input_budget"),
+        )
 
 
 class LLMService:
@@ -26,26 +70,134 @@ class LLMService:
     Centralized LLM router.
     Routes different creative roles to different models + configs.
     Supports OpenAI (GPT) and Google (Gemini) providers, determined
-    automatically from the model name in models.yaml.
+    automatically from the model name in models.yaml. Model names starting
+    with "fake" go to the offline FakeProvider (see services.fake_provider).
     """
 
+    # Top-level sections of models.yaml that configure the service itself rather than a role.
+    SETTINGS_SECTIONS = ("response_cache", "rate_limits", "circuit_breaker", "fake_provider", "graph") # "graph" is read by build_graph
+
     @staticmethod
     def load_config_from_yaml(file_path: str) -> Dict[str, ModelConfig]:
         with open(file_path, "r") as f:
             raw_config = yaml.safe_load(f)
         return {
-            role: ModelConfig(name=cfg["name"], temperature=cfg["temperature"], max_tokens=cfg["max_tokens"])
+            role: ModelConfig.from_dict(cfg)
             for role, cfg in raw_config.items()
+            if role not in LLMService.SETTINGS_SECTIONS
         }
 
-    def __init__(self, api_key: str, model_map: Dict[str, ModelConfig], google_api_key: str = ""):
-        self.openai_client = AsyncOpenAI(api_key=api_key)
+    @staticmethod
+    def load_settings_from_yaml(file_path: str) -> Dict[str, Any]:
+        with open(file_path, "r") as f:
+            raw_config = yaml.safe_load(f)
+        return {section: raw_config[section] for section in LLMService.SETTINGS_SECTIONS if section in raw_config}
+
+    def __init__(self, api_key: str, model_map: Dict[str, ModelConfig], google_api_key: str = "", settings: Optional[Dict[str, Any]] = None):
+        settings = settings or {}
+        # Provider SDKs are imported and their clients built on first use (or by warm_up()).
+        self.api_key = api_key
         self.google_api_key = google_api_key
         self.model_map = model_map
-        if google_api_key:
-            self._google_client = genai.Client(api_key=google_api_key)
+        self._openai_client = None
+        self._google_client = None
+        cache_cfg = dict(settings.get("response_cache") or {})
+        if cache_cfg.pop("enabled", True):
+            self.cache: Optional[LLMCache] = LLMCache(**cache_cfg)
         else:
-            self._google_client = None
+            self.cache = None
+        self.scheduler = RequestScheduler(settings.get("rate_limits"))
+        breaker_cfg = settings.get("circuit_breaker") or {}
+        self.breakers = {provider: CircuitBreaker(provider, **breaker_cfg) for provider in ("openai", "google", "fake")}
+        self._fake_settings = settings.get("fake_provider")
+        self._fake = None
+        self._latencies: Dict[str, Deque[float]] = {role: deque(maxlen=200) for role in model_map}
+        self._hedges: Dict[str, Dict[str, int]] = {role: {"calls": 0, "fired": 0, "won": 0} for role, cfg in model_map.items() if cfg.hedge}
+
+    @property
+    def openai_client(self):
+        if self._openai_client is None:
+            from openai import AsyncOpenAI
+            self._openai_client = AsyncOpenAI(api_key=self.api_key, max_retries=0) # Retries are owned by the scheduler
+        return self._openai_client
+
+    @property
+    def google_client(self):
+        if self._google_client is None:
+            if not self.google_api_key:
+                raise RuntimeError("Google API key not configured. Set GOOGLE_API_KEY in .env")
+            import google.genai as genai
+            self._google_client = genai.Client(api_key=self.google_api_key)
+        return self._google_client
+
+    @property
+    def fake(self):
+        if self._fake is None:
+            from services.fake_provider import FakeProvider
+            self._fake = FakeProvider(self._fake_settings)
+        return self._fake
+
+    def providers(self) -> List[str]:
+        """Providers used by configured roles, including hedge backups."""
+        configs = list(self.model_map.values()) + [cfg.hedge for cfg in self.model_map.values() if cfg.hedge]
+        return sorted({cfg.provider for cfg in configs})
+
+    def warm_up(self):
+        """
+        Import the SDKs and build the HTTP clients for the providers the roles use, and load
+        their tokenizers, so the first request doesn't pay for it. Blocking; run it in a thread.
+        """
+        providers = self.providers()
+        if "openai" in providers:
+            self.openai_client
+        if "google" in providers and self.google_api_key:
+            self.google_client
+            from google.genai import types # noqa: F401 (used per call)
+        if "fake" in providers:
+            self.fake
+        for config in self.model_map.values():
+            count_tokens("warm up", config.name)
+
+    def _cache_key(self, role: str, system_prompt: str, user_prompt: str, want_json: bool) -> Optional[str]:
+        config = self.model_map[role]
+        if self.cache is None or not config.cache:
+            return None
+        return LLMCache.make_key(role, config.name, config.temperature, config.max_tokens, system_prompt, user_prompt, want_json)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats() if self.cache is not None else {}
+
+    def queue_depth(self) -> Dict[str, Any]:
+        return self.scheduler.queue_depth()
+
+    def hedge_stats(self) -> Dict[str, Any]:
+        return {
+            "roles": {role: dict(stats) for role, stats in self._hedges.items()},
+            "circuits": {provider: breaker.state for provider, breaker in self.breakers.items()},
+        }
+
+    def _hedge_delay(self, role: str, config: ModelConfig) -> float:
+        samples = self._latencies[role]
+        if config.hedge_percentile is None or len(samples) < 20:
+            return config.hedge_delay
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * config.hedge_percentile / 100))]
+
+    def _record_hedge(self, role: str, winner: str, fired: bool):
+        stats = self._hedges[role]
+        stats["calls"] += 1
+        stats["fired"] += int(fired)
+        stats["won"] += int(winner == "backup")
+
+    def packer(self, role: str) -> PromptPacker:
+        """Prompt packer sized to `role`'s model tokenizer and input budget."""
+        config = self.model_map[role]
+        return PromptPacker(config.name, config.input_budget)
+
+    @staticmethod
+    def priority(level: int):
+        """Context manager: LLM calls made inside run at `level` (see services.llm_scheduler)."""
+        return request_priority(level)
 
     async def _chat_openai(self, config: ModelConfig, system_prompt: str, user_prompt: str, response_format: Optional[Dict[str, Any]] = None) -> str:
         response = await self.openai_client.chat.completions.create(
@@ -58,39 +210,190 @@ class LLMService:
             ],
             response_format=response_format,
         )
-        usage = response.usage
-        print(f"[LLM/OpenAI] model={config.name} tokens={usage.total_tokens}")
         return response.choices[0].message.content
 
     async def _chat_google(self, config: ModelConfig, system_prompt: str, user_prompt: str, want_json: bool = False) -> str:
-        if self._google_client is None:
-            raise RuntimeError("Google API key not configured. Set GOOGLE_API_KEY in .env")
+        from google.genai import types as genai_types
         gen_config = genai_types.GenerateContentConfig(temperature=config.temperature, max_output_tokens=config.max_tokens, system_instruction=system_prompt, response_mime_type="application/json" if want_json else "text/plain")
-        response = await self._google_client.aio.models.generate_content(model=config.name, contents=user_prompt, config=gen_config)
-        text = response.text
-        print(f"[LLM/Google] model={config.name} chars={len(text)}")
+        response = await self.google_client.aio.models.generate_content(model=config.name, contents=user_prompt, config=gen_config)
+        return response.text
+
+    async def _stream_openai(self, config: ModelConfig, system_prompt: str, user_prompt: str, response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        stream = await self.openai_client.chat.completions.create(
+            model=config.name,
+            temperature=config.temperature,
+            max_tokens=config.max_tokens,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user",   "content": user_prompt},
+            ],
+            response_format=response_format,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def _stream_google(self, config: ModelConfig, system_prompt: str, user_prompt: str, want_json: bool = False) -> AsyncIterator[str]:
+        from google.genai import types as genai_types
+        gen_config = genai_types.GenerateContentConfig(temperature=config.temperature, max_output_tokens=config.max_tokens, system_instruction=system_prompt, response_mime_type="application/json" if want_json else "text/plain")
+        async for chunk in await self.google_client.aio.models.generate_content_stream(model=config.name, contents=user_prompt, config=gen_config):
+            if chunk.text:
+                yield chunk.text
+
+    @staticmethod
+    def _observe(role: str, config: ModelConfig, kind: str, elapsed: float, prompt_tokens: int, text: str):
+        LLM_LATENCY.labels(role, config.name, config.provider, kind).observe(elapsed)
+        LLM_TOKENS.labels(role, config.name, config.provider, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(role, config.name, config.provider, "completion").inc(count_tokens(text or "", config.name))
+
+    async def _call_model(self, role: str, config: ModelConfig, system_prompt: str, user_prompt: str, response_format: Optional[Dict[str, Any]], want_json: bool) -> str:
+        breaker = self.breakers[config.provider]
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for provider={config.provider}; failing fast")
+        prompt_tokens = count_tokens(system_prompt, config.name) + count_tokens(user_prompt, config.name)
+        estimated_tokens = prompt_tokens + config.max_tokens
+        if config.provider == "fake":
+            call = lambda: self.fake.chat(config.name, system_prompt, user_prompt, want_json=want_json)
+        elif config.provider == "google":
+            call = lambda: self._chat_google(config, system_prompt, user_prompt, want_json=want_json)
+        else:
+            call = lambda: self._chat_openai(config, system_prompt, user_prompt, response_format=response_format)
+        started = time.perf_counter()
+        try:
+            with span("llm", role=role, model=config.name):
+                text = await self.scheduler.run(config.provider, config.name, estimated_tokens, call)
+        except asyncio.CancelledError:
+            breaker.release_trial()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            LLM_ERRORS.labels(role, config.name, config.provider, type(e).__name__).inc()
+            raise
+        breaker.record_success()
+        elapsed = time.perf_counter() - started
+        if config is self.model_map[role]:
+            self._latencies[role].append(elapsed)
+        self._observe(role, config, "chat", elapsed, prompt_tokens, text)
         return text
 
-    async def _chat(role: str, system_prompt: str, user_prompt: str, response_format: Optional[Dict[str, Any]] = None, want_json: bool = False) -> Any:
+    def _open_stream(self, role: str, config: ModelConfig, system_prompt: str, user_prompt: str, want_json: bool = False) -> AsyncIterator[str]:
+        breaker = self.breakers[config.provider]
+
+        async def stream():
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for provider={config.provider}; failing fast")
+            prompt_tokens = count_tokens(system_prompt, config.name) + count_tokens(user_prompt, config.name)
+            estimated_tokens = prompt_tokens + config.max_tokens
+            if config.provider == "fake":
+                open_stream = lambda: self.fake.stream(config.name, system_prompt, user_prompt, want_json=want_json)
+            elif config.provider == "google":
+                open_stream = lambda: self._stream_google(config, system_prompt, user_prompt, want_json=want_json)
+            else:
+                open_stream = lambda: self._stream_openai(config, system_prompt, user_prompt, response_format={"type": "json_object"} if want_json else None)
+            started = time.perf_counter()
+            first = True
+            parts = []
+            try:
+                with span("llm_stream", role=role, model=config.name):
+                    async for delta in self.scheduler.stream(config.provider, config.name, estimated_tokens, open_stream):
+                        if first:
+                            ttft = time.perf_counter() - started
+                            LLM_TTFT.labels(role, config.name, config.provider).observe(ttft)
+                            if config is self.model_map[role]:
+                                self._latencies[role].append(ttft) # Streams hedge on time-to-first-token
+                        first = False
+                        parts.append(delta)
+                        yield delta
+            except (asyncio.CancelledError, GeneratorExit):
+                breaker.release_trial()
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                LLM_ERRORS.labels(role, config.name, config.provider, type(e).__name__).inc()
+                raise
+            breaker.record_success()
+            self._observe(role, config, "stream", time.perf_counter() - started, prompt_tokens, "".join(parts))
+        return stream()
+
+    async def _chat(self, role: str, system_prompt: str, user_prompt: str, response_format: Optional[Dict[str, Any]] = None, want_json: bool = False) -> Any:
         config = self.model_map[role]
+        cache_key = self._cache_key(role, system_prompt, user_prompt, want_json)
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            LLM_CACHE.labels(role, "miss" if cached is None else "hit").inc()
+            if cached is not None:
+                return cached
+        started = time.perf_counter()
+        call = lambda cfg: self._call_model(role, cfg, system_prompt, user_prompt, response_format, want_json)
         try:
-            if config.provider == "google":
-                return await self._chat_google(config, system_prompt, user_prompt, want_json=want_json)
+            if config.hedge is None:
+                text = await call(config)
+            elif self.breakers[config.provider].state == "open":
+                text = await call(config.hedge) # Route around a provider that keeps failing
             else:
-                return await self._chat_openai(config, system_prompt, user_prompt, response_format=response_format)
+                text, winner, fired = await hedged_call(lambda: call(config), lambda: call(config.hedge), self._hedge_delay(role, config))
+                self._record_hedge(role, winner, fired)
         except Exception as e:
             print(f"[LLM ERROR] role={role} provider={config.provider}: {e}")
             raise
+        if cache_key is not None and text:
+            await self.cache.aset(cache_key, text, time.perf_counter() - started)
+        return text
 
     async def generate_text(self, role: str, system_prompt: str, user_prompt: str) -> str:
         return await self._chat(role, system_prompt, user_prompt)
 
+    def stream_text(self, role: str, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """
+        Yield the response for `role` as text deltas while it is generated.
+        Shares the cache and scheduler with generate_text; a cache hit is yielded in one piece.
+        """
+        return self._stream(role, system_prompt, user_prompt, want_json=False)
+
+    async def _stream(self, role: str, system_prompt: str, user_prompt: str, want_json: bool) -> AsyncIterator[str]:
+        config = self.model_map[role]
+        cache_key = self._cache_key(role, system_prompt, user_prompt, want_json)
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            LLM_CACHE.labels(role, "miss" if cached is None else "hit").inc()
+            if cached is not None:
+                yield cached
+                return
+        if config.hedge is None:
+            deltas = self._open_stream(role, config, system_prompt, user_prompt, want_json)
+        elif self.breakers[config.provider].state == "open":
+            deltas = self._open_stream(role, config.hedge, system_prompt, user_prompt, want_json) # Route around a provider that keeps failing
+        else:
+            deltas = hedged_stream(
+                lambda: self._open_stream(role, config, system_prompt, user_prompt, want_json),
+                lambda: self._open_stream(role, config.hedge, system_prompt, user_prompt, want_json),
+                self._hedge_delay(role, config),
+                lambda winner, fired: self._record_hedge(role, winner, fired),
+            )
+        started = time.perf_counter()
+        parts = []
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            print(f"[LLM ERROR] role={role} provider={config.provider}: {e}")
+            raise
+        text = "".join(parts)
+        if cache_key is not None and text:
+            await self.cache.aset(cache_key, text, time.perf_counter() - started)
+
     async def generate_json(self, role: str, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
         raw = await self._chat(role, system_prompt, user_prompt, response_format={"type": "json_object"}, want_json=True)
         try:
             return json.loads(raw)
         except json.JSONDecodeError:
             print("[LLM WARNING] JSON parsing failed, retrying once...")
+            LLM_JSON_RETRIES.labels(role).inc()
+            cache_key = self._cache_key(role, system_prompt, user_prompt, want_json=True)
+            if cache_key is not None:
+                await self.cache.adelete(cache_key) # Never serve an unparseable response again
             retry = await self._chat(
                 role,
                 system_prompt,
@@ -98,4 +401,33 @@ class LLMService:
                 response_format={"type": "json_object"},
                 want_json=True,
             )
-            return json.loads(retry)
\ No newline at end of file
+            return json.loads(retry)
+
+    async def generate_json_list(self, role: str, system_prompt: str, user_prompt: str, key: str) -> List[Dict[str, Any]]:
+        """
+        generate_json for list-shaped answers. JSON mode often wraps lists in an object,
+        so {key: [...]}, the first list value, or a lone object are all unwrapped to a list.
+        """
+        return _unwrap_list(await self.generate_json(role, system_prompt, user_prompt), key)
+
+    async def stream_json_items(self, role: str, system_prompt: str, user_prompt: str, key: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming generate_json_list: yield each object of the answer's list as soon as
+        it closes, instead of after the whole document. If no item could be parsed
+        incrementally (unexpected shape or broken JSON) the finished answer goes
+        through generate_json_list, including its one re-ask.
+        """
+        parser = JSONArrayStream(key)
+        yielded = 0
+        async for delta in self._stream(role, system_prompt, user_prompt, want_json=True):
+            for item in parser.feed(delta):
+                yielded += 1
+                yield item
+        if yielded:
+            return
+        try:
+            items = _unwrap_list(json.loads(parser.text), key)
+        except json.JSONDecodeError:
+            items = await self.generate_json_list(role, system_prompt, user_prompt, key) # Cached broken text is dropped there
+        for item in items:
+            yield item
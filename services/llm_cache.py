@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class LLMCache:
+    """
+    Content-addressed response cache for LLMService.
+    A small in-memory LRU sits in front of a SQLite store on disk.
+    Entries expire after `ttl_seconds`; the disk store is trimmed to
+    `max_entries` by least-recent access.
+
+    The async methods serve memory hits inline and run SQLite work in a thread.
+    Disk hits only record their access time; those are written with the next
+    commit (a write, a prune, close, or every `_TOUCH_EVERY` hits).
+    """
+
+    _PRUNE_EVERY = 100
+    _TOUCH_EVERY = 100
+
+    def __init__(self, path: str = "./llm_cache.sqlite", ttl_seconds: int = 7 * 24 * 3600, max_entries: int = 5000, memory_entries: int = 256):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._touched: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.saved_seconds = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " latency REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(role: str, model: str, temperature: float, max_tokens: int, system_prompt: str, user_prompt: str, json_mode: bool) -> str:
+        payload = json.dumps([role, model, temperature, max_tokens, system_prompt, user_prompt, json_mode], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        value, latency, created_at = entry
+        if now - created_at > self.ttl_seconds:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        self.hits += 1
+        self.memory_hits += 1
+        self.saved_seconds += latency
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            value = self._memory_get(key, now)
+            if value is not None:
+                return value
+            row = self._conn.execute("SELECT value, latency, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[2] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            value, latency, created_at = row
+            self._touched[key] = now
+            if len(self._touched) >= self._TOUCH_EVERY:
+                self._write_touched()
+                self._conn.commit()
+            self._remember(key, value, latency, created_at)
+            self.hits += 1
+            self.saved_seconds += latency
+            return value
+
+    def set(self, key: str, value: str, latency: float = 0.0):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, latency, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, latency, now, now),
+            )
+            self._touched.pop(key, None)
+            self._writes += 1
+            self._write_touched()
+            if self._writes % self._PRUNE_EVERY == 0:
+                self._prune(now)
+            self._conn.commit()
+            self._remember(key, value, latency, now)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._touched.pop(key, None)
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    async def aget(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._memory_get(key, time.time())
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str, latency: float = 0.0):
+        await asyncio.to_thread(self.set, key, value, latency)
+
+    async def adelete(self, key: str):
+        await asyncio.to_thread(self.delete, key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+    def close(self):
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+            self._conn.close()
+
+    def _remember(self, key: str, value: str, latency: float, created_at: float):
+        self._memory[key] = (value, latency, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?", [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+
+    def _prune(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
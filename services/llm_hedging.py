@@ -0,0 +1,133 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls (counted after the
+    scheduler's tenacity retries give up) and fails fast for `reset_seconds`,
+    then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"[LLM] circuit open for provider={self.name} after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """A half-open trial ended without an outcome (e.g. it was cancelled by a hedge)."""
+        self._trial_in_flight = False
+
+
+async def hedged_call(primary: Callable[[], Awaitable[Any]], backup: Callable[[], Awaitable[Any]], delay: float) -> Tuple[Any, str, bool]:
+    """
+    Start `primary`; if it hasn't succeeded after `delay` seconds (or fails sooner), also start
+    `backup` and take whichever succeeds first, cancelling the other.
+    Returns (result, "primary" | "backup", hedge_fired).
+    """
+    first = asyncio.ensure_future(primary())
+    second: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done and first.exception() is None:
+            return first.result(), "primary", False
+        second = asyncio.ensure_future(backup())
+        pending = {second} if done else {first, second}
+        error: Optional[BaseException] = first.exception() if done else None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), ("backup" if task is second else "primary"), True
+                error = task.exception()
+        raise error
+    finally:
+        for task in (first, second):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def hedged_stream(primary: Callable[[], AsyncIterator[str]], backup: Callable[[], AsyncIterator[str]], delay: float, on_decided: Callable[[str, bool], None]) -> AsyncIterator[str]:
+    """
+    Streaming variant of hedged_call that races on time-to-first-delta. The losing stream
+    is cancelled as soon as the winner produces its first delta; `on_decided(winner, fired)`
+    is called once the race is settled.
+    """
+    streams = {"primary": primary()}
+    pulls = {"primary": asyncio.ensure_future(anext(streams["primary"]))}
+    fired = False
+    winner: Optional[str] = None
+    try:
+        await asyncio.wait(set(pulls.values()), timeout=delay)
+        while winner is None:
+            for name, pull in list(pulls.items()):
+                if not pull.done():
+                    continue
+                error = pull.exception()
+                if error is None or isinstance(error, StopAsyncIteration):
+                    winner = name
+                    break
+                del pulls[name]
+                if not pulls and fired:
+                    raise error
+            if winner is None:
+                if not fired:
+                    fired = True
+                    streams["backup"] = backup()
+                    pulls["backup"] = asyncio.ensure_future(anext(streams["backup"]))
+                await asyncio.wait(set(pulls.values()), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for name, stream in streams.items():
+            if name == winner:
+                continue
+            pull = pulls.get(name)
+            if pull is not None and not pull.done():
+                pull.cancel()
+                await asyncio.gather(pull, return_exceptions=True)
+            await stream.aclose()
+    on_decided(winner, fired)
+    stream = streams[winner]
+    try:
+        if pulls[winner].exception() is not None: # Winner finished without producing anything
+            return
+        yield pulls[winner].result()
+        async for delta in stream:
+            yield delta
+    finally:
+        await stream.aclose()
@@ -0,0 +1,260 @@
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt
+from services.metrics import LLM_RETRIES
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+_request_priority: ContextVar[int] = ContextVar("llm_request_priority", default=PRIORITY_INTERACTIVE)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+@contextmanager
+def request_priority(level: int):
+    """
+    Run LLM calls made inside this block at `level` (lower runs first).
+    Propagates through asyncio tasks spawned from the block. Priority orders calls
+    queued on one RequestScheduler, i.e. within one process; `batch.py --server`
+    runs its themes in the server so they share its scheduler.
+    """
+    token = _request_priority.set(level)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Extract a server-provided retry delay (seconds) from an OpenAI or Gemini error."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    match = _RETRY_DELAY_RE.search(str(exc))
+    return float(match.group(1)) if match else None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return _status_code(exc) in RETRYABLE_STATUS
+
+
+class PrioritySemaphore:
+    """
+    Semaphore whose waiters are woken lowest-priority-value first (FIFO within a level).
+    """
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.in_flight = 0
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int):
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release() # We were handed a slot just as we got cancelled; pass it on
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+                return
+        self._value += 1
+
+
+class TokenBucket:
+    """Continuous-refill budget of `per_minute` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class _ProviderLimits:
+    def __init__(self, cfg: Dict[str, Any]):
+        self.max_concurrency = int(cfg.get("max_concurrency", 8))
+        self.semaphore = PrioritySemaphore(self.max_concurrency)
+        self.model_concurrency = dict(cfg.get("model_concurrency") or {})
+        self.models: Dict[str, PrioritySemaphore] = {}
+        self.requests = TokenBucket(cfg["requests_per_minute"]) if cfg.get("requests_per_minute") else None
+        self.tokens = TokenBucket(cfg["tokens_per_minute"]) if cfg.get("tokens_per_minute") else None
+        self.cooldown_until = 0.0
+
+    def model_semaphore(self, model_name: str) -> PrioritySemaphore:
+        if model_name not in self.models:
+            self.models[model_name] = PrioritySemaphore(int(self.model_concurrency.get(model_name, self.max_concurrency)))
+        return self.models[model_name]
+
+
+class RequestScheduler:
+    """
+    Admission control for provider calls made by LLMService.
+    Per-provider and per-model concurrency slots are granted by priority;
+    requests/min and tokens/min budgets are enforced with token buckets, waited for
+    before a slot is taken so a call short of budget doesn't hold one;
+    retryable failures back off with jitter, honouring retry-after hints.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Any]] = None):
+        limits = dict(limits or {})
+        self.max_retries = int(limits.pop("max_retries", 4))
+        self.max_backoff = float(limits.pop("max_backoff_seconds", 60))
+        self._limits_cfg = limits
+        self._providers: Dict[str, _ProviderLimits] = {}
+        self.retries = 0
+        self.rate_limited = 0
+
+    def _provider(self, provider: str) -> _ProviderLimits:
+        if provider not in self._providers:
+            self._providers[provider] = _ProviderLimits(self._limits_cfg.get(provider) or {})
+        return self._providers[provider]
+
+    def queue_depth(self) -> Dict[str, Any]:
+        return {
+            provider: {
+                "waiting": limits.semaphore.waiting + sum(m.waiting for m in limits.models.values()),
+                "in_flight": limits.semaphore.in_flight,
+                "models": {name: {"waiting": sem.waiting, "in_flight": sem.in_flight} for name, sem in limits.models.items()},
+            }
+            for provider, limits in self._providers.items()
+        }
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model_name: str, estimated_tokens: int):
+        limits = self._provider(provider)
+        priority = _request_priority.get()
+        model_sem = limits.model_semaphore(model_name)
+        while True:
+            wait = self._budget_wait(limits, estimated_tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            await model_sem.acquire(priority)
+            try:
+                await limits.semaphore.acquire(priority)
+            except BaseException:
+                model_sem.release()
+                raise
+            if self._budget_wait(limits, estimated_tokens) <= 0:
+                break
+            # Calls granted a slot first spent the budget while this one queued; give the slots back and wait again
+            limits.semaphore.release()
+            model_sem.release()
+        if limits.requests:
+            limits.requests.consume(1)
+        if limits.tokens:
+            limits.tokens.consume(estimated_tokens)
+        try:
+            yield
+        finally:
+            limits.semaphore.release()
+            model_sem.release()
+
+    @staticmethod
+    def _budget_wait(limits: _ProviderLimits, estimated_tokens: int) -> float:
+        """Seconds until the provider's cooldown and rate budgets allow one more call of `estimated_tokens`."""
+        wait = max(0.0, limits.cooldown_until - time.monotonic())
+        if limits.requests:
+            wait = max(wait, limits.requests.wait_time(1))
+        if limits.tokens:
+            wait = max(wait, limits.tokens.wait_time(estimated_tokens))
+        return wait
+
+    def _delay(self, provider: str, exc: Optional[BaseException], attempt: int) -> float:
+        self.retries += 1
+        if exc is not None and _status_code(exc) == 429:
+            self.rate_limited += 1
+            LLM_RETRIES.labels(provider, "rate_limited").inc()
+        else:
+            LLM_RETRIES.labels(provider, "error").inc()
+        hint = _retry_after(exc) if exc is not None else None
+        if hint is None:
+            return random.uniform(0, min(self.max_backoff, 0.5 * 2 ** attempt)) # Full jitter
+        delay = min(hint, self.max_backoff) + random.uniform(0, 0.25 * hint + 0.5)
+        limits = self._provider(provider)
+        limits.cooldown_until = max(limits.cooldown_until, time.monotonic() + delay) # Hold the whole provider, not just this call
+        return delay
+
+    async def run(self, provider: str, model_name: str, estimated_tokens: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=lambda retry_state: self._delay(provider, retry_state.outcome.exception(), retry_state.attempt_number),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                async with self.slot(provider, model_name, estimated_tokens):
+                    return await call()
+
+    async def stream(self, provider: str, model_name: str, estimated_tokens: int, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Like run(), for streamed responses. The slot is held for the whole stream;
+        a failure is only retried if nothing has been yielded yet.
+        """
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.slot(provider, model_name, estimated_tokens):
+                    async for delta in open_stream():
+                        started = True
+                        yield delta
+                return
+            except Exception as e:
+                attempt += 1
+                if started or attempt > self.max_retries or not _is_retryable(e):
+                    raise
+                await asyncio.sleep(self._delay(provider, e, attempt))
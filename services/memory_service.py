@@ -1,35 +1,227 @@
 import os
-from typing import List, Dict, Any
-from langchain_community.vectorstores import Chroma
+import asyncio
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
 from langchain_community.embeddings import OpenAIEmbeddings
+from services.lexical_index import LexicalIndex
+from services.singleflight import SingleFlight
+from services.vector_store import open_vector_store
+
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
 
 
 class MemoryService:
     """
     Retrieves contextual memory from vectorized Obsidian vault.
     Designed for creative diversification, not just similarity.
+
+    `retrieval_mode` picks how queries are answered: "vector" (embedding + MMR search),
+    "lexical" (local BM25 only, no embedding call) or "hybrid" (both rankings merged by
+    reciprocal rank fusion). Without a BM25 index from ingest, every mode uses vectors.
+
+    `vector_backend` is where ingest wrote the embeddings: "chroma", or the memory-mapped
+    "numpy" / "numpy-int8" stores (see services/vector_store.py).
     """
 
-    def __init__(self, persist_directory: str, embedding_api_key: str):
-        self.embeddings = OpenAIEmbeddings(openai_api_key=embedding_api_key)
-        self.vectorstore = Chroma(persist_directory=persist_directory, embedding_function=self.embeddings)
-
-    def retrieve_context(self, query: str, k: int = 8) -> List[Dict[str, Any]]:
-        results = self.vectorstore.similarity_search_with_score(query, k=k * 4) # Increase initial search space for diversification
-        diversified = []
-        seen_sources = set()
-        for doc, score in results:
-            metadata = doc.metadata or {}
-            source = metadata.get("source", "unknown") # Use source file for diversification
-            if source in seen_sources:
+    def __init__(self, persist_directory: str, embedding_api_key: str, query_cache_size: int = 512, mmr_lambda: float = 0.6, per_source_cap: Optional[int] = 2, embeddings: Optional[Any] = None, retrieval_mode: str = "hybrid", rrf_k: int = 60, vector_backend: str = "chroma"):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval_mode must be one of {RETRIEVAL_MODES}, got {retrieval_mode!r}")
+        self.embeddings = embeddings or OpenAIEmbeddings(openai_api_key=embedding_api_key)
+        self.store = open_vector_store(persist_directory, vector_backend, self.embeddings)
+        self.persist_directory = persist_directory
+        self.retrieval_mode = retrieval_mode
+        self.rrf_k = rrf_k
+        self._lexical: Optional[LexicalIndex] = None
+        self._lexical_mtime: Optional[float] = None
+        self._lexical_lock = threading.Lock()
+        self._lexical_loading = False
+        self._lexical_loaded = False
+        self.mmr_lambda = mmr_lambda
+        self.per_source_cap = per_source_cap
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._flights = SingleFlight("retrieval") # Concurrent identical retrievals share one search
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed queries through the LRU cache; all misses go out in one embedding request.
+        The result is built from what this call found or embedded, so another thread
+        evicting entries in between cannot lose them.
+        """
+        keys = [self._normalize_query(q) for q in queries]
+        found: Dict[str, List[float]] = {}
+        with self._cache_lock:
+            for key in dict.fromkeys(keys):
+                if key in self._query_cache:
+                    self._query_cache.move_to_end(key)
+                    found[key] = self._query_cache[key]
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            vectors = self.embeddings.embed_documents(missing)
+            found.update(zip(missing, vectors))
+            with self._cache_lock:
+                for key, vector in zip(missing, vectors):
+                    self._query_cache[key] = vector
+                    self._query_cache.move_to_end(key)
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return [found[key] for key in keys]
+
+    @staticmethod
+    def _mmr(query: np.ndarray, candidates: np.ndarray, sources: np.ndarray, k: int, lambda_mult: float, per_source_cap: Optional[int]) -> List[int]:
+        """
+        Maximal marginal relevance over cosine similarity, vectorized over candidates.
+        Each step picks argmax(lambda * relevance - (1 - lambda) * max similarity to the picks so far);
+        once a source reaches `per_source_cap` picks, its remaining chunks are masked out.
+        """
+        candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        relevance = candidates @ query
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        available = np.ones(len(candidates), dtype=bool)
+        source_ids = np.unique(sources, return_inverse=True)[1]
+        source_counts = np.zeros(source_ids.max() + 1 if len(source_ids) else 0, dtype=np.int32)
+        selected: List[int] = []
+        while len(selected) < k and available.any():
+            scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+            best = int(np.argmax(scores))
+            selected.append(best)
+            available[best] = False
+            if per_source_cap:
+                source_counts[source_ids[best]] += 1
+                if source_counts[source_ids[best]] >= per_source_cap:
+                    available &= source_ids != source_ids[best]
+            redundancy = np.maximum(redundancy, candidates @ candidates[best])
+        return selected
+
+    def lexical_index(self) -> Optional[LexicalIndex]:
+        """
+        The BM25 index written by ingest, loaded on first use unless reload_lexical() ran
+        first (the server does at startup). When ingest has rewritten it, queries keep the
+        loaded index while the new one loads in a background thread and is swapped in.
+        """
+        if not self._lexical_loaded:
+            self.reload_lexical()
+        mtime = LexicalIndex.mtime(self.persist_directory)
+        with self._lexical_lock:
+            if mtime != self._lexical_mtime and not self._lexical_loading:
+                self._lexical_loading = True
+                threading.Thread(target=self.reload_lexical, name="lexical-reload", daemon=True).start()
+            return self._lexical
+
+    def reload_lexical(self):
+        """Load the saved BM25 index (off the lock; queries meanwhile use the current one) and swap it in."""
+        mtime = LexicalIndex.mtime(self.persist_directory)
+        try:
+            index = LexicalIndex.load(self.persist_directory) if mtime is not None else None
+        finally:
+            with self._lexical_lock:
+                self._lexical_loading = False
+        with self._lexical_lock:
+            self._lexical, self._lexical_mtime, self._lexical_loaded = index, mtime, True
+
+    @staticmethod
+    def _source_name(source: str) -> str:
+        return os.path.basename(source) if source != "unknown" else "Unknown"
+
+    @staticmethod
+    def _cap_sources(results: List[Dict[str, Any]], k: int, per_source_cap: Optional[int]) -> List[Dict[str, Any]]:
+        picked, counts = [], {}
+        for result in results:
+            source = result["metadata"].get("source", "unknown")
+            if per_source_cap and counts.get(source, 0) >= per_source_cap:
                 continue
-            seen_sources.add(source)
-            diversified.append({
-                "content": doc.page_content,
-                "score": float(score),
-                "metadata": metadata,
-                "source": os.path.basename(source) if source != "unknown" else "Unknown"
-            })
-            if len(diversified) >= k:
+            counts[source] = counts.get(source, 0) + 1
+            picked.append(result)
+            if len(picked) >= k:
                 break
-        return diversified
\ No newline at end of file
+        return picked
+
+    def _lexical_search(self, index: LexicalIndex, query: str, k: int) -> List[Dict[str, Any]]:
+        results = []
+        for chunk_id, score in index.search(query, k):
+            text, metadata = index.chunks[chunk_id]
+            results.append({"id": chunk_id, "content": text, "score": score, "metadata": metadata, "source": self._source_name(str(metadata.get("source", "unknown")))})
+        return results
+
+    def _fuse(self, rankings: List[List[Dict[str, Any]]], k: int, per_source_cap: Optional[int]) -> List[Dict[str, Any]]:
+        """Reciprocal rank fusion: each chunk scores sum(1 / (rrf_k + rank)) over the rankings it appears in."""
+        scores: Dict[str, float] = {}
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for ranking in rankings:
+            for rank, result in enumerate(ranking, 1):
+                scores[result["id"]] = scores.get(result["id"], 0.0) + 1.0 / (self.rrf_k + rank)
+                by_id.setdefault(result["id"], result)
+        fused = [dict(by_id[chunk_id], score=score) for chunk_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+        return self._cap_sources(fused, k, per_source_cap)
+
+    def _retrieve(self, query: str, embedding: Optional[List[float]], k: int, lambda_mult: Optional[float], per_source_cap: Optional[int], index: Optional[LexicalIndex], mode: str) -> List[Dict[str, Any]]:
+        per_source_cap = self.per_source_cap if per_source_cap is None else per_source_cap
+        lexical = self._lexical_search(index, query, k * 4) if index is not None and mode != "vector" else []
+        if mode == "lexical" and lexical:
+            return self._cap_sources(lexical, k, per_source_cap)
+        if embedding is None: # Lexical mode with no term matches falls back to vectors
+            embedding = self._embed_queries([query])[0]
+        if not lexical:
+            return self._search(embedding, k, lambda_mult, per_source_cap)
+        return self._fuse([self._search(embedding, k * 2, lambda_mult, per_source_cap), lexical], k, per_source_cap)
+
+    def _search(self, embedding: List[float], k: int, lambda_mult: Optional[float] = None, per_source_cap: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Diversified top-k. Starts from a 2k candidate pool and only grows it (doubling, up to 16k)
+        when the per-source cap leaves fewer than k picks.
+        """
+        lambda_mult = self.mmr_lambda if lambda_mult is None else lambda_mult
+        per_source_cap = self.per_source_cap if per_source_cap is None else per_source_cap
+        total = self.store.count()
+        fetch_k = min(k * 2, total)
+        query = np.asarray(embedding, dtype=np.float32)
+        while fetch_k > 0:
+            results = self.store.query(embedding, fetch_k)
+            ids, documents, distances = results["ids"], results["documents"], results["distances"]
+            metadatas = [m or {} for m in results["metadatas"]]
+            sources = np.array([m.get("source", "unknown") for m in metadatas])
+            picks = self._mmr(query, np.asarray(results["embeddings"], dtype=np.float32), sources, k, lambda_mult, per_source_cap)
+            if len(picks) >= k or fetch_k >= min(total, k * 16):
+                break
+            fetch_k = min(fetch_k * 2, total, k * 16)
+        else:
+            return []
+        return [
+            {
+                "id": ids[i],
+                "content": documents[i],
+                "score": float(distances[i]),
+                "metadata": metadatas[i],
+                "source": self._source_name(str(sources[i]))
+            }
+            for i in picks
+        ]
+
+    def retrieve_context(self, query: str, k: int = 8, lambda_mult: Optional[float] = None, per_source_cap: Optional[int] = None, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        mode = mode or self.retrieval_mode
+        index = self.lexical_index() if mode != "vector" else None
+        embedding = None if mode == "lexical" else self._embed_queries([query])[0] # The lexical path embeds only if BM25 finds nothing
+        return self._retrieve(query, embedding, k, lambda_mult, per_source_cap, index, mode)
+
+    def retrieve_many(self, queries: List[str], k: int = 8, mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """Retrieve context for several queries with a single embedding request."""
+        mode = mode or self.retrieval_mode
+        index = self.lexical_index() if mode != "vector" else None
+        embeddings = [None] * len(queries) if mode == "lexical" else self._embed_queries(queries)
+        return [self._retrieve(query, embedding, k, None, None, index, mode) for query, embedding in zip(queries, embeddings)]
+
+    async def aretrieve_context(self, query: str, k: int = 8, lambda_mult: Optional[float] = None, per_source_cap: Optional[int] = None, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        key = (self._normalize_query(query), k, lambda_mult, per_source_cap, mode or self.retrieval_mode)
+        results = await self._flights.do(key, lambda: asyncio.to_thread(self.retrieve_context, query, k, lambda_mult, per_source_cap, mode))
+        return [dict(r) for r in results]
+
+    async def aretrieve_many(self, queries: List[str], k: int = 8, mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self.retrieve_many, queries, k, mode)
@@ -0,0 +1,106 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+LLM_LATENCY = Histogram("scout_llm_request_seconds", "Provider call latency (streams: until the last delta)", ["role", "model", "provider", "kind"], buckets=LATENCY_BUCKETS)
+LLM_TTFT = Histogram("scout_llm_time_to_first_token_seconds", "Time to first streamed delta", ["role", "model", "provider"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter("scout_llm_tokens_total", "Tokens sent and received, counted with tiktoken", ["role", "model", "provider", "direction"])
+LLM_ERRORS = Counter("scout_llm_errors_total", "Provider calls that failed after retries", ["role", "model", "provider", "error"])
+LLM_RETRIES = Counter("scout_llm_retries_total", "Scheduler retries of provider calls", ["provider", "reason"])
+LLM_JSON_RETRIES = Counter("scout_llm_json_retries_total", "generate_json re-asks after an unparseable response", ["role"])
+LLM_CACHE = Counter("scout_llm_cache_total", "Response cache lookups", ["role", "result"])
+NODE_SECONDS = Histogram("scout_graph_node_seconds", "Wall time per graph node run", ["node"], buckets=LATENCY_BUCKETS)
+NODE_ERRORS = Counter("scout_graph_node_errors_total", "Graph node runs that raised", ["node"])
+COALESCED = Counter("scout_coalesced_total", "Calls that joined an identical in-flight call instead of starting one", ["name"])
+INGEST_STAGE = Histogram("scout_ingest_stage_seconds", "Vault ingest stage timings", ["stage"], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300))
+
+
+def render() -> tuple:
+    """(body, content_type) for a Prometheus scrape."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class Trace:
+    """Spans recorded for one session: name, offset from the trace start, duration and attributes."""
+
+    def __init__(self, max_spans: int = 5000):
+        self.started = time.perf_counter()
+        self.max_spans = max_spans
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, started: float, duration: float, attrs: Dict[str, Any]):
+        if len(self.spans) < self.max_spans:
+            self.spans.append({"name": name, "start": round(started - self.started, 4), "duration": round(duration, 4), **attrs})
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("scout_trace", default=None)
+
+
+@contextmanager
+def tracing(trace: Optional[Trace]):
+    """Record span() calls made inside this block (and tasks it spawns) into `trace`."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def _is_interrupt(exc: BaseException) -> bool:
+    # langgraph's GraphBubbleUp (interrupts, Command routing); matched by name to keep langgraph out of this import
+    return any(cls.__name__ == "GraphBubbleUp" for cls in type(exc).__mro__)
+
+
+@contextmanager
+def span(name: str, **attrs: Any):
+    """Time a block into the current trace; a no-op when no trace is active."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if _is_interrupt(e):
+            attrs["interrupted"] = True # A human step pausing the graph, not a failure
+        else:
+            attrs["error"] = type(e).__name__
+        raise
+    finally:
+        trace.add(name, started, time.perf_counter() - started, attrs)
+
+
+def timed_node(name: str, fn: Callable) -> Callable:
+    """Wrap a graph node so each run is observed in NODE_SECONDS and traced as a span."""
+    def observe(started: float):
+        NODE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_node(state):
+            started = time.perf_counter()
+            with span(f"node:{name}"):
+                try:
+                    result = await fn(state)
+                except Exception:
+                    NODE_ERRORS.labels(name).inc()
+                    raise
+            observe(started)
+            return result
+        return async_node
+
+    @functools.wraps(fn)
+    def node(state):
+        started = time.perf_counter()
+        with span(f"node:{name}"):
+            result = fn(state) # Human nodes raise GraphInterrupt while waiting; those pauses aren't timed
+        observe(started)
+        return result
+    return node
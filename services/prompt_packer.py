@@ -0,0 +1,97 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+from services.tokens import count_tokens, truncate_tokens
+
+
+def compact(value: Any) -> str:
+    """Minimal JSON: no whitespace, non-ASCII kept as-is."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def pick(item: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """Keep only `fields` that are present and non-empty."""
+    return {f: item[f] for f in fields if item.get(f) not in (None, "", [], {})}
+
+
+@dataclass
+class Section:
+    """
+    A list of context items for one placeholder, most relevant first.
+    Optional items are added while they fit the budget; with `keep_all`, every
+    item is included and each is shortened evenly instead.
+    """
+    items: Sequence[Any]
+    render: Callable[[Any], str] = compact
+    keep_all: bool = False
+    max_item_tokens: Optional[int] = None
+
+
+class PromptPacker:
+    """
+    Fills a prompt template up to a role's input token budget, counted with the
+    tokenizer of the role's model. Fixed placeholders always go in; Section
+    placeholders share whatever budget is left.
+    """
+
+    def __init__(self, model_name: str, input_budget: Optional[int] = None):
+        self.model_name = model_name
+        self.input_budget = input_budget
+
+    def tokens(self, text: str) -> int:
+        return count_tokens(text, self.model_name)
+
+    def _render(self, section: Section, item: Any) -> str:
+        text = section.render(item)
+        if section.max_item_tokens:
+            text = truncate_tokens(text, self.model_name, section.max_item_tokens)
+        return text
+
+    def _shrink(self, section: Section, item: Any, text: str, cost: int, limit: int) -> str:
+        """Fit one rendered item into `limit` tokens, cutting a dict's longest text field so it stays valid JSON."""
+        if cost <= limit:
+            return text
+        if isinstance(item, dict):
+            longest = max((k for k, v in item.items() if isinstance(v, str)), key=lambda k: len(item[k]), default=None)
+            if longest is not None:
+                keep = self.tokens(item[longest]) - (cost - limit)
+                return self._render(section, dict(item, **{longest: truncate_tokens(item[longest], self.model_name, keep)}))
+        return truncate_tokens(text, self.model_name, limit)
+
+    def pack(self, template: str, **values: Union[str, Section]) -> str:
+        sections = {name: v for name, v in values.items() if isinstance(v, Section)}
+        fixed = {name: v for name, v in values.items() if not isinstance(v, Section)}
+        base = template.format(**fixed, **{name: "" for name in sections})
+        remaining = None if self.input_budget is None else self.input_budget - self.tokens(base)
+        lines: Dict[str, List[str]] = {name: [] for name in sections}
+
+        for name, section in sections.items():
+            if not section.keep_all:
+                continue
+            rendered = [self._render(section, item) for item in section.items]
+            costs = [self.tokens(text) + 1 for text in rendered]
+            if remaining is not None and sum(costs) > remaining and rendered:
+                share = max(16, remaining // len(rendered))
+                rendered = [self._shrink(section, item, text, cost, share) for item, text, cost in zip(section.items, rendered, costs)]
+                costs = [self.tokens(text) + 1 for text in rendered]
+            lines[name] = rendered
+            if remaining is not None:
+                remaining -= sum(costs)
+
+        # Optional sections take turns, one item each, so no section starves the others.
+        queues = {name: list(section.items) for name, section in sections.items() if not section.keep_all}
+        while queues:
+            for name in list(queues):
+                if not queues[name]:
+                    del queues[name]
+                    continue
+                text = self._render(sections[name], queues[name].pop(0))
+                cost = self.tokens(text) + 1
+                if remaining is not None and cost > remaining:
+                    del queues[name] # Items are in relevance order: stop this section at the first miss
+                    continue
+                lines[name].append(text)
+                if remaining is not None:
+                    remaining -= cost
+
+        return template.format(**fixed, **{name: "\n".join(section_lines) for name, section_lines in lines.items()})
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from services.metrics import COALESCED
+
+
+class _Call:
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class _Stream:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for `key` is in flight, later
+    callers with the same key await the same task instead of starting their own.
+    The shared work is cancelled only when every caller waiting on it has gone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name # Label for the scout_coalesced_total metric
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _Stream] = {}
+
+    @staticmethod
+    def _forget(flights: Dict[Hashable, Any], key: Hashable, flight: Any):
+        if flights.get(key) is flight:
+            del flights[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of `fn()`, shared with every concurrent caller using the same key."""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        else:
+            COALESCED.labels(self.name).inc()
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                self._forget(self._calls, key, call) # Late arrivals start afresh rather than join a cancelled call
+                call.task.cancel()
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Items of `factory()`, shared like do(): joiners first get the items already
+        produced, then follow the live stream, so every caller sees the full sequence.
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = self._streams[key] = _Stream()
+            flight.task = asyncio.ensure_future(self._pump(key, flight, factory()))
+        else:
+            COALESCED.labels(self.name).inc()
+        flight.waiters += 1
+        try:
+            seen = 0
+            while True:
+                wakeup, done = flight._wakeup, flight.done
+                while seen < len(flight.items):
+                    seen += 1
+                    yield flight.items[seen - 1]
+                if done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await wakeup.wait()
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.done:
+                self._forget(self._streams, key, flight)
+                flight.task.cancel()
+
+    async def _pump(self, key: Hashable, flight: _Stream, items: AsyncIterator[Any]):
+        try:
+            async for item in items:
+                flight.items.append(item)
+                flight.notify()
+        except asyncio.CancelledError as e:
+            flight.error = e
+            raise
+        except Exception as e: # Re-raised in every waiter
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(self._streams, key, flight)
+            flight.notify()
+
+
+class TTLCache:
+    """Small in-memory LRU whose entries expire `ttl_seconds` after they were set."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if time.monotonic() > expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,43 @@
+from typing import Dict, Optional
+
+_FALLBACK_ENCODING = "o200k_base"
+_encodings: Dict[str, Optional[object]] = {}
+
+
+def _encoding_for(model_name: str):
+    import tiktoken
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model_name)
+    except KeyError:
+        encoding_name = _FALLBACK_ENCODING # Gemini and unknown models: close enough for budgeting
+    if encoding_name not in _encodings:
+        try:
+            _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            print(f"[tokens] tiktoken encoding '{encoding_name}' unavailable, estimating from length: {e}")
+            _encodings[encoding_name] = None
+    return _encodings[encoding_name]
+
+
+def count_tokens(text: str, model_name: str) -> int:
+    """
+    Count tokens for `text` as seen by `model_name`.
+    Falls back to a ~4 chars/token estimate when no tiktoken encoding can be loaded.
+    """
+    if not text:
+        return 0
+    encoding = _encoding_for(model_name)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, model_name: str, limit: int) -> str:
+    """Cut `text` to at most `limit` tokens for `model_name`, marking the cut with an ellipsis."""
+    if limit <= 0:
+        return ""
+    encoding = _encoding_for(model_name)
+    if encoding is None:
+        return text if len(text) <= limit * 4 else text[:max(0, limit * 4 - 4)] + "…"
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= limit else encoding.decode(tokens[:limit - 1]) + "…"
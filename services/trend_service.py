@@ -1,4 +1,7 @@
-from typing import List, Dict, Any
+import hashlib
+from typing import AsyncIterator, List, Dict, Any
+from services.prompt_packer import Section, compact, pick
+from services.singleflight import SingleFlight, TTLCache
 
 
 class TrendService:
@@ -6,10 +9,16 @@ class TrendService:
     WIP Trend ingestion layer that simulates real-world research.
     """
 
-    def __init__(self, llm_service):
+    def __init__(self, llm_service, analysis_ttl: float = 300.0):
         self.llm = llm_service
+        # Identical concurrent requests share one fetch/analysis; finished analyses are reused for `analysis_ttl` seconds
+        self._flights = SingleFlight("trends")
+        self._analyses = TTLCache(analysis_ttl)
 
     async def fetch_raw_trends(self, theme: str = None) -> List[Dict[str, Any]]:
+        return list(await self._flights.do(("fetch", theme or ""), lambda: self._fetch_raw_trends(theme)))
+
+    async def _fetch_raw_trends(self, theme: str = None) -> List[Dict[str, Any]]:
         """
         Simulates fetching trending topics.
         """
@@ -22,22 +31,40 @@ class TrendService:
         ]
         return topics
 
-    async def analyze_trends(self, creator_identity_summary: str, trend_data: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        raw = trend_data or await self.fetch_raw_trends()
+    async def analyze_trends(self, creator_identity_summary: str, trend_data: List[Dict[str, Any]] = None, theme: str = None) -> List[Dict[str, Any]]:
+        return [trend async for trend in self.stream_trends(creator_identity_summary, trend_data, theme)]
+
+    async def stream_trends(self, creator_identity_summary: str, trend_data: List[Dict[str, Any]] = None, theme: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Scored trends, yielded one by one as the model finishes each. An optional `theme` focuses the scoring."""
+        raw = trend_data or await self.fetch_raw_trends(theme)
+        key = hashlib.sha256(compact([creator_identity_summary, theme or "", raw]).encode("utf-8")).hexdigest()
+        cached = self._analyses.get(key)
+        if cached is not None:
+            for trend in cached:
+                yield dict(trend)
+            return
+        async for trend in self._flights.stream(("analysis", key), lambda: self._analyze(key, creator_identity_summary, raw, theme)):
+            yield dict(trend)
+
+    async def _analyze(self, key: str, creator_identity_summary: str, raw: List[Dict[str, Any]], theme: str = None) -> AsyncIterator[Dict[str, Any]]:
         system_prompt = """
         You are a trend analyst.
         Score trends for:
-        - Alignment with creator identity
+        - Alignment with creator identity (and with the theme focus, when one is given)
         - Novelty potential
         - Saturation risk
-        Return structured JSON list of objects with 'topic', 'score', and 'rationale'.
-        """
-        user_prompt = f"""
-        Creator identity:
-        {creator_identity_summary}
-
-        Trends:
-        {raw}
+        Return a JSON object with a 'trends' list of objects with 'topic', 'score', and 'rationale'.
         """
-        analysis = await self.llm.generate_json(role="utility", system_prompt=system_prompt, user_prompt=user_prompt)
-        return analysis
\ No newline at end of file
+        ordered = sorted(raw, key=lambda t: t.get("relevance", t.get("score", 0)) or 0, reverse=True)
+        user_prompt = self.llm.packer("utility").pack(
+            "Creator identity:\n{identity}\n\n" + ("Theme focus: {theme}\n\n" if theme else "") + "Trends (JSON lines):\n{trends}\n",
+            identity=creator_identity_summary,
+            theme=theme or "",
+            trends=Section([pick(t, ("topic", "relevance", "source", "summary")) for t in ordered]),
+        )
+        analysis = []
+        async for trend in self.llm.stream_json_items(role="utility", system_prompt=system_prompt, user_prompt=user_prompt, key="trends"):
+            analysis.append(trend)
+            yield trend
+        if analysis: # An empty answer (e.g. the model's JSON failed to parse) is retried by the next request
+            self._analyses.set(key, analysis)
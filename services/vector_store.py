@@ -0,0 +1,357 @@
+import glob
+import itertools
+import json
+import mmap
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+VECTOR_BACKENDS = ("chroma", "numpy", "numpy-int8")
+
+VECTORS_FILE = "vectors.npy" # Format 1 only; later formats name each generation's files in the sidecar
+SIDECAR_FILE = "vectors.json"
+SIDECAR_VERSION = 3
+
+
+class ChromaStore:
+    """Chroma-backed store; the same count/query/upsert/delete/reset/pages/flush methods as NumpyStore."""
+
+    def __init__(self, directory: str, embeddings: Any):
+        from langchain_community.vectorstores import Chroma
+        self.directory = directory
+        self._embeddings = embeddings
+        self.vectorstore = Chroma(persist_directory=directory, embedding_function=embeddings)
+
+    @property
+    def collection(self):
+        return self.vectorstore._collection
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def query(self, embedding: Sequence[float], n: int) -> Dict[str, List[Any]]:
+        """Nearest `n` chunks: {"ids", "documents", "metadatas", "distances", "embeddings"}, closest first."""
+        results = self.collection.query(query_embeddings=[list(embedding)], n_results=n, include=["documents", "metadatas", "distances", "embeddings"])
+        return {key: results[key][0] for key in ("ids", "documents", "metadatas", "distances", "embeddings")}
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+
+    def reset(self):
+        from langchain_community.vectorstores import Chroma
+        self.vectorstore.delete_collection()
+        self.vectorstore = Chroma(persist_directory=self.directory, embedding_function=self._embeddings)
+
+    def pages(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+        """All stored chunks as (ids, documents, metadatas) pages."""
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page["ids"], page["documents"], [m or {} for m in page["metadatas"]]
+            offset += len(page["ids"])
+
+    def flush(self):
+        pass # Chroma persists on every write
+
+
+class _StoredRows:
+    """
+    Text and metadata of stored rows, one JSON line per row (`[document, metadata]`),
+    memory-mapped and decoded only when a row is read.
+    """
+
+    def __init__(self, path: Optional[str] = None, offsets: Sequence[int] = (0,)):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self._data: Any = b""
+        if path is not None and self.offsets[-1] > 0:
+            with open(path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._data) < self.offsets[-1]:
+                raise ValueError(f"{path} is shorter than its offsets")
+
+    def line(self, row: int) -> bytes:
+        return self._data[self.offsets[row]:self.offsets[row + 1]]
+
+    def get(self, row: int) -> Tuple[str, Dict[str, Any]]:
+        document, metadata = json.loads(self.line(row))
+        return document, metadata
+
+
+class _InlineRows(_StoredRows):
+    """Rows of a format-1/2 sidecar, which held every document and metadata inline."""
+
+    def __init__(self, documents: List[str], metadatas: List[Dict[str, Any]]):
+        super().__init__()
+        self._rows = list(zip(documents, metadatas))
+
+    def line(self, row: int) -> bytes:
+        return _row_line(*self._rows[row])
+
+    def get(self, row: int) -> Tuple[str, Dict[str, Any]]:
+        return self._rows[row]
+
+
+def _row_line(document: str, metadata: Dict[str, Any]) -> bytes:
+    return (json.dumps([document, metadata], ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class NumpyStore:
+    """
+    Exact-search vector store for vault-sized indexes: unit-normalized embeddings in one
+    .npy array, memory-mapped read-only (opening it reads no vectors), document text and
+    metadata in a JSON-lines file read by row offset when a row is returned, and a JSON
+    sidecar with only the ids, row offsets and (int8) scales. With dtype "int8" each row
+    is stored quantized with its own scale, a quarter of the float32 size; queries score
+    it in blocks of `QUERY_BLOCK_ROWS`, so no full-size float32 copy is made.
+
+    Writes are buffered and applied by flush(), which writes a new generation of the
+    array and documents (`vectors.<n>.npy`, `documents.<n>.jsonl`) and then atomically
+    replaces the sidecar that names them, so a reader never pairs a sidecar with another
+    generation's files; a sidecar whose row counts disagree with them is not opened.
+    Ingest flushes once at the end of a run. Queries also see unflushed writes, and a
+    reader with none of its own reopens the files when another process has flushed.
+    """
+
+    QUERY_BLOCK_ROWS = 256 # Small enough for the widened block to stay in cache
+
+    def __init__(self, directory: str, dtype: str = "float32"):
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"dtype must be 'float32' or 'int8', got {dtype!r}")
+        self.directory = directory
+        self.dtype = dtype
+        self._lock = threading.RLock()
+        self._load()
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(os.path.join(self.directory, SIDECAR_FILE))
+        except OSError:
+            return None
+
+    def _refresh(self):
+        if not self._pending and not self._deleted and self._mtime() != self._loaded_mtime:
+            self._load()
+
+    def _open(self, sidecar: Dict[str, Any]) -> Tuple[np.ndarray, _StoredRows]:
+        vectors = np.load(os.path.join(self.directory, sidecar.get("vectors", VECTORS_FILE)), mmap_mode="r")
+        if "documents" in sidecar and isinstance(sidecar["documents"], list): # Formats 1 and 2
+            return vectors, _InlineRows(sidecar["documents"], sidecar["metadatas"])
+        if len(sidecar["offsets"]) != len(sidecar["ids"]) + 1:
+            raise ValueError("offsets do not match ids")
+        return vectors, _StoredRows(os.path.join(self.directory, sidecar["documents"]), sidecar["offsets"])
+
+    def _load(self):
+        self._loaded_mtime = self._mtime()
+        self.ids: List[str] = []
+        self._stored = _StoredRows()
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._generation = 0
+        try:
+            with open(os.path.join(self.directory, SIDECAR_FILE), "r", encoding="utf-8") as f:
+                sidecar = json.load(f)
+            vectors, stored = self._open(sidecar) if sidecar.get("version") in (1, 2, SIDECAR_VERSION) else (None, None)
+        except (OSError, ValueError, TypeError, AttributeError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError) or os.path.exists(os.path.join(self.directory, SIDECAR_FILE)):
+                print(f"[vector_store] {self.directory}: not opening the store: {e}")
+            sidecar, vectors, stored = None, None, None
+        if vectors is not None and sidecar.get("dtype") == self.dtype:
+            if len(sidecar["ids"]) != len(vectors):
+                print(f"[vector_store] {self.directory}: sidecar lists {len(sidecar['ids'])} chunks but {sidecar.get('vectors', VECTORS_FILE)} has {len(vectors)} rows; not opening it")
+            else:
+                self.ids, self._stored = sidecar["ids"], stored
+                self._vectors = vectors
+                self._scales = np.asarray(sidecar["scales"], dtype=np.float32) if self.dtype == "int8" else None
+                self._generation = sidecar.get("generation", 0)
+        self._rows = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self._deleted: set = set()
+        self._pending: Dict[str, Tuple[np.ndarray, str, Dict[str, Any]]] = {}
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "float32":
+            return vectors.astype(np.float32), None
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        if self.dtype == "float32":
+            return np.asarray(self._vectors[rows], dtype=np.float32)
+        return self._vectors[rows].astype(np.float32) * self._scales[rows, None]
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._count()
+
+    def _count(self) -> int:
+        return len(self.ids) - len(self._deleted) + len(self._pending)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            for chunk_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                if chunk_id in self._rows:
+                    self._deleted.add(self._rows[chunk_id])
+                self._pending[chunk_id] = (vector, document, dict(metadata or {}))
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for chunk_id in ids:
+                self._pending.pop(chunk_id, None)
+                if chunk_id in self._rows:
+                    self._deleted.add(self._rows[chunk_id])
+
+    def reset(self):
+        with self._lock:
+            for path in [os.path.join(self.directory, SIDECAR_FILE)] + self._generation_files():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._load()
+
+    def _generation_files(self) -> List[str]:
+        return glob.glob(os.path.join(self.directory, "vectors.*npy")) + glob.glob(os.path.join(self.directory, "documents.*.jsonl"))
+
+    def query(self, embedding: Sequence[float], n: int) -> Dict[str, List[Any]]:
+        """Exact cosine top-`n` (distance = 1 - cosine similarity), closest first."""
+        with self._lock:
+            self._refresh()
+            return self._query(embedding, n)
+
+    def _query(self, embedding: Sequence[float], n: int) -> Dict[str, List[Any]]:
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        similarities = np.empty(0, dtype=np.float32)
+        if self._vectors is not None and len(self._vectors):
+            similarities = self._similarities(query)
+            if self._deleted:
+                similarities[list(self._deleted)] = -np.inf
+        pending = list(self._pending.values())
+        if pending:
+            similarities = np.concatenate([similarities, np.stack([vector for vector, _, _ in pending]) @ query])
+        n = min(n, self._count())
+        if n <= 0:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        top = np.argpartition(-similarities, n - 1)[:n]
+        top = top[np.argsort(-similarities[top])]
+        stored = len(self.ids)
+        pending_ids = list(self._pending)
+        results: Dict[str, List[Any]] = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for row in top.tolist():
+            if row < stored:
+                chunk_id = self.ids[row]
+                document, metadata = self._stored.get(row)
+                vector = self._dequantize(np.array([row]))[0]
+            else:
+                chunk_id = pending_ids[row - stored]
+                vector, document, metadata = self._pending[chunk_id]
+            results["ids"].append(chunk_id)
+            results["documents"].append(document)
+            results["metadatas"].append(metadata)
+            results["distances"].append(float(1.0 - similarities[row]))
+            results["embeddings"].append(vector)
+        return results
+
+    def _similarities(self, query: np.ndarray) -> np.ndarray:
+        if self._scales is None:
+            return self._vectors @ query # float32 rows are read from the mapping in place
+        similarities = np.empty(len(self._vectors), dtype=np.float32)
+        widened = np.empty((min(self.QUERY_BLOCK_ROWS, len(self._vectors)), self._vectors.shape[1]), dtype=np.float32)
+        for start in range(0, len(self._vectors), self.QUERY_BLOCK_ROWS): # Widen int8 rows one block at a time, into one reused buffer
+            block = self._vectors[start:start + self.QUERY_BLOCK_ROWS]
+            widened[:len(block)] = block
+            similarities[start:start + len(block)] = widened[:len(block)] @ query
+        return similarities * self._scales
+
+    def pages(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+        """All stored chunks as (ids, documents, metadatas) pages; stored rows are decoded a page at a time."""
+        with self._lock:
+            stored_rows, kept = self._stored, [i for i in range(len(self.ids)) if i not in self._deleted]
+            ids = [self.ids[i] for i in kept] + list(self._pending)
+            pending = [(document, metadata) for _, document, metadata in self._pending.values()]
+        for start in range(0, len(ids), page_size):
+            rows = [stored_rows.get(i) for i in kept[start:start + page_size]] + pending[max(0, start - len(kept)):max(0, start + page_size - len(kept))]
+            yield ids[start:start + page_size], [document for document, _ in rows], [metadata for _, metadata in rows]
+
+    def flush(self):
+        """Write buffered upserts and deletes: the array and documents are rebuilt as a new generation, then the sidecar naming them is swapped in."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending and not self._deleted:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        kept = np.array([i for i in range(len(self.ids)) if i not in self._deleted], dtype=np.int64)
+        pending = list(self._pending.items())
+        dim = self._vectors.shape[1] if self._vectors is not None and len(self._vectors) else (len(pending[0][1][0]) if pending else 0)
+        total = len(kept) + len(pending)
+        generation = self._generation + 1
+        vectors_file = f"vectors.{generation}.npy"
+        vectors_path = os.path.join(self.directory, vectors_file)
+        out = np.lib.format.open_memmap(vectors_path + ".tmp", mode="w+", dtype=np.float32 if self.dtype == "float32" else np.int8, shape=(total, dim))
+        scales = np.empty(total, dtype=np.float32)
+        step = 8192
+        for start in range(0, len(kept), step): # Copy surviving rows without loading the whole array
+            rows = kept[start:start + step]
+            out[start:start + len(rows)] = self._vectors[rows]
+            if self._scales is not None:
+                scales[start:start + len(rows)] = self._scales[rows]
+        if pending:
+            quantized, pending_scales = self._quantize(np.stack([vector for _, (vector, _, _) in pending]))
+            out[len(kept):] = quantized
+            if pending_scales is not None:
+                scales[len(kept):] = pending_scales
+        out.flush()
+        del out
+        os.replace(vectors_path + ".tmp", vectors_path)
+        documents_file = f"documents.{generation}.jsonl"
+        documents_path = os.path.join(self.directory, documents_file)
+        offsets = [0]
+        with open(documents_path + ".tmp", "wb") as f: # Surviving rows are copied as raw lines, without decoding
+            for line in itertools.chain((self._stored.line(i) for i in kept.tolist()), (_row_line(document, metadata) for _, (_, document, metadata) in pending)):
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        os.replace(documents_path + ".tmp", documents_path)
+        sidecar = {
+            "version": SIDECAR_VERSION,
+            "generation": generation,
+            "vectors": vectors_file,
+            "documents": documents_file,
+            "dtype": self.dtype,
+            "ids": [self.ids[i] for i in kept] + [chunk_id for chunk_id, _ in pending],
+            "offsets": offsets,
+            "scales": scales.tolist() if self.dtype == "int8" else None,
+        }
+        sidecar_path = os.path.join(self.directory, SIDECAR_FILE)
+        with open(sidecar_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False)
+        os.replace(sidecar_path + ".tmp", sidecar_path) # The commit point: readers now open the new generation
+        self._vectors, self._stored = None, _StoredRows() # Release the old mappings before removing their files
+        for path in self._generation_files():
+            if path not in (vectors_path, documents_path):
+                try:
+                    os.remove(path) # Readers still mapping it keep their view until they reload
+                except OSError:
+                    pass
+        self._load()
+
+
+def open_vector_store(directory: str, backend: str = "chroma", embeddings: Any = None):
+    """The vector store for `backend`: "chroma", "numpy" (float32) or "numpy-int8"."""
+    if backend == "chroma":
+        return ChromaStore(directory, embeddings)
+    if backend in ("numpy", "numpy-int8"):
+        return NumpyStore(directory, dtype="int8" if backend == "numpy-int8" else "float32")
+    raise ValueError(f"vector backend must be one of {VECTOR_BACKENDS}, got {backend!r}")
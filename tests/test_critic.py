@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from graph.nodes.critic import MAX_ITERATIONS, critic_node, critic_router
+
+
+class _Packer:
+    def pack(self, template, scripts):
+        return json.dumps(list(scripts.items))
+
+
+class _Critic:
+    """Answers with `scores` for the styles it is shown; styles missing from `scores` are left out."""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.shown = []
+
+    def packer(self, role):
+        return _Packer()
+
+    async def generate_json_list(self, role, system_prompt, user_prompt, key):
+        styles = [v["style"] for v in json.loads(user_prompt)]
+        self.shown.append(styles)
+        return [{"style": style, "score": self.scores[style], "critique_points": [f"{style} note"]} for style in styles if style in self.scores]
+
+
+def _state(**values):
+    return dict({"script_variants": [], "scored_variants": [], "critique_log": [], "iteration_count": 0}, **values)
+
+
+def test_only_new_and_rewritten_drafts_are_scored():
+    critic = _Critic({"meme": 8, "dramatic": 6})
+    state = _state(
+        script_variants=[{"style": "meme", "content": "meme v2"}, {"style": "documentary", "content": "doc v1"}, {"style": "dramatic", "content": "drama v1"}],
+        scored_variants=[{"style": "meme", "score": 4, "content": "meme v1"}, {"style": "documentary", "score": 9, "content": "doc v1"}],
+        iteration_count=1,
+    )
+    update = asyncio.run(critic_node(critic)(state))
+    assert critic.shown == [["meme", "dramatic"]]
+    assert [(v["style"], v["score"], v["content"]) for v in update["scored_variants"]] == [
+        ("documentary", 9, "doc v1"), ("meme", 8, "meme v2"), ("dramatic", 6, "drama v1"),
+    ]
+    assert update["iteration_count"] == 2
+    assert critic_router(dict(state, **update)) == ["script_dramatic"]
+
+
+def test_rewritten_draft_the_critic_left_out_fails_instead_of_keeping_its_old_score():
+    critic = _Critic({}) # Scores nothing
+    state = _state(
+        script_variants=[{"style": "meme", "content": "meme v2"}, {"style": "documentary", "content": "doc v1"}],
+        scored_variants=[{"style": "meme", "score": 9, "content": "meme v1"}, {"style": "documentary", "score": 8, "content": "doc v1"}],
+        iteration_count=1,
+    )
+    update = asyncio.run(critic_node(critic)(state))
+    meme = next(v for v in update["scored_variants"] if v["style"] == "meme")
+    assert (meme["score"], meme["content"]) == (None, "meme v2")
+    assert critic_router(dict(state, **update)) == ["script_meme"]
+
+
+def test_router_approves_when_everything_passes_or_iterations_run_out():
+    passing = [{"style": "meme", "score": 8}, {"style": "dramatic", "score": "7"}]
+    failing = passing + [{"style": "documentary", "score": 3}, {"style": "cinematic", "score": "n/a"}]
+    assert critic_router(_state(scored_variants=passing, iteration_count=1)) == "approve"
+    assert critic_router(_state(scored_variants=failing, iteration_count=1)) == ["script_documentary", "script_cinematic"]
+    assert critic_router(_state(scored_variants=failing, iteration_count=MAX_ITERATIONS)) == "approve"
+    assert critic_router(_state()) == "approve"
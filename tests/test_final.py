@@ -0,0 +1,16 @@
+import asyncio
+from graph.nodes.final import final_package_node
+
+
+class _NoCalls:
+    def packer(self, role):
+        raise AssertionError("no prompt should be built")
+
+    async def generate_json(self, **kwargs):
+        raise AssertionError("no provider call should be made")
+
+
+def test_final_package_skipped_without_selected_script():
+    node = final_package_node(_NoCalls())
+    state = {"selected_script": None, "approval_stage": "script_rejected"}
+    assert asyncio.run(node(state)) == {}
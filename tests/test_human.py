@@ -0,0 +1,26 @@
+import asyncio
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from graph.build_graph import build_graph
+from graph.nodes.human import idea_router
+from main import build_initial_state
+
+
+def test_router_fans_out_only_with_a_selected_idea():
+    route = idea_router(["script_a", "script_b"])
+    assert route({"selected_idea": {"title": "t"}}) == ["script_a", "script_b"]
+    assert route({"selected_idea": None}) == "end"
+
+
+def test_run_ends_when_ranking_left_no_ideas():
+    async def scenario():
+        graph = build_graph(None, None, None, checkpointer=InMemorySaver()) # No LLM: any script node would fail
+        config = {"configurable": {"thread_id": "empty"}}
+        await graph.aupdate_state(config, dict(build_initial_state("theme", [], []), ranked_ideas=[]), as_node="idea_rank")
+        ran = [node async for update in graph.astream(None, config, stream_mode="updates") for node in update]
+        return ran, await graph.aget_state(config)
+
+    ran, snapshot = asyncio.run(scenario())
+    assert ran == ["human_idea"]
+    assert snapshot.next == () and snapshot.values["approval_stage"] == "no_ideas"
@@ -0,0 +1,19 @@
+import numpy as np
+
+from graph.nodes.idea import cluster_ideas
+
+
+def test_cluster_ideas_groups_near_duplicates_in_pool_order():
+    vectors = np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.99, 0.05, 0.0], # Near-duplicate of 0
+        [0.0, 0.0, 1.0],
+        [0.0, 2.0, 0.01], # Same direction as 1, different length
+    ])
+    assert cluster_ideas(vectors, threshold=0.95) == [[0, 2], [1, 4], [3]]
+
+
+def test_cluster_ideas_threshold_one_keeps_distinct_ideas_apart():
+    vectors = np.array([[1.0, 0.0], [0.9, 0.1], [1.0, 0.0]])
+    assert cluster_ideas(vectors, threshold=0.9999) == [[0, 2], [1]]
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import os
+
+from api import server
+from services.identity_service import MANIFEST_FILE, PROFILE_FILE, IdentityService
+from services.prompt_packer import PromptPacker
+
+
+class _Memory:
+    def __init__(self):
+        self.queries = 0
+
+    async def aretrieve_context(self, query, k):
+        self.queries += 1
+        return [{"id": "a.md::0", "content": "retro synth videos"}]
+
+
+class _LLM:
+    def packer(self, role):
+        return PromptPacker("fake-flash")
+
+    async def generate_text(self, role, system_prompt, user_prompt):
+        return "Makes retro synth videos."
+
+
+def _manifest(directory, sha="1"):
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": {"a.md": {"sha256": sha}}}, f)
+
+
+def test_profile_is_saved_once_and_reused_from_disk(tmp_path):
+    _manifest(tmp_path)
+    memory = _Memory()
+    profile = asyncio.run(IdentityService(memory, _LLM(), str(tmp_path)).profile())
+    assert profile["summary"] == "Makes retro synth videos." and os.path.exists(tmp_path / PROFILE_FILE)
+
+    fresh = IdentityService(memory, _LLM(), str(tmp_path)) # e.g. after a restart
+    assert asyncio.run(fresh.profile())["vault_version"] == profile["vault_version"]
+    assert memory.queries == 1
+
+    _manifest(tmp_path, sha="22") # Ingest changed the vault
+    assert asyncio.run(fresh.profile())["vault_version"] != profile["vault_version"]
+    assert memory.queries == 2
+
+
+def test_new_session_scores_trends_for_its_theme(monkeypatch):
+    seen = []
+
+    class _Identity:
+        async def summary(self):
+            return "identity"
+
+    class _Trends:
+        async def stream_trends(self, identity, trend_data=None, theme=None):
+            seen.append((identity, theme))
+            yield {"topic": "synthwave", "score": 8}
+
+    monkeypatch.setattr(server, "_identity_service", _Identity())
+    monkeypatch.setattr(server, "_trend_service", _Trends())
+    state = asyncio.run(server._prepare_session(server.SessionRequest(theme="retro tech")))
+    assert seen == [("identity", "retro tech")]
+    assert state["trend_signals"] == [{"topic": "synthwave", "score": 8}] and state["identity_summary"] == "identity"
@@ -0,0 +1,36 @@
+from services.json_stream import JSONArrayStream
+
+
+def _feed_chars(stream, text):
+    items = []
+    for ch in text:
+        items.extend(stream.feed(ch))
+    return items
+
+
+def test_items_are_yielded_as_each_object_closes():
+    stream = JSONArrayStream(key="ideas")
+    assert stream.feed('{"ideas": [{"title": "a"}, {"ti') == [{"title": "a"}]
+    assert stream.feed('tle": "b"}') == [{"title": "b"}]
+    assert stream.feed("]}") == []
+    assert stream.finished
+
+
+def test_strings_with_brackets_and_escapes_do_not_confuse_the_parser():
+    text = '{"ideas": [{"title": "a } ] \\" {", "tags": ["x", {"n": 1}]}, {"title": "b"}]}'
+    assert _feed_chars(JSONArrayStream(key="ideas"), text) == [
+        {"title": 'a } ] " {', "tags": ["x", {"n": 1}]},
+        {"title": "b"},
+    ]
+
+
+def test_only_the_keyed_list_is_read():
+    text = '{"notes": [{"skip": 1}], "trends": [{"topic": "t"}], "more": [{"skip": 2}]}'
+    assert _feed_chars(JSONArrayStream(key="trends"), text) == [{"topic": "t"}]
+
+
+def test_top_level_list_and_non_object_items():
+    stream = JSONArrayStream()
+    assert stream.feed('[1, "two", {"three": 3}, [4]]') == [{"three": 3}]
+    assert stream.finished
+    assert stream.text == '[1, "two", {"three": 3}, [4]]'
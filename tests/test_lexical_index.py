@@ -0,0 +1,66 @@
+import json
+import time
+
+import services.lexical_index as lexical_index
+from services.fake_provider import FakeEmbeddings
+from services.lexical_index import LEGACY_INDEX_FILE, LexicalIndex
+from services.memory_service import MemoryService
+
+
+def _index():
+    index = LexicalIndex()
+    index.add(
+        ["a::0", "b::0", "c::0", "d::0"],
+        ["the retro camera restoration", "the minimalist desk setup", "the retro synth teardown with the retro camera", "the end"],
+        [{"source": "vault/Cameras.md"}, {"source": "vault/Desk.md"}, {"source": "vault/Synths.md"}, {}],
+    )
+    return index
+
+
+def test_saved_index_loads_without_tokenizing(tmp_path, monkeypatch):
+    _index().save(str(tmp_path))
+    monkeypatch.setattr(lexical_index, "tokenize", lambda text: (_ for _ in ()).throw(AssertionError("re-tokenized")))
+    loaded = LexicalIndex.load(str(tmp_path))
+    monkeypatch.undo()
+    assert len(loaded) == 4 and not loaded.dirty
+    assert loaded.search("retro camera", 3) == _index().search("retro camera", 3)
+    assert [chunk_id for chunk_id, _ in loaded.search("retro camera", 3)] == ["a::0", "c::0"] # The shorter chunk wins on length normalization
+
+
+def test_common_terms_are_skipped_when_the_query_has_rarer_ones():
+    index = _index()
+    assert [chunk_id for chunk_id, _ in index.search("the desk", 4)] == ["b::0"]
+    assert len(index.search("the", 4)) == 4 # A query of common terms only still matches
+
+
+def test_title_matches_and_edits_after_load(tmp_path):
+    _index().save(str(tmp_path))
+    loaded = LexicalIndex.load(str(tmp_path))
+    assert [chunk_id for chunk_id, _ in loaded.search("synths", 2)] == ["c::0"]
+    loaded.remove(["c::0"])
+    loaded.add(["e::0"], ["modular synth patch notes"], [{}])
+    assert loaded.dirty
+    assert [chunk_id for chunk_id, _ in loaded.search("synth retro", 4)] == ["e::0", "a::0"]
+
+
+def test_legacy_json_index_loads_and_is_marked_for_rewrite(tmp_path):
+    (tmp_path / LEGACY_INDEX_FILE).write_text(json.dumps({"version": 1, "chunks": {"a::0": ["retro camera", {}]}}))
+    loaded = LexicalIndex.load(str(tmp_path))
+    assert loaded.search("camera", 1)[0][0] == "a::0" and loaded.dirty
+    loaded.save(str(tmp_path))
+    assert not (tmp_path / LEGACY_INDEX_FILE).exists()
+
+
+def test_memory_service_swaps_in_a_rewritten_index_in_the_background(tmp_path):
+    _index().save(str(tmp_path))
+    memory = MemoryService(str(tmp_path), embedding_api_key="", embeddings=FakeEmbeddings(dimensions=8), vector_backend="numpy", retrieval_mode="lexical")
+    first = memory.lexical_index()
+    assert len(first) == 4
+    updated = _index()
+    updated.add(["e::0"], ["fresh note"], [{}])
+    updated.save(str(tmp_path))
+    assert memory.lexical_index() is first # The query path does not wait for the reload
+    deadline = time.monotonic() + 5
+    while memory.lexical_index() is first and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(memory.lexical_index()) == 5
@@ -0,0 +1,29 @@
+import asyncio
+import sqlite3
+
+from services.llm_cache import LLMCache
+
+
+def test_disk_hit_defers_access_time_until_close(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = LLMCache(path=path)
+    asyncio.run(cache.aset("k", "value", latency=1.5))
+    cache.close()
+
+    cache = LLMCache(path=path)
+    before = sqlite3.connect(path).execute("SELECT accessed_at FROM responses WHERE key = 'k'").fetchone()[0]
+    assert asyncio.run(cache.aget("k")) == "value"
+    assert asyncio.run(cache.aget("k")) == "value" # Second read is served from memory
+    assert cache.stats()["hits"] == 2 and cache.stats()["memory_hits"] == 1
+    assert sqlite3.connect(path).execute("SELECT accessed_at FROM responses WHERE key = 'k'").fetchone()[0] == before
+    cache.close()
+    assert sqlite3.connect(path).execute("SELECT accessed_at FROM responses WHERE key = 'k'").fetchone()[0] > before
+
+
+def test_delete_drops_pending_access_time(tmp_path):
+    cache = LLMCache(path=str(tmp_path / "cache.sqlite"), memory_entries=0)
+    asyncio.run(cache.aset("k", "value"))
+    assert asyncio.run(cache.aget("k")) == "value"
+    asyncio.run(cache.adelete("k"))
+    assert asyncio.run(cache.aget("k")) is None
+    cache.close()
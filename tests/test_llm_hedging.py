@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+import services.llm_hedging as hedging
+from services.llm import LLMService, ModelConfig
+from services.llm_hedging import CircuitBreaker, CircuitOpenError, hedged_call
+
+
+def _answer(value, seconds=0.0, error=None):
+    async def call():
+        await asyncio.sleep(seconds)
+        if error is not None:
+            raise error
+        return value
+    return call
+
+
+def test_fast_primary_does_not_fire_the_hedge():
+    started = []
+
+    async def backup():
+        started.append(1)
+        return "backup"
+
+    assert asyncio.run(hedged_call(_answer("primary"), backup, delay=1.0)) == ("primary", "primary", False)
+    assert not started
+
+
+def test_slow_primary_loses_to_the_backup_and_is_cancelled():
+    async def scenario():
+        cancelled = asyncio.Event()
+
+        async def primary():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        result = await hedged_call(primary, _answer("backup", 0.01), delay=0.02)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return result
+
+    assert asyncio.run(scenario()) == ("backup", "backup", True)
+
+
+def test_failed_primary_starts_the_backup_without_waiting_for_the_delay():
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        result = await hedged_call(_answer(None, error=ConnectionError("down")), _answer("backup"), delay=5.0)
+        return result, asyncio.get_running_loop().time() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == ("backup", "backup", True) and elapsed < 1.0
+
+
+def test_hedged_call_raises_when_both_fail():
+    with pytest.raises(ConnectionError, match="primary down"): # The last failure
+        asyncio.run(hedged_call(_answer(None, 0.02, ConnectionError("primary down")), _answer(None, 0.0, ConnectionError("backup down")), delay=0.01))
+
+
+def test_breaker_opens_goes_half_open_and_closes(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(hedging.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("fake", failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    now[0] = 30.0
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow() # One trial at a time
+    breaker.record_failure() # Trial failed: open for another reset period
+    assert breaker.state == "open"
+    now[0] = 60.0
+    assert breaker.allow()
+    breaker.release_trial() # Cancelled trial: the next caller may try
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def _llm(hedge=None, failure_rate=0.0, reset_seconds=30.0):
+    cfg = ModelConfig(name="fake-slow", temperature=0.0, max_tokens=50, cache=False, hedge=ModelConfig(name=hedge, temperature=0.0, max_tokens=50) if hedge else None, hedge_delay=0.05)
+    settings = {
+        "response_cache": {"enabled": False},
+        "rate_limits": {"max_retries": 0},
+        "circuit_breaker": {"failure_threshold": 2, "reset_seconds": reset_seconds},
+        "fake_provider": {"default": {"latency_ms": 5, "sigma": 0, "output_tokens": 5}, "models": {
+            "fake-slow": {"latency_ms": 500, "sigma": 0, "output_tokens": 5, "failure_rate": failure_rate},
+        }},
+    }
+    return LLMService(api_key="offline", model_map={"utility": cfg}, settings=settings)
+
+
+def test_fake_provider_backup_answers_when_the_primary_is_slow():
+    llm = _llm(hedge="fake-fast")
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        text = await llm.generate_text("utility", "system", "user")
+        return text, asyncio.get_running_loop().time() - started
+
+    text, elapsed = asyncio.run(scenario())
+    assert text and elapsed < 0.4
+    assert llm.hedge_stats()["roles"]["utility"] == {"calls": 1, "fired": 1, "won": 1}
+
+
+def test_fake_provider_failures_open_the_circuit_until_a_trial_succeeds():
+    llm = _llm(failure_rate=1.0, reset_seconds=0.2)
+    profile = llm.fake.profile("fake-slow")
+    profile.latency_ms = 5
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await llm.generate_text("utility", "system", "user")
+        assert llm.hedge_stats()["circuits"]["fake"] == "open"
+        with pytest.raises(CircuitOpenError): # Fails fast, without calling the provider
+            await llm.generate_text("utility", "system", "user")
+        await asyncio.sleep(0.25)
+        profile.failure_rate = 0.0
+        assert llm.hedge_stats()["circuits"]["fake"] == "half_open"
+        return await llm.generate_text("utility", "system", "user")
+
+    assert asyncio.run(scenario())
+    assert llm.hedge_stats()["circuits"]["fake"] == "closed"
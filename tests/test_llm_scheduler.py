@@ -0,0 +1,121 @@
+import asyncio
+import types
+
+import services.llm_scheduler as scheduler
+from batch import AutoResolver, BatchRunner
+from services.llm_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PrioritySemaphore, RequestScheduler, TokenBucket, _retry_after
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, headers=None, message="rate limited"):
+        super().__init__(message)
+        self.response = types.SimpleNamespace(headers=headers or {})
+
+
+def test_waiters_are_woken_by_priority_then_arrival():
+    async def scenario():
+        semaphore, order = PrioritySemaphore(1), []
+        await semaphore.acquire(PRIORITY_INTERACTIVE)
+
+        async def waiter(name, priority):
+            await semaphore.acquire(priority)
+            order.append(name)
+            semaphore.release()
+
+        tasks = []
+        for name, priority in [("batch-1", PRIORITY_BATCH), ("chat-1", PRIORITY_INTERACTIVE), ("batch-2", PRIORITY_BATCH), ("chat-2", PRIORITY_INTERACTIVE)]:
+            tasks.append(asyncio.create_task(waiter(name, priority)))
+            await asyncio.sleep(0)
+        assert semaphore.waiting == 4
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        return order, semaphore.in_flight
+
+    assert asyncio.run(scenario()) == (["chat-1", "chat-2", "batch-1", "batch-2"], 0)
+
+
+def test_cancelled_waiter_passes_its_slot_on():
+    async def scenario():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(PRIORITY_INTERACTIVE)
+        first = asyncio.create_task(semaphore.acquire(PRIORITY_INTERACTIVE))
+        second = asyncio.create_task(semaphore.acquire(PRIORITY_BATCH))
+        await asyncio.sleep(0)
+        first.cancel()
+        semaphore.release()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, 1)
+        return semaphore.in_flight
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_token_bucket_refills_continuously(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(scheduler.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(60) # One unit per second
+    assert bucket.wait_time(60) == 0.0
+    bucket.consume(60)
+    assert bucket.wait_time(1) == 1.0
+    now[0] += 0.5
+    assert bucket.wait_time(1) == 0.5
+    assert bucket.wait_time(600) == 59.5 # Larger than capacity: waits for a full bucket, not forever
+    now[0] += 100
+    assert bucket.tokens <= 60 and bucket.wait_time(60) == 0.0
+
+
+def test_retry_after_hints():
+    assert _retry_after(_RateLimited({"retry-after-ms": "1500", "retry-after": "9"})) == 1.5
+    assert _retry_after(_RateLimited({"retry-after": "3"})) == 3.0
+    assert _retry_after(_RateLimited(message="429 RESOURCE_EXHAUSTED {'retryDelay': '7s'}")) == 7.0
+    assert _retry_after(_RateLimited({"retry-after": "soon"})) is None
+    assert _retry_after(ValueError("no hint")) is None
+
+
+def test_rate_limited_call_retries_after_the_hint_and_holds_the_provider(monkeypatch):
+    monkeypatch.setattr(scheduler.random, "uniform", lambda a, b: 0.0)
+    requests = RequestScheduler({"max_retries": 2})
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) == 1:
+            raise _RateLimited({"retry-after-ms": "50"})
+        return "ok"
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        result = await requests.run("openai", "gpt", 10, call)
+        return result, asyncio.get_running_loop().time() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == "ok" and len(calls) == 2 and elapsed >= 0.05
+    assert requests.rate_limited == 1 and requests._provider("openai").cooldown_until > 0
+
+
+def test_batch_jobs_run_at_batch_priority_within_the_parallel_limit():
+    class _Runner(BatchRunner):
+        running = peak = 0
+
+        async def run_job(self, job):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            await asyncio.sleep(0.01)
+            self.running -= 1
+            if job["theme"] == "broken":
+                raise RuntimeError("boom")
+            return {**job, "status": "done", "priority": scheduler._request_priority.get()}
+
+    async def scenario():
+        runner = _Runner(None, None, None, AutoResolver(), parallel=2)
+        jobs = [{"id": str(i), "theme": "broken" if i == 3 else f"theme {i}", "constraints": []} for i in range(5)]
+        records = [record async for record in runner.results(jobs)]
+        return runner, records, scheduler._request_priority.get()
+
+    runner, records, outside = asyncio.run(scenario())
+    assert sorted(r["id"] for r in records) == ["0", "1", "2", "3", "4"]
+    assert {r.get("priority") for r in records if r["status"] == "done"} == {PRIORITY_BATCH}
+    assert outside == PRIORITY_INTERACTIVE
+    assert runner.peak == 2 and (runner.completed, runner.failed) == (4, 1)
@@ -0,0 +1,44 @@
+from services.fake_provider import FakeEmbeddings
+from services.memory_service import MemoryService
+
+
+def _result(chunk_id, source):
+    return {"id": chunk_id, "content": chunk_id, "score": 0.0, "metadata": {"source": source}}
+
+
+def _memory(tmp_path, rrf_k=60):
+    return MemoryService(str(tmp_path), embedding_api_key="", embeddings=FakeEmbeddings(dimensions=8), vector_backend="numpy", rrf_k=rrf_k)
+
+
+def test_fuse_sums_reciprocal_ranks_across_rankings(tmp_path):
+    memory = _memory(tmp_path, rrf_k=60)
+    vector = [_result("a", "1.md"), _result("b", "2.md"), _result("c", "3.md")]
+    lexical = [_result("c", "3.md"), _result("d", "4.md")]
+    fused = memory._fuse([vector, lexical], k=10, per_source_cap=None)
+    assert [r["id"] for r in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["score"] == 1 / 63 + 1 / 61
+    assert fused[1]["score"] == 1 / 61
+
+
+def test_fuse_applies_k_and_source_cap(tmp_path):
+    memory = _memory(tmp_path)
+    vector = [_result("a", "same.md"), _result("b", "same.md"), _result("c", "same.md"), _result("d", "other.md")]
+    fused = memory._fuse([vector], k=2, per_source_cap=2)
+    assert [r["id"] for r in fused] == ["a", "b"]
+    fused = memory._fuse([vector], k=3, per_source_cap=2)
+    assert [r["id"] for r in fused] == ["a", "b", "d"]
+
+
+def test_query_cache_survives_eviction_by_a_concurrent_call(tmp_path):
+    class _Embeddings(FakeEmbeddings):
+        def embed_documents(self, texts):
+            if texts == ["fresh"]: # Another request fills the cache while this one waits for the API
+                memory._embed_queries(["x", "y"])
+            return super().embed_documents(texts)
+
+    memory = MemoryService(str(tmp_path), embedding_api_key="", embeddings=_Embeddings(dimensions=8), vector_backend="numpy", query_cache_size=2)
+    cached = memory._embed_queries(["Cached  Query"])[0]
+    vectors = memory._embed_queries(["cached query", "fresh", "cached query"])
+    assert vectors[0] == vectors[2] == cached
+    assert list(memory._query_cache) == ["y", "fresh"]
+    assert len(memory._embed_queries(["a", "b", "c"])) == 3 # More misses than the cache holds
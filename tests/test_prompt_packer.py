@@ -0,0 +1,63 @@
+import json
+
+from services.llm import LLMService, ModelConfig
+from services.prompt_packer import PromptPacker, Section
+
+TEMPLATE = "Theme: {theme}\nNotes:\n{notes}\nTrends:\n{trends}"
+
+
+def _notes(n, words=20):
+    return [{"id": i, "text": " ".join(f"note{i}" for _ in range(words))} for i in range(n)]
+
+
+def _packer(budget):
+    """The packer LLMService hands a role on the offline fake provider."""
+    cfg = ModelConfig(name="fake-large", temperature=0.0, max_tokens=100, input_budget=budget)
+    return LLMService(api_key="offline", model_map={"critic": cfg}, settings={"response_cache": {"enabled": False}}).packer("critic")
+
+
+def _section_lines(prompt, start, end=None):
+    body = prompt.split(start, 1)[1]
+    body = body.split(end, 1)[0] if end else body
+    return [line for line in body.strip("\n").split("\n") if line]
+
+
+def test_unbounded_budget_keeps_every_item_in_order():
+    prompt = _packer(None).pack(TEMPLATE, theme="retro", notes=Section(_notes(5)), trends=Section(["a", "b"]))
+    assert [json.loads(line)["id"] for line in _section_lines(prompt, "Notes:\n", "\nTrends:")] == [0, 1, 2, 3, 4]
+    assert _section_lines(prompt, "Trends:\n") == ['"a"', '"b"']
+
+
+def test_budget_keeps_the_most_relevant_items_of_each_section():
+    packer = _packer(200)
+    prompt = packer.pack(TEMPLATE, theme="retro", notes=Section(_notes(20)), trends=Section([f"trend {i} " * 10 for i in range(20)]))
+    notes = [json.loads(line)["id"] for line in _section_lines(prompt, "Notes:\n", "\nTrends:")]
+    trends = _section_lines(prompt, "Trends:\n")
+    assert packer.tokens(prompt) <= 200
+    assert notes == list(range(len(notes))) and 0 < len(notes) < 20 # A prefix: items are dropped from the end
+    assert 0 < len(trends) < 20 # Sections take turns, so neither starves the other
+
+
+def test_fixed_values_always_go_in():
+    packer = _packer(10)
+    theme = "a very long theme " * 20
+    prompt = packer.pack(TEMPLATE, theme=theme, notes=Section(_notes(3)), trends=Section(["a"]))
+    assert theme in prompt
+    assert _section_lines(prompt, "Notes:\n", "\nTrends:") == [] and _section_lines(prompt, "Trends:\n") == []
+
+
+def test_keep_all_shortens_every_item_instead_of_dropping_any():
+    packer = _packer(150)
+    prompt = packer.pack(TEMPLATE, theme="retro", notes=Section(_notes(6, words=60), keep_all=True), trends=Section(["a", "b"]))
+    notes = [json.loads(line) for line in _section_lines(prompt, "Notes:\n", "\nTrends:")] # Shortened items stay valid JSON
+    assert [n["id"] for n in notes] == list(range(6))
+    assert all(n["text"].endswith("…") for n in notes)
+    assert packer.tokens(prompt) <= 150
+
+
+def test_max_item_tokens_caps_each_item():
+    packer = _packer(None)
+    prompt = packer.pack(TEMPLATE, theme="retro", notes=Section(["word " * 200, "short"], render=str, max_item_tokens=20), trends=Section([]))
+    long_note, short_note = _section_lines(prompt, "Notes:\n", "\nTrends:")
+    assert packer.tokens(long_note) <= 20 and long_note.endswith("…")
+    assert short_note == "short"
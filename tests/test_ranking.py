@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from graph.events import event_sink
+from graph.nodes.ranking import RankingEngine
+from services.prompt_packer import Section
+
+
+class _Packer:
+    def pack(self, template, **values):
+        if "ideas" in values:
+            return json.dumps(values["ideas"].items if isinstance(values["ideas"], Section) else values["ideas"])
+        return json.dumps({"a": values["a"], "b": values["b"]})
+
+
+class _Critic:
+    """Scores each idea by its `quality`; `skip` lists titles left out of the first answer that mentions them."""
+
+    def __init__(self, skip=(), fail_after=None, prefer=None):
+        self.batches = []
+        self.comparisons = 0
+        self.skip = set(skip)
+        self.fail_after = fail_after
+        self.prefer = prefer or {}
+
+    def packer(self, role):
+        return _Packer()
+
+    async def stream_json_items(self, role, system_prompt, user_prompt, key):
+        ideas = json.loads(user_prompt)
+        self.batches.append([idea["title"] for idea in ideas])
+        for n, idea in enumerate(ideas):
+            if self.fail_after is not None and n == self.fail_after:
+                self.fail_after = None
+                raise ConnectionError("stream dropped")
+            if idea["title"] in self.skip:
+                self.skip.discard(idea["title"])
+                continue
+            await asyncio.sleep(0)
+            quality = int(idea["title"][1:])
+            yield {"id": idea["id"], "score": quality, "hook": quality, "trend": 5, "twist": 5, "ranking_rationale": "ok"}
+
+    async def generate_json(self, role, system_prompt, user_prompt):
+        self.comparisons += 1
+        pair = json.loads(user_prompt)
+        a, b = (self.prefer.get(json.loads(pair[side])["title"], 0) for side in ("a", "b"))
+        return {"winner": "A" if a >= b else "B", "reason": "preferred"}
+
+
+def _pool(n):
+    return [{"title": f"i{q}", "hook": "h"} for q in range(n)]
+
+
+def test_pool_is_scored_in_concurrent_batches_with_local_ids():
+    critic = _Critic()
+    events = []
+    with event_sink(lambda event, data: events.append(event)):
+        ranked = asyncio.run(RankingEngine(critic, batch_size=4).rank(_pool(10)))
+    assert sorted(len(batch) for batch in critic.batches) == [2, 4, 4]
+    assert [idea["title"] for idea in ranked] == [f"i{q}" for q in range(9, -1, -1)]
+    assert ranked[0]["rubric"] == {"hook": 9, "trend": 5, "twist": 5}
+    assert events.count("idea_scored") == 10
+
+
+def test_missing_and_failed_ideas_are_retried_in_a_smaller_batch():
+    critic = _Critic(skip={"i1"}, fail_after=3)
+    ranked = asyncio.run(RankingEngine(critic, batch_size=8).rank(_pool(6)))
+    assert critic.batches == [[f"i{q}" for q in range(6)], ["i1", "i3", "i4", "i5"]]
+    assert all(idea["ranking_rationale"] == "ok" for idea in ranked)
+
+
+def test_unscored_ideas_rank_last_after_the_attempts_run_out():
+    critic = _Critic(skip={"i5"})
+    ranked = asyncio.run(RankingEngine(critic, batch_size=8, attempts=1).rank(_pool(6)))
+    assert ranked[-1]["title"] == "i5" and ranked[-1]["score"] is None
+
+
+def test_pairwise_pass_reorders_only_the_top_slice():
+    critic = _Critic(prefer={"i7": 3, "i8": 2, "i9": 1})
+    ranked = asyncio.run(RankingEngine(critic, batch_size=4, pairwise_top=3).rank(_pool(10)))
+    assert critic.comparisons == 3
+    assert [idea["title"] for idea in ranked[:3]] == ["i7", "i8", "i9"]
+    assert [idea["pairwise_wins"] for idea in ranked[:3]] == [2, 1, 0]
+    assert [idea["title"] for idea in ranked[3:]] == [f"i{q}" for q in range(6, -1, -1)]
+    assert "pairwise_wins" not in ranked[3]
@@ -0,0 +1,109 @@
+import asyncio
+from api.sessions import DONE, RUNNING, STOPPED, Session, SessionManager, WorkerPool
+
+
+def test_subscribe_delivers_terminal_event_published_during_replay():
+    async def scenario():
+        session = Session("s")
+        for i in range(5):
+            session.publish("node", {"node": f"n{i}"})
+        received = []
+        async for _, event, data in session.subscribe():
+            received.append((event, data))
+            if len(received) == 2: # The run finishes while the subscriber is mid-replay
+                session.status = DONE
+                session.publish(DONE, {"final_package": {"title": "t"}})
+        return received
+
+    received = asyncio.run(scenario())
+    assert [event for event, _ in received] == ["node"] * 5 + [DONE]
+    assert received[-1][1] == {"final_package": {"title": "t"}}
+
+
+def test_subscribe_follows_live_events_until_done():
+    async def scenario():
+        session = Session("s")
+        received = []
+
+        async def consume():
+            async for _, event, _ in session.subscribe():
+                received.append(event)
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        session.publish("node", {"node": "a"})
+        await asyncio.sleep(0)
+        session.status = DONE
+        session.publish(DONE, {"final_package": None})
+        await asyncio.wait_for(consumer, 1)
+        return received, session.status
+
+    received, status = asyncio.run(scenario())
+    assert received == ["node", DONE]
+    assert status != RUNNING
+
+
+def test_token_events_do_not_evict_structural_history():
+    async def scenario():
+        session = Session("s", max_token_events=10)
+        session.publish("node", {"node": "idea_rank"})
+        session.publish("awaiting_input", {"stage": "select_idea"})
+        for i in range(500):
+            session.publish("script_token", {"style": "meme", "delta": str(i)})
+        session.publish("script", {"style": "meme", "content": "..."})
+        session.status = DONE
+        session.publish(DONE, {"final_package": {}})
+        return [(seq, event) for seq, event, _ in [e async for e in session.subscribe()]]
+
+    replay = asyncio.run(scenario())
+    events = [event for _, event in replay]
+    assert events[:2] == ["node", "awaiting_input"]
+    assert events[-2:] == ["script", DONE]
+    assert events.count("script_token") == 10
+    assert [seq for seq, _ in replay] == sorted(seq for seq, _ in replay)
+
+
+def test_reconnect_resumes_after_the_given_event_in_order():
+    async def scenario():
+        session = Session("s")
+        for i in range(3):
+            session.publish("node", {"node": f"n{i}"})
+            session.publish("script_token", {"delta": str(i)})
+        received = []
+
+        async def consume():
+            async for seq, event, _ in session.subscribe(after=3):
+                received.append((seq, event))
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        session.publish("script_token", {"delta": "3"})
+        session.publish("node", {"node": "n3"})
+        await asyncio.sleep(0)
+        session.status = DONE
+        session.publish(DONE, {"final_package": None})
+        await asyncio.wait_for(consumer, 1)
+        return received
+
+    assert asyncio.run(scenario()) == [(4, "script_token"), (5, "node"), (6, "script_token"), (7, "script_token"), (8, "node"), (9, DONE)]
+
+
+class _Graph:
+    async def astream(self, graph_input, config, stream_mode):
+        yield "values", {"final_package": {"title": "t"}}
+
+
+def test_run_cancelled_before_it_starts_returns_its_reservation():
+    async def scenario():
+        pool = WorkerPool(max_running=1, max_queued=0, max_per_tenant=1)
+        manager = SessionManager(_Graph(), pool=pool)
+        session = manager.start({}, tenant="client")
+        session.task.cancel() # Before the task's first step, so _run never begins
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert (pool._reserved, pool._tenants, session.status) == (0, {}, STOPPED)
+        session = manager.start({}, tenant="client") # Admission is not blocked by the leaked reservation
+        await session.task
+        return session.status, pool._reserved, pool.running
+
+    assert asyncio.run(scenario()) == (DONE, 0, 0)
@@ -0,0 +1,69 @@
+import asyncio
+
+from services.singleflight import SingleFlight
+
+
+def test_shared_call_survives_one_caller_cancelling():
+    async def scenario():
+        flights, started, release = SingleFlight("test"), [], asyncio.Event()
+
+        async def work():
+            started.append(1)
+            await release.wait()
+            return "result"
+
+        first = asyncio.create_task(flights.do("k", work))
+        second = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return len(started), await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == (1, "result", True)
+
+
+def test_shared_call_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        flights, cancelled = SingleFlight("test"), asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flights.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return await flights.do("k", _value) # A later caller starts afresh
+
+    async def _value():
+        return "fresh"
+
+    assert asyncio.run(scenario()) == "fresh"
+
+
+def test_stream_joiner_gets_items_already_produced():
+    async def scenario():
+        flights, step = SingleFlight("test"), asyncio.Event()
+
+        async def items():
+            yield 1
+            await step.wait()
+            yield 2
+
+        first = flights.stream("k", items)
+        assert await first.__anext__() == 1
+        second = asyncio.create_task(_collect(flights.stream("k", items)))
+        await asyncio.sleep(0)
+        step.set()
+        return [1] + [item async for item in first], await second
+
+    async def _collect(stream):
+        return [item async for item in stream]
+
+    assert asyncio.run(scenario()) == ([1, 2], [1, 2])
@@ -0,0 +1,46 @@
+import asyncio
+
+from services.prompt_packer import PromptPacker
+from services.trend_service import TrendService
+
+
+class _LLM:
+    """Answers with each of `answers` in turn (a list of trends, or an exception)."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def packer(self, role):
+        return PromptPacker("fake-flash")
+
+    async def stream_json_items(self, role, system_prompt, user_prompt, key):
+        answer = self.answers[self.calls]
+        self.calls += 1
+        if isinstance(answer, Exception):
+            raise answer
+        for item in answer:
+            yield item
+
+
+def _analyze(service):
+    return asyncio.run(service.analyze_trends("identity", theme="retro"))
+
+
+def test_analysis_is_cached():
+    llm = _LLM([{"topic": "synthwave", "score": 8}])
+    service = TrendService(llm)
+    assert _analyze(service) == _analyze(service) == [{"topic": "synthwave", "score": 8}]
+    assert llm.calls == 1
+
+
+def test_empty_or_failed_analysis_is_not_cached():
+    llm = _LLM([], ConnectionError("down"), [{"topic": "synthwave", "score": 8}])
+    service = TrendService(llm)
+    assert _analyze(service) == []
+    try:
+        _analyze(service)
+    except ConnectionError:
+        pass
+    assert _analyze(service) == [{"topic": "synthwave", "score": 8}]
+    assert llm.calls == 3
@@ -0,0 +1,178 @@
+import asyncio
+import os
+
+from services.fake_provider import FakeEmbeddings
+from services.lexical_index import LexicalIndex
+from services.vector_store import open_vector_store
+from vault_ingest import aiter_ingest, load_manifest
+
+
+class _Embeddings(FakeEmbeddings):
+    """Records the texts of every embedding request."""
+
+    def __init__(self):
+        super().__init__(dimensions=32)
+        self.requests = []
+
+    def embed_documents(self, texts):
+        self.requests.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def _write(vault, rel_path, text):
+    path = os.path.join(vault, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def _ingest(vault, index, embeddings, **options):
+    return asyncio.run(_collect(aiter_ingest(vault, index, embeddings=embeddings, vector_backend="numpy", **options)))
+
+
+async def _collect(messages):
+    return [message async for _, message in messages]
+
+
+def _stored_ids(index):
+    store = open_vector_store(index, "numpy")
+    return sorted(chunk_id for ids, _, _ in store.pages() for chunk_id in ids)
+
+
+def test_chunks_get_stable_ids_per_file(tmp_path):
+    vault, index = str(tmp_path / "vault"), str(tmp_path / "index")
+    _write(vault, "a.md", "# Alpha\nshort note")
+    _write(vault, "sub/b.md", "\n\n".join(f"paragraph {i} " + "word " * 150 for i in range(3)))
+    _ingest(vault, index, _Embeddings())
+    files = load_manifest(index)["files"]
+    assert files["a.md"]["chunk_ids"] == ["a.md::0"]
+    assert files["sub/b.md"]["chunk_ids"] == [f"sub/b.md::{i}" for i in range(len(files["sub/b.md"]["chunk_ids"]))]
+    assert len(files["sub/b.md"]["chunk_ids"]) > 1
+    assert _stored_ids(index) == sorted(files["a.md"]["chunk_ids"] + files["sub/b.md"]["chunk_ids"])
+
+
+def test_unchanged_and_touched_files_are_not_embedded_again(tmp_path):
+    vault, index = str(tmp_path / "vault"), str(tmp_path / "index")
+    path = _write(vault, "a.md", "alpha note")
+    _write(vault, "b.md", "beta note")
+    _ingest(vault, index, _Embeddings())
+
+    embeddings = _Embeddings()
+    assert _ingest(vault, index, embeddings)[-1] == "Index already up to date."
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10)) # Touched, same content
+    assert _ingest(vault, index, embeddings)[-1] == "Index already up to date."
+    assert embeddings.requests == []
+    assert load_manifest(index)["files"]["a.md"]["mtime"] == stat.st_mtime + 10
+
+
+def test_edited_file_replaces_only_its_own_chunks(tmp_path):
+    vault, index = str(tmp_path / "vault"), str(tmp_path / "index")
+    _write(vault, "a.md", "alpha note")
+    _write(vault, "b.md", "beta note")
+    _ingest(vault, index, _Embeddings())
+
+    embeddings = _Embeddings()
+    _write(vault, "a.md", "alpha rewritten")
+    _ingest(vault, index, embeddings)
+    assert embeddings.requests == [["alpha rewritten"]]
+    assert _stored_ids(index) == ["a.md::0", "b.md::0"]
+    lexical = LexicalIndex.load(index)
+    assert lexical.chunks["a.md::0"][0] == "alpha rewritten"
+    assert [chunk_id for chunk_id, _ in lexical.search("rewritten", 5)] == ["a.md::0"]
+
+
+def test_deleted_file_is_removed_everywhere(tmp_path):
+    vault, index = str(tmp_path / "vault"), str(tmp_path / "index")
+    path = _write(vault, "a.md", "alpha note")
+    _write(vault, "b.md", "beta note")
+    _ingest(vault, index, _Embeddings())
+
+    os.remove(path)
+    messages = _ingest(vault, index, _Embeddings())
+    assert "   − Removed: a.md" in messages
+    assert list(load_manifest(index)["files"]) == ["b.md"]
+    assert _stored_ids(index) == ["b.md::0"]
+    assert list(LexicalIndex.load(index).chunks) == ["b.md::0"]
+
+
+class _SlowEmbeddings(FakeEmbeddings):
+    """Async embeddings that count requests in flight and can be held or made to fail."""
+
+    def __init__(self, fail_on=None):
+        super().__init__(dimensions=32)
+        self.fail_on = fail_on
+        self.in_flight = self.peak = 0
+        self.sizes = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await self.release.wait()
+            await asyncio.sleep(0.005)
+            if self.fail_on and any(self.fail_on in text for text in texts):
+                raise ConnectionError("embedding failed")
+            self.sizes.append(len(texts))
+            return self.embed_documents(texts)
+        finally:
+            self.in_flight -= 1
+
+
+def test_pipeline_batches_and_bounds_embedding_requests(tmp_path):
+    vault, index = str(tmp_path / "vault"), str(tmp_path / "index")
+    for i in range(12):
+        _write(vault, f"note{i:02}.md", f"note {i}")
+    embeddings = _SlowEmbeddings()
+    _ingest(vault, index, embeddings, batch_size=5, concurrency=2)
+    assert sorted(embeddings.sizes) == [2, 5, 5]
+    assert embeddings.peak == 2
+    assert len(_stored_ids(index)) == 12
+
+
+def test_reading_stalls_while_embedding_is_backed_up(tmp_path, monkeypatch):
+    import vault_ingest
+    vault, index = str(tmp_path / "vault"), str(tmp_path / "index")
+    for i in range(40):
+        _write(vault, f"note{i:02}.md", f"note {i}")
+    reads = []
+    load_and_split = vault_ingest._load_and_split
+    monkeypatch.setattr(vault_ingest, "_load_and_split", lambda *args: reads.append(1) or load_and_split(*args))
+
+    async def run():
+        embeddings = _SlowEmbeddings()
+        embeddings.release.clear()
+        ingest = asyncio.ensure_future(_collect(aiter_ingest(vault, index, embeddings=embeddings, batch_size=1, concurrency=2, vector_backend="numpy")))
+        await asyncio.sleep(0.3)
+        held = len(reads)
+        embeddings.release.set()
+        await ingest
+        return held
+
+    held = asyncio.run(run())
+    # Two requests held in flight, two batches queued per worker, one put waiting: the rest is not read yet
+    assert 0 < held <= 2 + 2 * 2 + 1
+    assert len(reads) == 40 and len(_stored_ids(index)) == 40
+
+
+def test_failed_ingest_keeps_files_written_before_the_failure(tmp_path):
+    vault, index = str(tmp_path / "vault"), str(tmp_path / "index")
+    for i in range(6):
+        _write(vault, f"note{i}.md", "poison" if i == 4 else f"note {i}")
+    try:
+        _ingest(vault, index, _SlowEmbeddings(fail_on="poison"), batch_size=1, concurrency=1)
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("ingest should fail")
+    kept = set(load_manifest(index)["files"])
+    assert {"note0.md", "note1.md", "note2.md", "note3.md"} <= kept and "note4.md" not in kept
+    assert set(_stored_ids(index)) == {f"{rel}::0" for rel in kept}
+
+    embeddings = _SlowEmbeddings()
+    _write(vault, "note4.md", "fixed")
+    _ingest(vault, index, embeddings, batch_size=10, concurrency=1)
+    assert sum(embeddings.sizes) == 6 - len(kept) # Only what the failed run did not write
@@ -0,0 +1,83 @@
+import json
+import os
+
+from services.vector_store import SIDECAR_FILE, NumpyStore
+
+
+def _store(directory):
+    store = NumpyStore(str(directory))
+    store.upsert(["a", "b"], [[1.0, 0.0], [0.0, 1.0]], ["A", "B"], [{}, {}])
+    store.flush()
+    return store
+
+
+def test_flush_writes_a_new_generation_and_removes_the_old_one(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(["c"], [[1.0, 1.0]], ["C"], [{}])
+    store.flush()
+    assert sorted(os.listdir(tmp_path)) == ["documents.2.jsonl", "vectors.2.npy", SIDECAR_FILE]
+    sidecar = json.loads((tmp_path / SIDECAR_FILE).read_text())
+    assert (sidecar["vectors"], sidecar["documents"], sidecar["offsets"][0]) == ("vectors.2.npy", "documents.2.jsonl", 0)
+    assert "metadatas" not in sidecar # Text and metadata are read by row offset, not loaded with the sidecar
+    assert NumpyStore(str(tmp_path)).query([1.0, 1.0], 1)["documents"] == ["C"]
+
+
+def test_int8_query_is_scored_in_blocks(tmp_path):
+    store = NumpyStore(str(tmp_path), dtype="int8")
+    store.QUERY_BLOCK_ROWS = 3
+    vectors = [[float(i), 1.0] for i in range(10)]
+    store.upsert([str(i) for i in range(10)], vectors, [str(i) for i in range(10)], [{}] * 10)
+    store.flush()
+    assert store.query([1.0, 0.0], 3)["ids"] == ["9", "8", "7"]
+    assert store.query([-1.0, 1.0], 1)["ids"] == ["0"]
+
+
+def test_format_2_sidecar_with_inline_documents_still_opens(tmp_path):
+    import numpy as np
+    np.save(tmp_path / "vectors.1.npy", np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32))
+    (tmp_path / SIDECAR_FILE).write_text(json.dumps({
+        "version": 2, "generation": 1, "vectors": "vectors.1.npy", "dtype": "float32",
+        "ids": ["a", "b"], "documents": ["A", "B"], "metadatas": [{"source": "a.md"}, {}], "scales": None,
+    }))
+    store = NumpyStore(str(tmp_path))
+    assert store.query([1.0, 0.0], 1)["metadatas"] == [{"source": "a.md"}]
+    store.upsert(["c"], [[1.0, 1.0]], ["C"], [{}])
+    store.flush() # Rewritten in the current format
+    assert sorted(os.listdir(tmp_path)) == ["documents.2.jsonl", "vectors.2.npy", SIDECAR_FILE]
+    assert [page for page in NumpyStore(str(tmp_path)).pages()] == [(["a", "b", "c"], ["A", "B", "C"], [{"source": "a.md"}, {}, {}])]
+
+
+def test_mismatched_row_counts_are_not_opened(tmp_path):
+    _store(tmp_path)
+    sidecar = json.loads((tmp_path / SIDECAR_FILE).read_text())
+    sidecar["ids"].append("c")
+    (tmp_path / SIDECAR_FILE).write_text(json.dumps(sidecar))
+    store = NumpyStore(str(tmp_path))
+    assert store.count() == 0
+    assert store.query([1.0, 0.0], 2)["ids"] == []
+
+
+def test_upsert_delete_and_reopen(tmp_path):
+    for dtype in ("float32", "int8"):
+        directory = tmp_path / dtype
+        store = NumpyStore(str(directory), dtype=dtype)
+        store.upsert(["a", "b", "c"], [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]], ["A", "B", "C"], [{"source": "a.md"}, {}, {}])
+        assert store.query([1.0, 0.0], 1)["ids"] == ["a"] # Unflushed writes are visible
+        store.flush()
+        store.upsert(["a"], [[0.0, 1.0]], ["A2"], [{"source": "a.md"}]) # Replaces the stored row
+        store.delete(["b"])
+        assert store.count() == 2
+        store.flush()
+
+        reopened = NumpyStore(str(directory), dtype=dtype)
+        assert reopened.count() == 2
+        results = reopened.query([0.0, 1.0], 5)
+        assert results["ids"] == ["a", "c"]
+        assert results["documents"] == ["A2", "C"]
+        assert abs(results["distances"][0]) < 0.02
+        assert [page for page in reopened.pages()] == [(["c", "a"], ["C", "A2"], [{}, {"source": "a.md"}])]
+
+
+def test_store_with_other_dtype_is_not_opened(tmp_path):
+    _store(tmp_path)
+    assert NumpyStore(str(tmp_path), dtype="int8").count() == 0
@@ -1,43 +1,272 @@
 import os
+import json
+import time
+import asyncio
+import hashlib
 import argparse
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from dotenv import load_dotenv
+from services.lexical_index import LexicalIndex
+from services.metrics import INGEST_STAGE
+from services.vector_store import VECTOR_BACKENDS, open_vector_store
 
 load_dotenv()
 
-def ingest_vault(vault_path: str, chroma_path: str):
+MANIFEST_FILE = "vault_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def make_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100, separators=["\n# ", "\n## ", "\n### ", "\n\n", "\n", " "])
+
+
+def manifest_path(chroma_path: str) -> str:
+    return os.path.join(chroma_path, MANIFEST_FILE)
+
+
+def load_manifest(chroma_path: str) -> Dict[str, Any]:
     """
-    Finds all .md files in vault_path, chunks them, and stores in Chroma.
+    Per-file record of what is indexed: {rel_path: {mtime, size, sha256, chunk_ids}}.
     """
-    print(f"Scanning vault at: {vault_path}")
-    documents = []
+    try:
+        with open(manifest_path(chroma_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def save_manifest(chroma_path: str, manifest: Dict[str, Any]):
+    os.makedirs(chroma_path, exist_ok=True)
+    tmp_path = manifest_path(chroma_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path(chroma_path)) # Atomic: a crash never leaves a half-written manifest
+
+
+def scan_vault(vault_path: str) -> Dict[str, Tuple[str, float, int]]:
+    """Map each markdown file's vault-relative path to (abs_path, mtime, size) without opening it."""
+    found = {}
     for root, dirs, files in os.walk(vault_path):
         for file in files:
             if file.endswith(".md"):
                 file_path = os.path.join(root, file)
-                try:
-                    loader = TextLoader(file_path, encoding='utf-8')
-                    documents.extend(loader.load())
-                except Exception as e:
-                    print(f"Error loading {file_path}: {e}")
-    print(f"Found {len(documents)} markdown files.")
-    if not documents:
-        print("No documents found to index.")
-        return
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100, separators=["\n# ", "\n## ", "\n### ", "\n\n", "\n", " "])
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split into {len(chunks)} chunks.")
-    embeddings = OpenAIEmbeddings()
-    vectorstore = Chroma.from_documents(documents=chunks, embedding=embeddings, persist_directory=chroma_path)
-    vectorstore.persist()
-    print(f"Successfully indexed vault to {chroma_path}")
+                stat = os.stat(file_path)
+                rel_path = os.path.relpath(file_path, vault_path).replace(os.sep, "/")
+                found[rel_path] = (file_path, stat.st_mtime, stat.st_size)
+    return found
+
+
+def chunk_ids_for(rel_path: str, count: int) -> List[str]:
+    """Stable chunk IDs, so a file's chunks can be replaced or removed later."""
+    return [f"{rel_path}::{i}" for i in range(count)]
+
+
+def _load_lexical(chroma_path: str, store: Any) -> LexicalIndex:
+    """The BM25 index for this index dir; built from the stored chunks if it doesn't exist yet."""
+    lexical = LexicalIndex.load(chroma_path)
+    if lexical is not None:
+        return lexical
+    lexical = LexicalIndex()
+    for ids, documents, metadatas in store.pages():
+        lexical.add(ids, documents, metadatas)
+    lexical.dirty = True # Save even when empty, so the next run doesn't rebuild
+    return lexical
+
+
+def _load_and_split(file_path: str, splitter: RecursiveCharacterTextSplitter) -> Tuple[str, List[Document]]:
+    """Read one file; return its content hash and chunks (runs in a worker thread)."""
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    text = raw.decode("utf-8")
+    return hashlib.sha256(raw).hexdigest(), splitter.split_documents([Document(page_content=text, metadata={"source": file_path})])
+
+
+async def _run_pipeline(vault_path: str, chroma_path: str, embeddings: Any, batch_size: int, concurrency: int, report: Callable[[str, str], None], vector_backend: str = "chroma"):
+    started = time.perf_counter()
+    report("log", f"Scanning vault at: {vault_path}")
+    with INGEST_STAGE.labels("scan").time():
+        current = await asyncio.to_thread(scan_vault, vault_path)
+        manifest = await asyncio.to_thread(load_manifest, chroma_path)
+    indexed = manifest["files"]
+    store = await asyncio.to_thread(open_vector_store, chroma_path, vector_backend, embeddings)
+    stored = await asyncio.to_thread(store.count)
+    if not indexed and stored > 0:
+        report("warning", "Index has no manifest — rebuilding it to drop chunks from earlier full re-ingests.")
+        await asyncio.to_thread(store.reset)
+    elif indexed and stored == 0 and any(entry["chunk_ids"] for entry in indexed.values()):
+        report("warning", f"The {vector_backend} store is empty but the manifest lists indexed files — re-indexing everything.")
+        indexed.clear()
+    with INGEST_STAGE.labels("scan").time():
+        lexical = await asyncio.to_thread(_load_lexical, chroma_path, store)
+    if not indexed and len(lexical):
+        lexical.clear()
+
+    # mtime/size match: unchanged without opening. Everything else is read and hashed by the producer.
+    candidates = [rel for rel, (_, mtime, size) in sorted(current.items()) if not (rel in indexed and indexed[rel]["mtime"] == mtime and indexed[rel]["size"] == size)]
+    removed = [rel for rel in indexed if rel not in current]
+    report("log", f"Found {len(current)} markdown file(s): {len(candidates)} to check, {len(removed)} removed.")
+
+    for rel_path in removed:
+        stale_ids = indexed.pop(rel_path)["chunk_ids"]
+        if stale_ids:
+            with INGEST_STAGE.labels("delete").time():
+                await asyncio.to_thread(store.delete, stale_ids)
+            lexical.remove(stale_ids)
+        report("log", f"   − Removed: {rel_path}")
+
+    # Bounded queues between stages give backpressure: at most ~2 batches wait per embedding worker.
+    to_embed: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    to_write: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    pending: Dict[str, List[Any]] = {} # rel_path -> [chunks left to write, manifest entry]
+    counts = {"changed": 0, "chunks": 0, "batches": 0, "files_done": 0}
+
+    def finish_file(rel_path: str, entry: Dict[str, Any]):
+        indexed[rel_path] = entry
+        counts["files_done"] += 1
+
+    async def produce():
+        splitter = make_splitter()
+        batch: List[Tuple[str, str, Document]] = []
+        for rel_path in candidates:
+            file_path, mtime, size = current[rel_path]
+            try:
+                with INGEST_STAGE.labels("read_split").time():
+                    digest, chunks = await asyncio.to_thread(_load_and_split, file_path, splitter)
+            except (OSError, UnicodeDecodeError) as e:
+                report("warning", f"   ⚠ Skipped {rel_path}: {e}")
+                continue
+            entry = indexed.get(rel_path)
+            if entry and entry["sha256"] == digest:
+                entry["mtime"], entry["size"] = mtime, size # Touched but not edited
+                continue
+            counts["changed"] += 1
+            if entry and entry["chunk_ids"]:
+                with INGEST_STAGE.labels("delete").time():
+                    await asyncio.to_thread(store.delete, entry["chunk_ids"])
+                lexical.remove(entry["chunk_ids"])
+                indexed.pop(rel_path)
+            ids = chunk_ids_for(rel_path, len(chunks))
+            new_entry = {"mtime": mtime, "size": size, "sha256": digest, "chunk_ids": ids}
+            if not chunks:
+                finish_file(rel_path, new_entry)
+                continue
+            pending[rel_path] = [len(chunks), new_entry]
+            for chunk_id, chunk in zip(ids, chunks):
+                batch.append((rel_path, chunk_id, chunk))
+                if len(batch) >= batch_size:
+                    await to_embed.put(batch)
+                    batch = []
+        if batch:
+            await to_embed.put(batch)
+        for _ in range(concurrency):
+            await to_embed.put(None)
+
+    async def embed():
+        while (batch := await to_embed.get()) is not None:
+            with INGEST_STAGE.labels("embed").time():
+                vectors = await embeddings.aembed_documents([chunk.page_content for _, _, chunk in batch])
+            await to_write.put((batch, vectors))
+        await to_write.put(None)
+
+    async def write():
+        finished_workers = 0
+        while finished_workers < concurrency:
+            item = await to_write.get()
+            if item is None:
+                finished_workers += 1
+                continue
+            batch, vectors = item
+            with INGEST_STAGE.labels("write").time():
+                await asyncio.to_thread(
+                    store.upsert,
+                    [chunk_id for _, chunk_id, _ in batch],
+                    vectors,
+                    [chunk.page_content for _, _, chunk in batch],
+                    [chunk.metadata for _, _, chunk in batch],
+                )
+                lexical.add([chunk_id for _, chunk_id, _ in batch], [chunk.page_content for _, _, chunk in batch], [chunk.metadata for _, _, chunk in batch])
+            for rel_path, _, _ in batch:
+                pending[rel_path][0] -= 1
+                if pending[rel_path][0] == 0:
+                    finish_file(rel_path, pending.pop(rel_path)[1])
+            counts["batches"] += 1
+            counts["chunks"] += len(batch)
+            report("progress", f"   ✓ Batch {counts['batches']}: {len(batch)} chunks embedded — {counts['chunks']} chunks, {counts['files_done']} file(s) done")
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(produce())
+            for _ in range(concurrency):
+                tg.create_task(embed())
+            tg.create_task(write())
+    except BaseExceptionGroup as eg:
+        raise eg.exceptions[0]
+    finally:
+        with INGEST_STAGE.labels("write").time():
+            await asyncio.to_thread(store.flush) # The numpy stores write everything here; Chroma already has
+        await asyncio.to_thread(save_manifest, chroma_path, manifest) # Keeps every fully written file, even on failure
+        if lexical.dirty:
+            await asyncio.to_thread(lexical.save, chroma_path)
+
+    elapsed = time.perf_counter() - started
+    INGEST_STAGE.labels("total").observe(elapsed)
+    if not current:
+        report("warning", "No markdown files found in that path.")
+    elif counts["changed"] or removed:
+        report("success", f"Vault indexed to {chroma_path}: {counts['changed']} file(s), {counts['chunks']} chunks in {elapsed:.1f}s")
+    else:
+        report("success", "Index already up to date.")
+
+
+async def aiter_ingest(vault_path: str, chroma_path: str, embeddings: Optional[Any] = None, batch_size: int = 64, concurrency: int = 4, vector_backend: str = "chroma") -> AsyncIterator[Tuple[str, str]]:
+    """
+    Incrementally sync the vault into the vector store (`vector_backend`, see
+    services.vector_store), yielding (level, message) progress.
+
+    Files whose mtime and size match the manifest are skipped unopened; files whose
+    content hash is unchanged are only re-stamped; chunks of edited or removed files
+    are deleted. New chunks stream through a bounded pipeline: files are read and
+    split in worker threads, embedded in `batch_size` batches with `concurrency`
+    requests in flight, and upserted to the store batch by batch. The BM25 index
+    (services.lexical_index) follows every upsert and delete.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    pipeline = asyncio.ensure_future(_run_pipeline(vault_path, chroma_path, embeddings or OpenAIEmbeddings(), batch_size, concurrency, lambda level, message: events.put_nowait((level, message)), vector_backend))
+    try:
+        while not pipeline.done() or not events.empty():
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({getter, pipeline}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        pipeline.result()
+    finally:
+        if not pipeline.done():
+            pipeline.cancel()
+
+
+def ingest_vault(vault_path: str, chroma_path: str, batch_size: int = 64, concurrency: int = 4, embeddings: Optional[Any] = None, vector_backend: str = "chroma"):
+    """
+    Finds all .md files in vault_path, chunks them, and syncs them into the vector store.
+    """
+    async def run():
+        async for level, message in aiter_ingest(vault_path, chroma_path, embeddings=embeddings, batch_size=batch_size, concurrency=concurrency, vector_backend=vector_backend):
+            print(message)
+    asyncio.run(run())
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Ingest Obsidian vault into Chroma")
     parser.add_argument("--vault", type=str, required=True, help="Path to Obsidian vault")
     parser.add_argument("--chroma", type=str, default="./chroma_db", help="Path to Chroma DB")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--backend", choices=VECTOR_BACKENDS, default=os.getenv("VECTOR_BACKEND", "chroma"), help="Vector store to write (must match VECTOR_BACKEND at query time)")
     args = parser.parse_args()
-    ingest_vault(args.vault, args.chroma)
+    ingest_vault(args.vault, args.chroma, batch_size=args.batch_size, concurrency=args.concurrency, vector_backend=args.backend)